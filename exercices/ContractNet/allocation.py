@@ -0,0 +1,196 @@
+"""
+Central job allocation for batch Contract Net rounds.
+
+The supervisor builds a cost matrix times[j][i]: processing time of job j on machine i
+(INFEASIBLE when the machine cannot do the job), and turns it into a schedule: for each
+machine, the jobs it runs in execution order. Optional loads[i] give the work already
+queued on machine i, which delays every job it is given, and capacities[i] the most jobs
+machine i can take (None: no limit); the jobs that do not fit are left unassigned.
+
+- min_total_completion: optimal for the sum of the job completion times. Job j placed
+  k-th from the end on machine i delays k other jobs, so it costs (k + 1) * times[j][i];
+  with a backlog loads[i], every job on machine i also waits loads[i]. Assigning jobs to
+  (machine, position) slots is then a rectangular assignment problem, solved exactly by
+  the Hungarian algorithm. Machine i only offers capacities[i] positions, and every job
+  also gets a "left out" slot costing more than any schedule, so the fewest jobs are left out.
+- min_makespan: longest-processing-time-first heuristic for the time at which the last
+  machine finishes (unrelated machines: each job goes to the machine where it would end
+  first, among the machines with room left).
+
+Usage:
+    times = [[2, 3, INFEASIBLE], [5, INFEASIBLE, 4]]   # jobs x machines
+    schedule, unassigned = min_makespan(times)
+    makespan(times, schedule)
+"""
+
+import math
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+INFEASIBLE = math.inf
+
+# per machine: indexes of its jobs, in execution order; indexes of the jobs no machine can do
+Schedule = Tuple[List[List[int]], List[int]]
+
+
+def hungarian(cost: Sequence[Sequence[float]]) -> List[int]:
+    """
+    Minimum cost assignment of every row to a distinct column (Hungarian algorithm with
+    potentials, O(n^2 m) for n rows and m >= n columns).
+
+    Args:
+        cost: n x m matrix of finite costs.
+    Returns:
+        the column assigned to each row.
+    Raises:
+        ValueError: if there are more rows than columns.
+    """
+    n = len(cost)
+    if n == 0:
+        return []
+    m = len(cost[0])
+    if n > m:
+        raise ValueError(f"cannot assign {n} rows to {m} columns")
+    # 1-based potentials; way[j]: previous column on the augmenting path
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    match = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for row in range(1, n + 1):
+        match[0] = row
+        col0 = 0
+        minv = [math.inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[col0] = True
+            i0 = match[col0]
+            delta = math.inf
+            col1 = 0
+            costs = cost[i0 - 1]
+            for col in range(1, m + 1):
+                if not used[col]:
+                    reduced = costs[col - 1] - u[i0] - v[col]
+                    if reduced < minv[col]:
+                        minv[col] = reduced
+                        way[col] = col0
+                    if minv[col] < delta:
+                        delta = minv[col]
+                        col1 = col
+            for col in range(m + 1):
+                if used[col]:
+                    u[match[col]] += delta
+                    v[col] -= delta
+                else:
+                    minv[col] -= delta
+            col0 = col1
+            if match[col0] == 0:
+                break
+        # augment along the path
+        while col0:
+            col1 = way[col0]
+            match[col0] = match[col1]
+            col0 = col1
+    assignment = [0] * n
+    for col in range(1, m + 1):
+        if match[col]:
+            assignment[match[col] - 1] = col - 1
+    return assignment
+
+
+def _feasible_jobs(times: Sequence[Sequence[float]]) -> Tuple[List[int], List[int]]:
+    """Split the jobs into those at least one machine can do and the others."""
+    feasible, unassigned = [], []
+    for j, row in enumerate(times):
+        (feasible if any(t != INFEASIBLE for t in row) else unassigned).append(j)
+    return feasible, unassigned
+
+
+def _positions(jobs: int, capacities: Optional[Sequence[Optional[int]]], machines: int) -> List[int]:
+    """Number of jobs each machine can be given in this allocation."""
+    capacities = capacities or [None] * machines
+    return [jobs if capacity is None else max(0, min(capacity, jobs)) for capacity in capacities]
+
+
+def min_total_completion(times: Sequence[Sequence[float]], loads: Optional[Sequence[float]] = None,
+                         capacities: Optional[Sequence[Optional[int]]] = None) -> Schedule:
+    """
+    Schedule minimizing the sum of the job completion times (exact), placing as many jobs
+    as the capacities allow.
+
+    Args:
+        times: jobs x machines processing times (INFEASIBLE when not possible).
+        loads: seconds of work already queued on each machine.
+        capacities: most jobs each machine can take (None: no limit).
+    Returns:
+        (per-machine job lists in execution order, unassigned job indexes).
+    """
+    machines = len(times[0]) if times else 0
+    schedule: List[List[int]] = [[] for _ in range(machines)]
+    jobs, unassigned = _feasible_jobs(times)
+    if not jobs or not machines:
+        return schedule, unassigned + jobs
+    loads = loads or [0.0] * machines
+    # column -> (machine i, k-th position from the end on machine i)
+    columns = [(i, k) for i, positions in enumerate(_positions(len(jobs), capacities, machines))
+               for k in range(positions)]
+    # leaving a job out costs more than any feasible schedule, an infeasible slot even more
+    left_out = 1.0 + len(jobs) * (sum(t for j in jobs for t in times[j] if t != INFEASIBLE) + max(loads))
+    infeasible = 2.0 * left_out
+    cost = [
+        [infeasible if times[j][i] == INFEASIBLE else (k + 1) * times[j][i] + loads[i] for i, k in columns]
+        + [left_out] * len(jobs)
+        for j in jobs
+    ]
+    slots: List[List[Tuple[int, int]]] = [[] for _ in range(machines)]
+    for j, column in zip(jobs, hungarian(cost)):
+        if column >= len(columns):
+            unassigned.append(j)
+            continue
+        i, k = columns[column]
+        slots[i].append((k, j))
+    for i, machine_slots in enumerate(slots):
+        # the farthest position from the end runs first
+        schedule[i] = [j for _, j in sorted(machine_slots, reverse=True)]
+    return schedule, sorted(unassigned)
+
+
+def min_makespan(times: Sequence[Sequence[float]], loads: Optional[Sequence[float]] = None,
+                 capacities: Optional[Sequence[Optional[int]]] = None) -> Schedule:
+    """
+    Schedule keeping the makespan low (greedy, longest jobs first).
+
+    Args:
+        times: jobs x machines processing times (INFEASIBLE when not possible).
+        loads: seconds of work already queued on each machine.
+        capacities: most jobs each machine can take (None: no limit).
+    Returns:
+        (per-machine job lists in execution order, unassigned job indexes).
+    """
+    machines = len(times[0]) if times else 0
+    schedule: List[List[int]] = [[] for _ in range(machines)]
+    jobs, unassigned = _feasible_jobs(times)
+    loads = list(loads or [0.0] * machines)
+    room = _positions(len(jobs), capacities, machines)
+    # jobs that are long even on their best machine are placed first
+    for j in sorted(jobs, key=lambda j: min(times[j]), reverse=True):
+        candidates = [i for i in range(machines) if times[j][i] != INFEASIBLE and room[i] > 0]
+        if not candidates:
+            unassigned.append(j)
+            continue
+        i = min(candidates, key=lambda i: loads[i] + times[j][i])
+        loads[i] += times[j][i]
+        room[i] -= 1
+        schedule[i].append(j)
+    return schedule, sorted(unassigned)
+
+
+def makespan(times: Sequence[Sequence[float]], schedule: Sequence[Sequence[int]],
+             loads: Optional[Sequence[float]] = None) -> float:
+    """Time at which the last machine finishes its jobs (after its queued work)."""
+    loads = loads or [0.0] * len(schedule)
+    return max((loads[i] + sum(times[j][i] for j in jobs) for i, jobs in enumerate(schedule)), default=0.0)
+
+
+ALLOCATORS: Dict[str, Callable[..., Schedule]] = {
+    "hungarian": min_total_completion,
+    "makespan": min_makespan,
+}
@@ -0,0 +1,247 @@
+"""
+Bounded job executor of a machine.
+
+JobExecutor runs accepted jobs on a fixed number of parallel slots (worker threads) from a
+FIFO or priority queue:
+- admission control: submit() refuses jobs once max_queue jobs are waiting
+- deduplication: a job id already queued, running or recently finished is ignored, so a
+  duplicated accept never runs a job twice
+- cancellation: queued jobs are dropped (and reported to the on_cancel callback), running
+  jobs see their `cancelled` event set
+- occupancy: busy slots, queue length and the estimated start time of a new job, used by
+  the machine when it bids
+"""
+
+from collections import deque
+from threading import Condition, Event, Thread
+from typing import Callable, Dict, Iterable, List, Optional
+import heapq
+import itertools
+import logging
+import time
+
+LOG = logging.getLogger("executor")
+
+POLICIES = ("fifo", "priority")
+
+# submit() results
+QUEUED = "queued"
+DUPLICATE = "duplicate"
+QUEUE_FULL = "queue_full"
+STOPPED = "stopped"
+
+
+class Task:
+    """
+    A job submitted to a JobExecutor.
+
+    Attributes:
+        job_id: unique id of the job.
+        job: job description.
+        duration: estimated processing time (seconds).
+        priority: higher runs first with the "priority" policy.
+        context: free data of the submitter (e.g. the round id).
+        cancelled: set by JobExecutor.cancel(); a running job should stop when it is set.
+        started_at: monotonic start time (None while queued).
+    """
+
+    __slots__ = ("job_id", "job", "duration", "priority", "context", "cancelled", "started_at")
+
+    def __init__(self, job_id: str, job: dict, duration: float, priority: int = 0, context: Optional[dict] = None):
+        self.job_id = job_id
+        self.job = job
+        self.duration = duration
+        self.priority = priority
+        self.context = context or {}
+        self.cancelled = Event()
+        self.started_at: Optional[float] = None
+
+
+class JobExecutor:
+    """
+    Fixed pool of slots running queued jobs.
+
+    Usage:
+        executor = JobExecutor(run_job, slots=2, policy="priority", max_queue=10, on_cancel=report)
+        executor.start()
+        executor.submit("job_1", {"name": "A"}, duration=2.0, priority=1)
+        executor.estimated_start()      # seconds before a new job could start
+        executor.cancel("job_1")
+        executor.stop()
+    """
+
+    def __init__(self, runner: Callable[[Task], None], slots: int = 1, policy: str = "fifo",
+                 max_queue: Optional[int] = None, name: str = "executor", history: int = 1024,
+                 on_cancel: Optional[Callable[[Task], None]] = None):
+        """
+        Args:
+            runner: function running a task on a slot thread (should return early once
+                task.cancelled is set).
+            slots: number of jobs running in parallel.
+            policy: "fifo" (arrival order) or "priority" (highest priority first, then arrival).
+            max_queue: maximum number of waiting jobs (unbounded if None).
+            name: prefix of the slot thread names.
+            history: number of finished job ids remembered for deduplication.
+            on_cancel: function called with each queued task dropped by cancel() or stop(),
+                which never reaches the runner (running tasks are reported by the runner).
+        """
+        if slots < 1:
+            raise ValueError("slots must be >= 1")
+        if policy not in POLICIES:
+            raise ValueError(f"unknown policy {policy!r}, available: {POLICIES}")
+        self.runner = runner
+        self.on_cancel = on_cancel
+        self.slots = slots
+        self.policy = policy
+        self.max_queue = max_queue
+        self.name = name
+        self._changed = Condition()
+        # (sort key, sequence, task); cancelled tasks are skipped when popped
+        self._heap = []
+        self._seq = itertools.count()
+        # job_id -> task, for the queued and running jobs
+        self._queued: Dict[str, Task] = {}
+        self._running: Dict[str, Task] = {}
+        self._finished = deque(maxlen=history)
+        self._finished_ids = set()
+        self._threads: List[Thread] = []
+        self._stopped = False
+
+    def start(self):
+        """Start the slot threads."""
+        with self._changed:
+            if self._threads:
+                return
+            self._stopped = False
+            self._threads = [Thread(target=self._slot, name=f"{self.name}-slot{i}", daemon=True)
+                             for i in range(self.slots)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, cancel_running: bool = True, timeout: float = 1.0):
+        """Stop the slots; queued jobs are dropped, running ones cancelled unless cancel_running=False."""
+        with self._changed:
+            self._stopped = True
+            dropped = list(self._queued.values())
+            for task in dropped:
+                task.cancelled.set()
+            self._queued.clear()
+            self._heap.clear()
+            if cancel_running:
+                for task in self._running.values():
+                    task.cancelled.set()
+            threads, self._threads = self._threads, []
+            self._changed.notify_all()
+        for task in dropped:
+            self._cancelled(task)
+        for thread in threads:
+            thread.join(timeout)
+
+    def submit(self, job_id: str, job: dict, duration: float, priority: int = 0, **context) -> str:
+        """
+        Queue a job.
+
+        Returns:
+            QUEUED, DUPLICATE (already queued, running or recently finished), QUEUE_FULL
+            (admission control) or STOPPED.
+        """
+        with self._changed:
+            if self._stopped:
+                return STOPPED
+            if job_id in self._queued or job_id in self._running or job_id in self._finished_ids:
+                return DUPLICATE
+            if self.max_queue is not None and len(self._queued) >= self.max_queue:
+                return QUEUE_FULL
+            task = Task(job_id, job, duration, priority, context)
+            self._queued[job_id] = task
+            heapq.heappush(self._heap, (self._key(task), next(self._seq), task))
+            self._changed.notify()
+        return QUEUED
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job; returns False if it is unknown or finished.
+        A queued job is reported to on_cancel, a running one by the runner.
+        """
+        with self._changed:
+            task = self._queued.pop(job_id, None) or self._running.get(job_id)
+            if task is None:
+                return False
+            task.cancelled.set()
+            queued = task.started_at is None
+            # a cancelled queued job never runs: remember it for deduplication
+            if queued:
+                self._remember(job_id)
+        if queued:
+            self._cancelled(task)
+        return True
+
+    def _cancelled(self, task: Task):
+        """Report a queued task dropped before running (lock not held)."""
+        if self.on_cancel is None:
+            return
+        try:
+            self.on_cancel(task)
+        except Exception:
+            LOG.exception("Cancel callback failed for job %s", task.job_id)
+
+    def _key(self, task: Task) -> int:
+        return -task.priority if self.policy == "priority" else 0
+
+    def _remember(self, job_id: str):
+        """Record a finished job id (lock held), forgetting the oldest beyond history."""
+        if len(self._finished) == self._finished.maxlen:
+            self._finished_ids.discard(self._finished[0])
+        self._finished.append(job_id)
+        self._finished_ids.add(job_id)
+
+    def _slot(self):
+        """Slot thread: run the queued jobs one after the other until stop()."""
+        while True:
+            with self._changed:
+                task = None
+                while task is None:
+                    while not self._heap and not self._stopped:
+                        self._changed.wait()
+                    if self._stopped:
+                        return
+                    _, _, task = heapq.heappop(self._heap)
+                    if task.cancelled.is_set():
+                        task = None
+                del self._queued[task.job_id]
+                task.started_at = time.monotonic()
+                self._running[task.job_id] = task
+            try:
+                self.runner(task)
+            except Exception:
+                LOG.exception("Job %s failed", task.job_id)
+            finally:
+                with self._changed:
+                    del self._running[task.job_id]
+                    self._remember(task.job_id)
+
+    def estimated_start(self, pending: Iterable[float] = ()) -> float:
+        """
+        Seconds before a new job could start: the queued jobs (then the pending durations,
+        e.g. open proposals) are placed on the earliest free slot after the running ones.
+        """
+        now = time.monotonic()
+        with self._changed:
+            free = [max(0.0, t.started_at + t.duration - now) for t in self._running.values()]
+            free += [0.0] * (self.slots - len(free))
+            durations = [task.duration for _, _, task in sorted(self._heap) if not task.cancelled.is_set()]
+        durations.extend(pending)
+        heapq.heapify(free)
+        for duration in durations:
+            heapq.heapreplace(free, free[0] + duration)
+        return free[0]
+
+    def stats(self) -> dict:
+        """Occupancy: slots, busy slots and queue length."""
+        with self._changed:
+            return {"slots": self.slots, "busy_slots": len(self._running), "queue_length": len(self._queued),
+                    "max_queue": self.max_queue}
+
+    def __len__(self) -> int:
+        with self._changed:
+            return len(self._queued)
@@ -2,7 +2,8 @@
 """
 Run a small Contract Net demo:
 - Launch 3 machine agents (in separate processes ideally; for demo we run them in threads)
-- Supervisor generates 5 jobs and calls for proposals
+- Supervisor generates 5 jobs and calls for proposals (first one round after the other, then
+  all rounds in flight at once)
 """
 
 import time
@@ -18,7 +19,7 @@ LOG = logging.getLogger("run_contractnet")
 
 def run_demo(broker="localhost"):
     # define machines and capabilities
-    m1 = MachineAgent(broker, "machine_1", {"A": 2, "B": 5})
+    m1 = MachineAgent(broker, "machine_1", {"A": 2, "B": 5}, slots=2, max_queue=4)
     m2 = MachineAgent(broker, "machine_2", {"A": 3, "C": 4})
     m3 = MachineAgent(broker, "machine_3", {"B": 4, "C": 6})
 
@@ -27,6 +28,8 @@ def run_demo(broker="localhost"):
         m.start()
 
     sup = Supervisor(broker, deadline=3.0)
+    # rounds end as soon as every known machine replied: know them all before the first CfP
+    sup.wait_for_machines(3, timeout=2.0)
     jobs = [{"name": "A"}, {"name": "B"}, {"name": "C"}, {"name": "A"}, {"name": "B"}]
     try:
         for job in jobs:
@@ -35,13 +38,21 @@ def run_demo(broker="localhost"):
             LOG.info("Chosen proposal: %s", chosen)
             # wait a bit between CFPs
             time.sleep(2)
+        # pipelined rounds: every CfP is issued at once, replies are matched by round id
+        rounds = [sup.start_round(job) for job in jobs]
+        for r in rounds:
+            LOG.info("Round %s: chosen proposal %s", r.round_id, r.wait())
+        # batch round: all jobs announced at once and assigned centrally
+        time.sleep(6)
+        batch = sup.start_batch(jobs, method="makespan")
+        LOG.info("Batch assignment: %s (planned makespan %.1fs)", batch.wait(), batch.makespan)
         # Let remaining jobs finish
         time.sleep(10)
     finally:
         LOG.info("Stopping machines")
         for m in (m1, m2, m3):
             m.stop()
-        sup.mqtt.stop()
+        sup.stop()
 
 
 if __name__ == "__main__":
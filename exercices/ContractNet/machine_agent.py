@@ -2,14 +2,30 @@
 Machine agent implementation for Contract Net.
 
 Each machine has a capability table mapping job_name -> processing_time_seconds.
-When receiving a CfP it either rejects (cannot do job) or sends a proposal with estimated time.
-When accepted, it executes the job (sleep) and publishes completion.
+When receiving a CfP it either rejects (cannot do job, queue full) or sends a proposal with its
+estimated completion time: the time before its executor could start the job plus the
+processing time of the job, along with its slot occupancy and queue length.
+Both echo the round id of the CfP. A batch CfP (list of jobs) gets one proposal carrying the
+whole capability table, the backlog and the number of jobs the queue has room for; its accept
+lists the jobs to run, one after the other.
+Accepted jobs are run (sleep) by a bounded JobExecutor (see executor.py), which publishes
+each completion. A proposal reserves its processing time in the backlog until the round is
+decided (accept/reject, or reservation_timeout), so that the bids of concurrent rounds
+account for each other; a batch proposal reserves the jobs of the batch it can do, as many
+as its queue has room for (the longest ones: the most it can be given).
+
+Machines announce themselves with a retained message on 'contractnet/machines/{machine_id}'
+({"online": true, ...}); the same topic gets {"online": false} when they stop, or from the
+broker (last will) when they disconnect abruptly. The supervisor uses it to know how many
+replies to expect.
 """
 
 import logging
 import time
-from threading import Thread, Event
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
 
+from exercices.ContractNet.executor import DUPLICATE, QUEUED, JobExecutor, Task
 from exercices.ContractNet.mqtt_client import MQTTClient
 
 
@@ -24,70 +40,197 @@ class MachineAgent:
         broker: broker host
         machine_id: unique id
         capabilities: dict str->int mapping job_name to duration (seconds)
+        reservation_timeout: seconds a proposal stays in the backlog without accept/reject
+        slots: number of jobs the machine runs in parallel
+        policy: "fifo" or "priority" (job "priority" field, highest first)
+        max_queue: maximum number of waiting jobs; beyond it CfPs are refused (unbounded if None)
     """
 
-    def __init__(self, broker: str, machine_id: str, capabilities: dict):
+    def __init__(self, broker: str, machine_id: str, capabilities: dict, reservation_timeout: float = 30.0,
+                 slots: int = 1, policy: str = "fifo", max_queue: Optional[int] = None):
         self.mqtt = MQTTClient(broker_host=broker, client_id=machine_id)
         self.machine_id = machine_id
         self.capabilities = capabilities
-        self._busy = False
-        self._stop = Event()
+        self.executor = JobExecutor(self._run_job, slots=slots, policy=policy, max_queue=max_queue,
+                                    name=machine_id, on_cancel=self._on_cancelled)
+        # round_id -> (processing times, monotonic expiry) of the pending proposals
+        self._reserved: Dict[str, Tuple[List[float], float]] = {}
+        self.reservation_timeout = reservation_timeout
+        self._lock = Lock()
+        self._presence_topic = f"contractnet/machines/{machine_id}"
         self.mqtt.set_message_callback(self._on_message)
+        self.mqtt.set_will(self._presence_topic, {"machine_id": machine_id, "online": False})
 
     def start(self):
+        self.executor.start()
         self.mqtt.start()
         self.mqtt.subscribe("contractnet/cfp")
         self.mqtt.subscribe(f"contractnet/accept/{self.machine_id}")
         self.mqtt.subscribe(f"contractnet/reject/{self.machine_id}")
+        self.mqtt.subscribe(f"contractnet/cancel/{self.machine_id}")
+        presence = {"machine_id": self.machine_id, "online": True, "capabilities": self.capabilities,
+                    "slots": self.executor.slots}
+        self.mqtt.publish(self._presence_topic, presence, qos=1, retain=True)
         LOG.info("Machine %s started with capabilities %s", self.machine_id, self.capabilities)
 
     def stop(self):
-        self._stop.set()
+        self.executor.stop()
+        # leave the population before disconnecting so that no round waits for us
+        info = self.mqtt.publish(self._presence_topic, {"machine_id": self.machine_id, "online": False},
+                                 qos=1, retain=True)
+        info.wait_for_publish(1.0)
         self.mqtt.stop()
 
+    def _pending(self) -> list:
+        """Job durations of the pending proposals (lock held); drops the expired reservations."""
+        now = time.monotonic()
+        for round_id in [r for r, (_, expiry) in self._reserved.items() if expiry <= now]:
+            del self._reserved[round_id]
+        return [duration for durations, _ in self._reserved.values() for duration in durations]
+
+    def backlog(self) -> float:
+        """
+        Seconds before a new job could start: running and queued jobs, then the pending
+        proposals, placed on the executor slots.
+        """
+        with self._lock:
+            pending = self._pending()
+        return self.executor.estimated_start(pending)
+
+    def _reserve(self, round_id: str, durations: List[float]) -> Optional[Tuple[float, Optional[int]]]:
+        """
+        Add the jobs of a proposal to the backlog, at most as many as the queue (with the
+        pending proposals) has room for.
+
+        Returns:
+            (backlog before the proposal, room left in the queue or None if unbounded), or
+            None if the queue is full.
+        """
+        with self._lock:
+            pending = self._pending()
+            max_queue = self.executor.max_queue
+            room = None
+            if max_queue is not None:
+                room = max_queue - len(self.executor) - len(pending)
+                if room <= 0:
+                    return None
+                # no more than room jobs can be given: reserve the longest ones
+                durations = sorted(durations)[-room:]
+            if round_id is not None:
+                self._reserved[round_id] = (durations, time.monotonic() + self.reservation_timeout)
+        return self.executor.estimated_start(pending), room
+
     def _on_message(self, topic: str, payload: dict):
         # CfP handling
         if topic == "contractnet/cfp":
-            if self._busy:
-                # do not reply if busy
-                LOG.debug("Machine %s busy; ignoring CfP", self.machine_id)
-                return
             job = payload.get("job")
+            round_id = payload.get("round_id")
+            if "jobs" in payload:
+                self._bid_batch(round_id, payload["jobs"])
+                return
             job_name = job.get("name")
             # If we can do job, send proposal
             if job_name in self.capabilities:
                 duration = self.capabilities[job_name]
+                reserved = self._reserve(round_id, [duration])
+                if reserved is None:
+                    # admission control: no room for one more job
+                    reject = {"machine_id": self.machine_id, "round_id": round_id, "job": job, "reason": "queue_full"}
+                    self.mqtt.publish("contractnet/reject", reject)
+                    return
+                backlog, _ = reserved
                 proposal = {
                     "machine_id": self.machine_id,
+                    "round_id": round_id,
                     "job": job,
-                    "time": duration
+                    "time": duration,
+                    "backlog": backlog,
+                    "completion": backlog + duration,
+                    **self.executor.stats()
                 }
-                LOG.info("Machine %s sending proposal for job %s -> %s", self.machine_id, job_name, duration)
+                LOG.info("Machine %s sending proposal for job %s -> %s (backlog %.1fs)", self.machine_id, job_name,
+                         duration, backlog)
                 self.mqtt.publish("contractnet/proposal", proposal)
             else:
-                # send explicit reject if desired 
-                reject = {"machine_id": self.machine_id, "job": job, "reason": "cannot_do"}
+                # explicit reject: cannot do the job
+                reject = {"machine_id": self.machine_id, "round_id": round_id, "job": job, "reason": "cannot_do"}
                 self.mqtt.publish("contractnet/reject", reject)
         elif topic == f"contractnet/accept/{self.machine_id}":
-            # we received the accept for the job
-            job = payload.get("job")
-            LOG.info("Machine %s accepted job %s", self.machine_id, job)
-            # start job execution in background thread
-            Thread(target=self._execute_job, args=(job,), daemon=True).start()
+            # we received the accept for the job (or the job list of a batch round)
+            jobs = payload.get("jobs") or [payload.get("job")]
+            LOG.info("Machine %s accepted jobs %s", self.machine_id, jobs)
+            self._submit(jobs, payload.get("round_id"))
         elif topic == f"contractnet/reject/{self.machine_id}":
+            with self._lock:
+                self._reserved.pop(payload.get("round_id"), None)
             LOG.info("Machine %s was rejected for job: %s", self.machine_id, payload)
+        elif topic == f"contractnet/cancel/{self.machine_id}":
+            job_id = payload.get("job_id")
+            cancelled = self.executor.cancel(job_id)
+            LOG.info("Machine %s cancel %s: %s", self.machine_id, job_id, "done" if cancelled else "unknown job")
 
-    def _execute_job(self, job: dict):
+    def _bid_batch(self, round_id: str, jobs: list):
         """
-        Execute job (simulate by sleeping for the declared duration).
-        Publish completion to contractnet/done.
+        Answer a batch CfP with the whole capability table and the room left in the queue
+        ("capacity", null if unbounded), or refuse it. The jobs of the batch the machine can
+        do, up to that room, stay reserved until the accept/reject.
+        """
+        durations = [self.capabilities[job.get("name")] for job in jobs if job.get("name") in self.capabilities]
+        if not durations:
+            reject = {"machine_id": self.machine_id, "round_id": round_id, "reason": "cannot_do"}
+            self.mqtt.publish("contractnet/reject", reject)
+            return
+        reserved = self._reserve(round_id, durations)
+        if reserved is None:
+            reject = {"machine_id": self.machine_id, "round_id": round_id, "reason": "queue_full"}
+            self.mqtt.publish("contractnet/reject", reject)
+            return
+        backlog, room = reserved
+        proposal = {"machine_id": self.machine_id, "round_id": round_id, "capabilities": self.capabilities,
+                    "backlog": backlog, "capacity": room, **self.executor.stats()}
+        LOG.info("Machine %s sending batch proposal for %d jobs", self.machine_id, len(jobs))
+        self.mqtt.publish("contractnet/proposal", proposal)
+
+    def _submit(self, jobs: list, round_id: Optional[str] = None):
+        """
+        Hand accepted jobs to the executor. Jobs without "id" are identified by round id and
+        position, so a duplicated accept is ignored; jobs refused by admission control are
+        reported on contractnet/done with status "refused".
         """
-        job_name = job.get("name")
-        duration = self.capabilities.get(job_name, 0)
-        self._busy = True
-        LOG.info("Machine %s starting job %s for %s seconds", self.machine_id, job_name, duration)
-        time.sleep(duration)
-        done = {"machine_id": self.machine_id, "job": job, "duration": duration, "timestamp": int(time.time())}
+        with self._lock:
+            self._reserved.pop(round_id, None)
+        for index, job in enumerate(jobs):
+            job_id = job.get("id") or f"{round_id}/{index}"
+            duration = self.capabilities.get(job.get("name"), 0)
+            status = self.executor.submit(job_id, job, duration, priority=job.get("priority", 0), round_id=round_id)
+            if status == DUPLICATE:
+                LOG.info("Machine %s ignoring duplicate job %s", self.machine_id, job_id)
+            elif status != QUEUED:
+                LOG.warning("Machine %s refusing job %s: %s", self.machine_id, job_id, status)
+                self._publish_done(job_id, job, round_id, "refused", reason=status)
+
+    def _publish_done(self, job_id: str, job: dict, round_id: Optional[str], status: str, **extra):
+        """Publish the outcome of a job to contractnet/done."""
+        done = {"machine_id": self.machine_id, "round_id": round_id, "job_id": job_id, "job": job,
+                "status": status, "timestamp": int(time.time()), **extra}
         self.mqtt.publish("contractnet/done", done)
+
+    def _on_cancelled(self, task: Task):
+        """Report a job cancelled (or dropped at stop) before it started."""
+        LOG.info("Machine %s cancelled queued job %s", self.machine_id, task.job.get("name"))
+        self._publish_done(task.job_id, task.job, task.context.get("round_id"), "cancelled")
+
+    def _run_job(self, task: Task):
+        """
+        Execute job (simulate by sleeping for the declared duration) on an executor slot.
+        Publish completion to contractnet/done.
+        """
+        job_name = task.job.get("name")
+        round_id = task.context.get("round_id")
+        LOG.info("Machine %s starting job %s for %s seconds", self.machine_id, job_name, task.duration)
+        if task.cancelled.wait(task.duration):
+            LOG.info("Machine %s cancelled job %s", self.machine_id, job_name)
+            self._publish_done(task.job_id, task.job, round_id, "cancelled")
+            return
+        self._publish_done(task.job_id, task.job, round_id, "done", duration=task.duration)
         LOG.info("Machine %s completed job %s", self.machine_id, job_name)
-        self._busy = False
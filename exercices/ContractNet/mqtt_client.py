@@ -40,6 +40,10 @@ class MQTTClient:
     def set_message_callback(self, cb):
         self._message_callback = cb
 
+    def set_will(self, topic, payload, qos: int = 1, retain: bool = True):
+        """Message published by the broker if the connection is lost (call before start())."""
+        self._client.will_set(topic, json.dumps(payload), qos=qos, retain=retain)
+
     def start(self):
         self._client.connect(self.broker_host)
         self._client.loop_start()
@@ -51,8 +55,8 @@ class MQTTClient:
             self._client.disconnect()
             self._running = False
 
-    def subscribe(self, topic):
-        self._client.subscribe(topic)
+    def subscribe(self, topic, qos: int = 0):
+        self._client.subscribe(topic, qos=qos)
 
-    def publish(self, topic, payload):
-        self._client.publish(topic, json.dumps(payload))
+    def publish(self, topic, payload, qos: int = 0, retain: bool = False):
+        return self._client.publish(topic, json.dumps(payload), qos=qos, retain=retain)
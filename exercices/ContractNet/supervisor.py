@@ -2,79 +2,391 @@
 Supervisor implementing the Contract Net Protocol rounds.
 
 The supervisor:
-- publishes CfP on 'contractnet/cfp'
-- waits for proposals on 'contractnet/proposal' for a deadline
-- selects best proposal (min time) and notifies acceptance/rejection
+- tracks the machine population on 'contractnet/machines/+' (retained presence messages)
+- publishes CfP on 'contractnet/cfp', each with a unique round id
+- collects proposals on 'contractnet/proposal' and refusals on 'contractnet/reject', matched
+  to their round by the echoed round id, until every known machine has replied, or the deadline
+- selects best proposal (earliest completion: machine backlog + processing time) and notifies
+  acceptance/rejection
+
+Batch rounds announce a list of jobs in one CfP ({"round_id", "jobs": [...]}); machines
+bid their whole capability table and how many jobs they have room for in one proposal, and
+the supervisor assigns the jobs centrally (see allocation.py), sending one accept per machine
+with its job list.
+
+Any number of rounds can be in flight: each one has its own state and deadline, and a
+single reaper thread closes the rounds whose deadline expired.
 """
 
+import heapq
+import itertools
 import logging
 import time
-from threading import Event
+import uuid
+from threading import Condition, Event, Lock, Thread
+from typing import Callable, Dict, List, Optional, Set
 
+from exercices.ContractNet.allocation import ALLOCATORS, INFEASIBLE, makespan
 from exercices.ContractNet.mqtt_client import MQTTClient
 
 
 LOG = logging.getLogger("supervisor")
 
 
+class Round:
+    """
+    State of one CfP round.
+
+    Attributes:
+        round_id: unique id, echoed by every message of the round.
+        job: job announced.
+        expected: machines online when the CfP was issued.
+        replied: machines that proposed or refused.
+        proposals: proposals received.
+        deadline: monotonic time at which the round closes at the latest.
+        best: selected proposal (None if no proposal or still open).
+        complete: True if every expected machine replied before the deadline.
+    """
+
+    def __init__(self, round_id: str, job: dict, expected: Set[str], deadline: float,
+                 callback: Optional[Callable[["Round"], None]] = None):
+        self.round_id = round_id
+        self.job = job
+        self.expected = expected
+        self.replied: Set[str] = set()
+        self.proposals: List[dict] = []
+        self.started = time.monotonic()
+        self.deadline = deadline
+        self.best: Optional[dict] = None
+        self.complete = False
+        self.callback = callback
+        self._closed = Event()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Block until the round is closed; return the selected proposal."""
+        self._closed.wait(timeout)
+        return self.best
+
+
+class BatchRound(Round):
+    """
+    State of a batch CfP round.
+
+    Attributes:
+        jobs: jobs announced.
+        method: allocation method (key of allocation.ALLOCATORS).
+        assignment: machine_id -> jobs to run, in order (set when the round closes).
+        unassigned: jobs no bidding machine can do or has room for.
+        makespan: planned time at which the last machine finishes.
+    """
+
+    def __init__(self, round_id: str, jobs: List[dict], expected: Set[str], deadline: float,
+                 callback: Optional[Callable[["Round"], None]] = None, method: str = "hungarian"):
+        super().__init__(round_id, None, expected, deadline, callback)
+        self.jobs = jobs
+        self.method = method
+        self.assignment: Dict[str, List[dict]] = {}
+        self.unassigned: List[dict] = []
+        self.makespan = 0.0
+
+    def wait(self, timeout: Optional[float] = None) -> Dict[str, List[dict]]:
+        """Block until the round is closed; return the assignment."""
+        self._closed.wait(timeout)
+        return self.assignment
+
+
 class Supervisor:
     """
     Supervisor that coordinates job allocation rounds.
+
+    A round ends as soon as every machine online when the CfP was issued has proposed or
+    refused, or gone offline; the deadline only bounds the wait for machines that never
+    answer. A round issued without any known machine lasts the whole deadline.
+
+    Usage:
+        sup = Supervisor("localhost", deadline=3.0)
+        best = sup.call_for_proposals({"name": "A"})          # blocking
+        rounds = [sup.start_round(job) for job in jobs]       # pipelined
+        results = [r.wait() for r in rounds]
+        assignment = sup.start_batch(jobs).wait()             # one round for all jobs
+        sup.stop()
     """
 
     def __init__(self, broker: str, deadline: float = 5.0):
         """
         Args:
             broker: broker host
-            deadline: time to wait for proposals (seconds)
+            deadline: maximum time to wait for proposals (seconds)
         """
         self.mqtt = MQTTClient(broker_host=broker, client_id="supervisor")
         self.deadline = deadline
-        self.proposals = []
-        self._waiting = Event()
+        # machine_id -> presence message of the online machines
+        self.machines: Dict[str, dict] = {}
+        self._machines_changed = Condition()
+        # round_id -> open round
+        self._rounds: Dict[str, Round] = {}
+        self._lock = Lock()
+        self._round_ids = itertools.count(1)
+        self._prefix = uuid.uuid4().hex[:8]
+        # (deadline, round_id) of the open rounds, watched by the reaper thread
+        self._deadlines = []
+        self._deadline_changed = Condition(self._lock)
+        self._stopped = False
+        self._reaper = Thread(target=self._reap, name="supervisor-reaper", daemon=True)
+        self._reaper.start()
         self.mqtt.set_message_callback(self._on_message)
         self.mqtt.start()
-        # subscribe to proposals and completions
+        # subscribe to presence, proposals, refusals and completions
+        self.mqtt.subscribe("contractnet/machines/+", qos=1)
         self.mqtt.subscribe("contractnet/proposal")
+        self.mqtt.subscribe("contractnet/reject")
         self.mqtt.subscribe("contractnet/done")
 
+    def stop(self):
+        """Close the open rounds without awarding them (every proposal is rejected) and disconnect."""
+        with self._lock:
+            self._stopped = True
+            rounds = list(self._rounds.values())
+            self._deadline_changed.notify()
+        for r in rounds:
+            self._close(r, award=False)
+        self._reaper.join(timeout=1.0)
+        self.mqtt.stop()
+
     def _on_message(self, topic: str, payload: dict):
-        """Handle proposals and completed notifications"""
-        if topic == "contractnet/proposal":
-            LOG.info("Supervisor received proposal: %s", payload)
-            self.proposals.append(payload)
+        """Handle presence, proposals, refusals and completed notifications"""
+        if topic.startswith("contractnet/machines/"):
+            self._on_presence(topic.rsplit("/", 1)[-1], payload)
+        elif topic in ("contractnet/proposal", "contractnet/reject"):
+            self._on_reply(topic == "contractnet/proposal", payload)
         elif topic == "contractnet/done":
-            LOG.info("Job completed: %s", payload)
+            if payload.get("status", "done") == "done":
+                LOG.info("Job completed: %s", payload)
+            else:
+                LOG.warning("Job %s: %s", payload.get("status"), payload)
 
-    def call_for_proposals(self, job: dict):
+    def _on_reply(self, is_proposal: bool, payload: dict):
+        """Record a proposal or a refusal in its round."""
+        round_id = payload.get("round_id")
+        with self._lock:
+            r = self._rounds.get(round_id)
+            if r is None:
+                LOG.debug("Ignoring reply for closed or unknown round %s: %s", round_id, payload)
+                return
+            LOG.info("Supervisor received %s for round %s: %s", "proposal" if is_proposal else "refusal",
+                     round_id, payload)
+            if is_proposal:
+                r.proposals.append(payload)
+            r.replied.add(payload.get("machine_id"))
+            done = r.expected and r.expected <= r.replied
+        if done:
+            self._close(r, complete=True)
+
+    def _on_presence(self, machine_id: str, payload: dict):
+        """Update the machine population; a machine leaving is no longer waited for."""
+        online = isinstance(payload, dict) and bool(payload.get("online"))
+        with self._machines_changed:
+            if online:
+                self.machines[machine_id] = payload
+            else:
+                self.machines.pop(machine_id, None)
+            self._machines_changed.notify_all()
+        LOG.info("Machine %s is %s", machine_id, "online" if online else "offline")
+        if online:
+            return
+        with self._lock:
+            done = []
+            for r in self._rounds.values():
+                if machine_id in r.expected:
+                    r.expected.discard(machine_id)
+                    # the last expected machine leaving also closes the round
+                    if r.expected <= r.replied:
+                        done.append(r)
+        for r in done:
+            self._close(r, complete=True)
+
+    def wait_for_machines(self, count: int, timeout: float = 5.0) -> int:
         """
-        Issue a CfP and wait for proposals until deadline
-        Then choose best proposal (lowest time) and send accept/reject messages
+        Wait until at least count machines are online.
+
+        Returns:
+            the number of online machines (may be lower than count on timeout).
         """
-        # Clear previous proposals
-        self.proposals = []
-        cfp = {"job": job, "timestamp": int(time.time())}
-        LOG.info("Publishing CfP: %s", cfp)
+        with self._machines_changed:
+            self._machines_changed.wait_for(lambda: len(self.machines) >= count, timeout)
+            return len(self.machines)
+
+    def start_round(self, job: dict, callback: Optional[Callable[[Round], None]] = None,
+                    deadline: Optional[float] = None) -> Round:
+        """
+        Issue a CfP without waiting for the replies.
+
+        Args:
+            job: job description.
+            callback: called with the round once it is closed (on an MQTT or reaper thread).
+            deadline: maximum seconds to wait for the replies (default: self.deadline).
+        Returns:
+            the open round (see Round.wait).
+        """
+        round_id = f"{self._prefix}-{next(self._round_ids)}"
+        with self._machines_changed:
+            expected = set(self.machines)
+        deadline = self.deadline if deadline is None else deadline
+        r = Round(round_id, job, expected, time.monotonic() + deadline, callback)
+        self._open(r)
+        cfp = {"round_id": round_id, "job": job, "timestamp": int(time.time())}
+        LOG.info("Publishing CfP (expecting %d machines): %s", len(expected), cfp)
+        self.mqtt.publish("contractnet/cfp", cfp)
+        return r
+
+    def start_batch(self, jobs: List[dict], callback: Optional[Callable[[Round], None]] = None,
+                    deadline: Optional[float] = None, method: str = "hungarian") -> BatchRound:
+        """
+        Announce a list of jobs in one CfP without waiting for the replies.
+
+        Args:
+            jobs: job descriptions.
+            callback: called with the round once it is closed (on an MQTT or reaper thread).
+            deadline: maximum seconds to wait for the replies (default: self.deadline).
+            method: "hungarian" (minimum total completion time) or "makespan".
+        Returns:
+            the open round (see BatchRound.wait).
+        """
+        if method not in ALLOCATORS:
+            raise ValueError(f"unknown allocation method {method!r}, available: {sorted(ALLOCATORS)}")
+        round_id = f"{self._prefix}-{next(self._round_ids)}"
+        with self._machines_changed:
+            expected = set(self.machines)
+        deadline = self.deadline if deadline is None else deadline
+        r = BatchRound(round_id, list(jobs), expected, time.monotonic() + deadline, callback, method)
+        self._open(r)
+        cfp = {"round_id": round_id, "jobs": r.jobs, "timestamp": int(time.time())}
+        LOG.info("Publishing batch CfP of %d jobs (expecting %d machines): %s", len(r.jobs), len(expected), cfp)
         self.mqtt.publish("contractnet/cfp", cfp)
-        # Wait for deadline
-        LOG.info("Waiting %.2f seconds for proposals", self.deadline)
-        time.sleep(self.deadline)
+        return r
+
+    def _open(self, r: Round):
+        """Register an open round and its deadline."""
+        with self._lock:
+            self._rounds[r.round_id] = r
+            heapq.heappush(self._deadlines, (r.deadline, r.round_id))
+            self._deadline_changed.notify()
+
+    def cancel_job(self, machine_id: str, job_id: str):
+        """
+        Ask a machine to cancel a queued or running job. Jobs without "id" are identified
+        as "{round_id}/{position in the accept}".
+        """
+        self.mqtt.publish(f"contractnet/cancel/{machine_id}", {"job_id": job_id})
+
+    def call_for_proposals(self, job: dict):
+        """
+        Issue a CfP and wait for proposals until every known machine replied or the deadline.
+        Then choose the proposal with the earliest completion (machine backlog + processing
+        time; ties go to the shortest queue) and send accept/reject messages
+        """
+        return self.start_round(job).wait()
+
+    def _reap(self):
+        """Close the rounds whose deadline expired."""
+        while True:
+            with self._lock:
+                while not self._stopped:
+                    # drop the entries of rounds already closed
+                    while self._deadlines and self._deadlines[0][1] not in self._rounds:
+                        heapq.heappop(self._deadlines)
+                    if not self._deadlines:
+                        self._deadline_changed.wait()
+                        continue
+                    delay = self._deadlines[0][0] - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._deadline_changed.wait(delay)
+                if self._stopped:
+                    return
+                _, round_id = heapq.heappop(self._deadlines)
+                r = self._rounds.get(round_id)
+            if r is not None:
+                self._close(r)
+
+    def _close(self, r: Round, complete: bool = False, award: bool = True):
+        """
+        Close a round once: choose the best proposal and send accept/reject messages, or,
+        when award is False (shutdown), reject every proposal.
+        """
+        with self._lock:
+            if self._rounds.pop(r.round_id, None) is None:
+                return
+            r.complete = complete
+            proposals = list(r.proposals)
+        missing = r.expected - r.replied
+        if award:
+            LOG.info("Round %s closed after %.3f seconds (%s)", r.round_id, time.monotonic() - r.started,
+                     "all replied" if complete else f"deadline, no reply from {sorted(missing)}")
+        else:
+            LOG.info("Round %s cancelled at shutdown, rejecting %d proposals", r.round_id, len(proposals))
         # Evaluate
-        if not self.proposals:
-            LOG.warning("No proposals received for job %s", job)
-            return None
-        # pick proposal with min 'time'
-        best = min(self.proposals, key=lambda p: p.get("time", float("inf")))
-        LOG.info("Best proposal selected: %s", best)
-        # send accept to the chosen machine
-        machine_id = best.get("machine_id")
-        accept_topic = f"contractnet/accept/{machine_id}"
-        accept_message = {"job": job, "selected": machine_id}
-        self.mqtt.publish(accept_topic, accept_message)
-        # send rejects to others
-        for p in self.proposals:
-            m_id = p.get("machine_id")
-            if m_id != machine_id:
-                reject_topic = f"contractnet/reject/{m_id}"
-                self.mqtt.publish(reject_topic, {"job": job, "rejected": m_id})
-        return best
+        if not award:
+            for p in proposals:
+                m_id = p.get("machine_id")
+                reject = {"round_id": r.round_id, "rejected": m_id}
+                if r.job is not None:
+                    reject["job"] = r.job
+                self.mqtt.publish(f"contractnet/reject/{m_id}", reject)
+        elif isinstance(r, BatchRound):
+            self._award_batch(r, proposals)
+        elif not proposals:
+            LOG.warning("No proposals received for job %s", r.job)
+        else:
+            # pick proposal with min 'completion' (queue backlog included), or min 'time';
+            # ties go to the machine with the shortest queue
+            best = min(proposals, key=lambda p: (p.get("completion", p.get("time", float("inf"))),
+                                                 p.get("queue_length", 0)))
+            LOG.info("Best proposal selected: %s", best)
+            # send accept to the chosen machine
+            machine_id = best.get("machine_id")
+            accept_topic = f"contractnet/accept/{machine_id}"
+            accept_message = {"round_id": r.round_id, "job": r.job, "selected": machine_id}
+            self.mqtt.publish(accept_topic, accept_message)
+            # send rejects to others
+            for p in proposals:
+                m_id = p.get("machine_id")
+                if m_id != machine_id:
+                    reject_topic = f"contractnet/reject/{m_id}"
+                    self.mqtt.publish(reject_topic, {"round_id": r.round_id, "job": r.job, "rejected": m_id})
+            r.best = best
+        r._closed.set()
+        if r.callback is not None:
+            try:
+                r.callback(r)
+            except Exception:
+                LOG.exception("Round callback failed for %s", r.round_id)
+
+    def _award_batch(self, r: BatchRound, proposals: List[dict]):
+        """Assign the jobs of a batch round and send one accept per machine with its job list."""
+        machine_ids = [p.get("machine_id") for p in proposals]
+        tables = [p.get("capabilities") or {} for p in proposals]
+        times = [[table.get(job.get("name"), INFEASIBLE) for table in tables] for job in r.jobs]
+        loads = [p.get("backlog", 0.0) for p in proposals]
+        capacities = [p.get("capacity") for p in proposals]
+        if machine_ids:
+            schedule, unassigned = ALLOCATORS[r.method](times, loads, capacities)
+        else:
+            schedule, unassigned = [], list(range(len(r.jobs)))
+        r.unassigned = [r.jobs[j] for j in unassigned]
+        r.makespan = makespan(times, schedule, loads)
+        for machine_id, jobs in zip(machine_ids, schedule):
+            if jobs:
+                r.assignment[machine_id] = [r.jobs[j] for j in jobs]
+                accept = {"round_id": r.round_id, "jobs": r.assignment[machine_id], "selected": machine_id}
+                self.mqtt.publish(f"contractnet/accept/{machine_id}", accept)
+            else:
+                self.mqtt.publish(f"contractnet/reject/{machine_id}", {"round_id": r.round_id, "rejected": machine_id})
+        if r.unassigned:
+            LOG.warning("No machine can do or has room for jobs %s", r.unassigned)
+        LOG.info("Batch round %s assigned (%s, planned makespan %.1f): %s", r.round_id, r.method, r.makespan,
+                 r.assignment)
@@ -0,0 +1,200 @@
+"""
+Tests of the batch allocation: small random cases checked against exhaustive search.
+"""
+
+import itertools
+import random
+
+import pytest
+
+from exercices.ContractNet.allocation import (
+    INFEASIBLE, hungarian, makespan, min_makespan, min_total_completion,
+)
+
+
+def _total_completion(times, schedule, loads=None):
+    """Sum of the job completion times of a schedule."""
+    loads = loads or [0.0] * len(schedule)
+    total = 0.0
+    for i, jobs in enumerate(schedule):
+        t = loads[i]
+        for j in jobs:
+            t += times[j][i]
+            total += t
+    return total
+
+
+def _best_total_completion(times, loads):
+    """Exhaustive search: every job -> machine mapping, shortest jobs first on each machine."""
+    machines = len(times[0])
+    best = INFEASIBLE
+    for mapping in itertools.product(range(machines), repeat=len(times)):
+        if any(times[j][i] == INFEASIBLE for j, i in enumerate(mapping)):
+            continue
+        schedule = [sorted((j for j, m in enumerate(mapping) if m == i), key=lambda j: times[j][i])
+                    for i in range(machines)]
+        best = min(best, _total_completion(times, schedule, loads))
+    return best
+
+
+def _random_times(rng, jobs, machines, infeasible=0.0):
+    """Processing times where each job stays feasible on at least one machine."""
+    times = []
+    for _ in range(jobs):
+        row = [INFEASIBLE if rng.random() < infeasible else rng.randint(1, 9) for _ in range(machines)]
+        if all(t == INFEASIBLE for t in row):
+            row[rng.randrange(machines)] = rng.randint(1, 9)
+        times.append(row)
+    return times
+
+
+def _check_schedule(times, schedule, unassigned):
+    """Every job appears exactly once, on a machine able to do it, or in unassigned."""
+    placed = [j for jobs in schedule for j in jobs]
+    assert sorted(placed + unassigned) == list(range(len(times)))
+    for i, jobs in enumerate(schedule):
+        for j in jobs:
+            assert times[j][i] != INFEASIBLE
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_hungarian_matches_brute_force(seed):
+    rng = random.Random(seed)
+    rows = rng.randint(1, 5)
+    cols = rng.randint(rows, 6)
+    cost = [[rng.randint(0, 20) for _ in range(cols)] for _ in range(rows)]
+    assignment = hungarian(cost)
+    assert len(set(assignment)) == rows
+    best = min(sum(cost[r][c] for r, c in enumerate(perm)) for perm in itertools.permutations(range(cols), rows))
+    assert sum(cost[r][c] for r, c in enumerate(assignment)) == best
+
+
+def test_hungarian_needs_enough_columns():
+    assert hungarian([]) == []
+    with pytest.raises(ValueError):
+        hungarian([[1], [2]])
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_min_total_completion_matches_brute_force(seed):
+    rng = random.Random(seed)
+    machines = rng.randint(1, 3)
+    times = _random_times(rng, rng.randint(1, 5), machines, infeasible=0.3)
+    loads = [rng.choice([0.0, 0.0, rng.randint(1, 10)]) for _ in range(machines)]
+    schedule, unassigned = min_total_completion(times, loads)
+    _check_schedule(times, schedule, unassigned)
+    assert unassigned == []
+    assert _total_completion(times, schedule, loads) == pytest.approx(_best_total_completion(times, loads))
+
+
+def _best_makespan(times, loads):
+    """Exhaustive search of the minimum makespan."""
+    machines = len(times[0])
+    return min(
+        makespan(times, [[j for j, m in enumerate(mapping) if m == i] for i in range(machines)], loads)
+        for mapping in itertools.product(range(machines), repeat=len(times))
+        if all(times[j][i] != INFEASIBLE for j, i in enumerate(mapping))
+    )
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_min_makespan_is_within_greedy_bound(seed):
+    rng = random.Random(seed)
+    machines = rng.randint(1, 3)
+    times = _random_times(rng, rng.randint(1, 6), machines, infeasible=0.3)
+    schedule, unassigned = min_makespan(times)
+    _check_schedule(times, schedule, unassigned)
+    assert unassigned == []
+    # each job ends no later than on its fastest machine: at most the sum of the shortest
+    # times, itself at most machines times the optimum on unrelated machines
+    result = makespan(times, schedule)
+    assert result <= sum(min(row) for row in times)
+    assert result <= machines * _best_makespan(times, None)
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_min_makespan_with_loads_is_within_greedy_bound(seed):
+    rng = random.Random(seed)
+    machines = rng.randint(1, 3)
+    times = _random_times(rng, rng.randint(1, 6), machines, infeasible=0.3)
+    loads = [rng.choice([0.0, rng.randint(1, 10)]) for _ in range(machines)]
+    schedule, unassigned = min_makespan(times, loads)
+    _check_schedule(times, schedule, unassigned)
+    result = makespan(times, schedule, loads)
+    assert result <= max(loads) + sum(min(row) for row in times)
+    assert result <= (machines + 1) * _best_makespan(times, loads)
+
+
+def test_min_makespan_places_longest_jobs_first():
+    # in arrival order the greedy rule would give [[0, 2], [1]], makespan 3
+    times = [[1, 1], [1, 1], [2, 2]]
+    schedule, unassigned = min_makespan(times)
+    assert schedule == [[2], [0, 1]]
+    assert unassigned == []
+    assert makespan(times, schedule) == 2 == _best_makespan(times, None)
+
+
+def test_min_makespan_accounts_for_loads():
+    # machine 0 already has 4 seconds of work: both jobs go to machine 1
+    times = [[3, 3], [2, 2]]
+    schedule, unassigned = min_makespan(times, loads=[4, 0])
+    assert schedule == [[], [0, 1]]
+    assert unassigned == []
+    assert makespan(times, schedule, loads=[4, 0]) == 5
+    assert min_makespan(times) == ([[0], [1]], [])
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_min_total_completion_respects_capacities(seed):
+    rng = random.Random(seed)
+    machines = rng.randint(1, 3)
+    times = _random_times(rng, rng.randint(1, 5), machines, infeasible=0.3)
+    loads = [rng.choice([0.0, rng.randint(1, 10)]) for _ in range(machines)]
+    capacities = [rng.choice([None, 0, 1, 2]) for _ in range(machines)]
+    schedule, unassigned = min_total_completion(times, loads, capacities)
+    _check_schedule(times, schedule, unassigned)
+    for jobs, capacity in zip(schedule, capacities):
+        assert capacity is None or len(jobs) <= capacity
+    # exhaustive search: as many jobs as possible, then the lowest total completion time
+    best = (len(times) + 1, INFEASIBLE)
+    for mapping in itertools.product(range(-1, machines), repeat=len(times)):
+        if any(i >= 0 and times[j][i] == INFEASIBLE for j, i in enumerate(mapping)):
+            continue
+        candidate = [sorted((j for j, m in enumerate(mapping) if m == i), key=lambda j: times[j][i])
+                     for i in range(machines)]
+        if any(c is not None and len(jobs) > c for jobs, c in zip(candidate, capacities)):
+            continue
+        best = min(best, (mapping.count(-1), _total_completion(times, candidate, loads)))
+    assert len(unassigned) == best[0]
+    assert _total_completion(times, schedule, loads) == pytest.approx(best[1])
+
+
+def test_min_makespan_respects_capacities():
+    times = [[4, 5], [3, 6], [2, 7]]
+    schedule, unassigned = min_makespan(times, capacities=[1, 1])
+    assert schedule == [[0], [1]]
+    assert unassigned == [2]
+    assert min_makespan(times, capacities=[None, 0]) == ([[0, 1, 2], []], [])
+
+
+@pytest.mark.parametrize("allocate", [min_total_completion, min_makespan])
+def test_jobs_no_machine_can_do_are_unassigned(allocate):
+    times = [[2, INFEASIBLE], [INFEASIBLE, INFEASIBLE], [INFEASIBLE, 3]]
+    schedule, unassigned = allocate(times)
+    assert unassigned == [1]
+    assert schedule == [[0], [2]]
+
+
+@pytest.mark.parametrize("allocate", [min_total_completion, min_makespan])
+def test_nothing_to_allocate(allocate):
+    assert allocate([]) == ([], [])
+    # no machine at all: every job is unassigned
+    assert allocate([[], []]) == ([], [0, 1])
+    assert allocate([[INFEASIBLE, INFEASIBLE]]) == ([[], []], [0])
+
+
+def test_makespan_includes_loads():
+    times = [[2, 5], [3, 1]]
+    assert makespan(times, [[0], [1]]) == 2
+    assert makespan(times, [[0], [1]], loads=[0, 4]) == 5
+    assert makespan(times, [[], []]) == 0
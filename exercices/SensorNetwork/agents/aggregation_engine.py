@@ -0,0 +1,134 @@
+"""
+Aggregation engine.
+
+A single agent computing the averages of every room and measurement: it subscribes once
+to the sensor topics of the whole home and publishes every home/{room}/{measurement}/average
+topic from one pass over its state, instead of one AveragingAgent (and one broker
+subscription) per (room, measurement).
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+from .averaging_agent import AverageWindow
+from .base_agent import Agent
+from .readings import iter_readings
+from .scheduler import Scheduler, TimerHandle, get_scheduler
+
+LOG = logging.getLogger("aggregation_engine")
+
+# last topic levels / measurements carrying no sensor readings
+_SKIPPED_LEAVES = frozenset(("average",))
+_SKIPPED_MEASUREMENTS = frozenset(("control",))
+
+
+class AggregationEngine(Agent):
+    """
+    Agent averaging the readings of all rooms and measurements.
+
+    Subscribes to home/+/+/+ (sensor readings and batch frames) and publishes the same
+    payloads as AveragingAgent on home/{room}/{measurement}/average. The per-(room,
+    measurement) windows are created on the first reading and kept in a dense list, so a
+    publication is a single pass over that list.
+
+    Usage:
+        engine = AggregationEngine(mqtt_client, window_size=20, publish_period=5.0)
+        engine.start()
+    """
+
+    def __init__(self, mqtt_client, window_size: int = 10, publish_period: float = 5.0,
+                 scheduler: Optional[Scheduler] = None, measurements: Optional[Iterable[str]] = None,
+                 topic_filter: str = "home/+/+/+", **window_options):
+        """
+        Args:
+            mqtt_client: MQTTClient instance.
+            window_size: number of samples per sensor in count windows.
+            publish_period: seconds between two publication passes.
+            scheduler: Scheduler running the publications (process-wide one by default).
+            measurements: measurements to average (all by default).
+            topic_filter: subscription covering the sensor topics home/{room}/{measurement}/{sensor}.
+            **window_options: window, window_seconds, slide, allowed_lateness and the optional
+                aggregates extrema, ewma_alpha, percentiles (see AverageWindow).
+        """
+        super().__init__(mqtt_client)
+        self.window_size = window_size
+        self.publish_period = publish_period
+        self.scheduler = scheduler
+        self.measurements = frozenset(measurements) if measurements is not None else None
+        window_options.setdefault("window_seconds", publish_period)
+        self._window_options = window_options
+        # dense state: (room, measurement) -> index in _states
+        self._index: Dict[Tuple[str, str], int] = {}
+        self._states: List[AverageWindow] = []
+        self._timer: Optional[TimerHandle] = None
+        self.mqtt.subscribe(topic_filter, callback=self._on_message)
+        LOG.info("AggregationEngine subscribed to %s", topic_filter)
+
+    def __len__(self) -> int:
+        """Number of (room, measurement) pairs aggregated."""
+        return len(self._states)
+
+    def start(self):
+        """Publish every average each publish_period seconds on the scheduler."""
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = (self.scheduler or get_scheduler()).schedule(self.publish_period, self._publish_averages)
+            self._running = True
+        LOG.info("AggregationEngine started (period=%.2fs)", self.publish_period)
+
+    def stop(self):
+        """Cancel the periodic publications."""
+        with self._lock:
+            timer, self._timer = self._timer, None
+            self._running = False
+        if timer is not None:
+            (self.scheduler or get_scheduler()).cancel(timer)
+        LOG.info("AggregationEngine stopped")
+
+    def _state(self, room: str, measurement: str) -> AverageWindow:
+        """Return the window of a (room, measurement), creating it on first use (lock held)."""
+        index = self._index.get((room, measurement))
+        if index is None:
+            index = self._index[(room, measurement)] = len(self._states)
+            self._states.append(AverageWindow(room, measurement, window_size=self.window_size, **self._window_options))
+            LOG.debug("AggregationEngine now averages %s/%s", room, measurement)
+        return self._states[index]
+
+    def _on_message(self, topic: str, payload: dict):
+        """
+        Add the readings of a sensor message or batch frame to its (room, measurement) window.
+
+        Args:
+            topic: home/{room}/{measurement}/{sensor_id} or .../batch.
+            payload: decoded payload.
+        """
+        parts = topic.split("/")
+        if len(parts) != 4:
+            return
+        _, room, measurement, leaf = parts
+        if leaf in _SKIPPED_LEAVES or measurement in _SKIPPED_MEASUREMENTS:
+            return
+        if self.measurements is not None and measurement not in self.measurements:
+            return
+        state = None
+        with self._lock:
+            for sensor_id, timestamp, value in iter_readings(payload):
+                if state is None:
+                    state = self._state(room, measurement)
+                state.add(sensor_id, timestamp, value)
+
+    def _publish_averages(self):
+        """Build the payload of every (room, measurement) in one pass and publish them."""
+        with self._lock:
+            payloads = [(state.topic, state.payload()) for state in self._states]
+        published = 0
+        for topic, payload in payloads:
+            if payload is None:
+                continue
+            try:
+                self.mqtt.publish(topic, payload)
+                published += 1
+            except Exception:
+                LOG.exception("Failed to publish average on %s", topic)
+        LOG.info("AggregationEngine published %d averages", published)
@@ -0,0 +1,158 @@
+"""
+Alert state machines.
+
+AlertTracker turns a stream of per-reading anomaly verdicts into incidents: one alert when
+an incident opens, reminders at most every realert_interval seconds while it lasts, and
+one message when it clears. Hysteresis (open_after / clear_after consecutive readings)
+keeps a sensor oscillating around a threshold from flapping.
+
+Messages carry a "state" field:
+    open      first alert of an incident
+    ongoing   reminder of an open incident (rate limited)
+    cleared   the sensor went back to normal
+    summary   periodic list of the open incidents (see DetectionAgent)
+"""
+
+from typing import Dict, Hashable, List, Optional
+import itertools
+import time
+
+STATES = ("open", "ongoing", "cleared", "summary")
+
+
+class Incident:
+    """
+    Alert state of one (room, sensor).
+
+    Attributes:
+        is_open: True while an incident is open.
+        incident_id: id of the current/last incident.
+        opened_at: wall-clock time the incident opened.
+        anomalous: anomalous readings in the current incident.
+        peak_severity: largest alert severity (score / threshold) seen in the current incident.
+        last_alert: latest alert payload of the incident.
+    """
+
+    __slots__ = ("is_open", "incident_id", "opened_at", "anomalous", "peak_severity", "last_alert",
+                 "_anomalous_streak", "_normal_streak", "_last_sent")
+
+    def __init__(self):
+        self.is_open = False
+        self.incident_id: Optional[int] = None
+        self.opened_at = 0.0
+        self.anomalous = 0
+        self.peak_severity = 0.0
+        self.last_alert: Optional[dict] = None
+        self._anomalous_streak = 0
+        self._normal_streak = 0
+        self._last_sent = 0.0
+
+
+class AlertTracker:
+    """
+    Deduplication, rate limiting and hysteresis of the alerts of many sensors.
+
+    Not thread-safe: the owner serializes the calls.
+
+    Usage:
+        tracker = AlertTracker(open_after=2, clear_after=3, realert_interval=60)
+        message = tracker.observe("bedroom1_temp_bad", anomalous=True, alert=alert)
+        if message is not None:
+            publish(message)
+    """
+
+    def __init__(self, open_after: int = 1, clear_after: int = 3, realert_interval: float = 60.0):
+        """
+        Args:
+            open_after: consecutive anomalous readings opening an incident.
+            clear_after: consecutive normal readings clearing it.
+            realert_interval: minimum seconds between two messages of an open incident.
+        """
+        if open_after < 1 or clear_after < 1:
+            raise ValueError("open_after and clear_after must be >= 1")
+        self.open_after = open_after
+        self.clear_after = clear_after
+        self.realert_interval = realert_interval
+        self._incidents: Dict[Hashable, Incident] = {}
+        self._ids = itertools.count(1)
+
+    def observe(self, key: Hashable, anomalous: bool, alert: Optional[dict] = None) -> Optional[dict]:
+        """
+        Feed the verdict of one reading.
+
+        Args:
+            key: alert key (sensor id).
+            anomalous: True if the reading was flagged.
+            alert: alert payload of an anomalous reading (copied into the messages).
+        Returns:
+            the message to publish (alert payload plus "state", "incident", "anomalous_readings"),
+            or None when nothing has to be sent.
+        """
+        incident = self._incidents.get(key)
+        if incident is None:
+            if not anomalous:
+                # most readings: normal sensor without history, nothing to keep
+                return None
+            incident = self._incidents[key] = Incident()
+        now = time.monotonic()
+        if anomalous:
+            incident._normal_streak = 0
+            incident._anomalous_streak += 1
+            if alert is not None:
+                incident.last_alert = alert
+                incident.peak_severity = max(incident.peak_severity, alert.get("severity", 0.0))
+            if incident.is_open:
+                incident.anomalous += 1
+                if now - incident._last_sent < self.realert_interval:
+                    return None
+                return self._message(incident, "ongoing", now)
+            if incident._anomalous_streak < self.open_after:
+                return None
+            incident.is_open = True
+            incident.incident_id = next(self._ids)
+            incident.opened_at = time.time()
+            incident.anomalous = incident._anomalous_streak
+            return self._message(incident, "open", now)
+
+        incident._anomalous_streak = 0
+        if not incident.is_open:
+            # pending anomaly that never reached open_after
+            del self._incidents[key]
+            return None
+        incident._normal_streak += 1
+        if incident._normal_streak < self.clear_after:
+            return None
+        del self._incidents[key]
+        return self._message(incident, "cleared", now)
+
+    def _message(self, incident: Incident, state: str, now: float) -> dict:
+        """Build the message of a transition and record when it was sent."""
+        incident._last_sent = now
+        message = dict(incident.last_alert or {})
+        message.update({
+            "state": state,
+            "incident": incident.incident_id,
+            "anomalous_readings": incident.anomalous,
+            "since": int(incident.opened_at),
+        })
+        if state == "cleared":
+            # the last anomalous reading stays as context, but it is not the reason anymore
+            message.pop("reason", None)
+            message["timestamp"] = int(time.time())
+            message["duration"] = time.time() - incident.opened_at
+            message["peak_severity"] = incident.peak_severity
+        return message
+
+    def open_incidents(self) -> List[dict]:
+        """Return a short description of every open incident (for summaries)."""
+        return [
+            {
+                "sensor_id": key,
+                "incident": incident.incident_id,
+                "since": int(incident.opened_at),
+                "anomalous_readings": incident.anomalous,
+                "peak_severity": incident.peak_severity,
+                "last_value": (incident.last_alert or {}).get("value"),
+            }
+            for key, incident in self._incidents.items() if incident.is_open
+        ]
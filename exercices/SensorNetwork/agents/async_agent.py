@@ -0,0 +1,174 @@
+"""
+asyncio variants of the agent base classes.
+
+AsyncAgent runs its behaviour as an asyncio task instead of an OS thread, and
+AsyncSensorAgent publishes the same simulated readings as SensorAgent from that task, and
+AsyncAveragingAgent publishes the averages of AveragingAgent from it instead of the
+thread-based scheduler, as AsyncDetectionAgent does for the incident summaries and batches
+of DetectionAgent. Use them with AsyncMQTTClient so that every agent of a process shares
+one event loop. The other agents (interface, room) only subscribe and publish, so they
+work unchanged on top of AsyncMQTTClient.
+"""
+
+from typing import Optional
+import asyncio
+import logging
+import time
+
+from .averaging_agent import AveragingAgent
+from .base_agent import Agent
+from .detection_agent import DetectionAgent
+from .sensor_factory import SensorAgent
+
+LOG = logging.getLogger("async_agent")
+
+
+class AsyncAgent(Agent):
+    """
+    Agent whose background behaviour is a coroutine scheduled on the running event loop.
+
+    Subclasses implement run(). start() and stop() keep the synchronous signature of
+    Agent so that orchestrators (e.g. RoomAgent) handle both kinds of agents alike, but
+    they must be called from the event loop thread.
+    """
+
+    def __init__(self, mqtt_client, agent_id: Optional[str] = None):
+        super().__init__(mqtt_client, agent_id=agent_id)
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        """Agent behaviour; override in subclass."""
+        raise NotImplementedError
+
+    def start(self):
+        """Schedule run() as a task on the running event loop."""
+        if self._task is not None and not self._task.done():
+            LOG.debug("Agent %s already running", self.agent_id)
+            return
+        self._task = asyncio.get_running_loop().create_task(self.run(), name=f"Agent-{self.agent_id}")
+        self._running = True
+
+    def stop(self):
+        """Cancel the agent task (returns immediately, no join)."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._running = False
+
+
+class AsyncSensorAgent(AsyncAgent, SensorAgent):
+    """
+    SensorAgent publishing from an asyncio task instead of a dedicated thread.
+
+    Same parameters, value model and topic as SensorAgent:
+        home/{room}/{measurement}/{sensor_id}
+    """
+
+    def __init__(self, *args, **kwargs):
+        # SensorAgent holds the simulation parameters; AsyncAgent only adds the task slot
+        SensorAgent.__init__(self, *args, **kwargs)
+        self._task = None
+
+    async def run(self):
+        """Publish a reading every period seconds until cancelled."""
+        topic = f"home/{self.room}/{self.measurement}/{self.sensor_id}"
+        loop = asyncio.get_running_loop()
+        next_time = loop.time()
+        while True:
+            try:
+                value = self._compute_value()
+                payload = {"timestamp": int(time.time()), "sensor_id": self.sensor_id, "value": value}
+                self.mqtt.publish(topic, payload)
+                LOG.debug("Sensor %s published to %s: %s", self.sensor_id, topic, payload)
+            except Exception:
+                LOG.exception("Error while computing/publishing sensor value for %s", self.sensor_id)
+            # fixed-rate schedule: the period does not drift with the publishing time
+            next_time += self.period
+            await asyncio.sleep(max(0.0, next_time - loop.time()))
+
+    def start(self):
+        """Start the publishing task on the running event loop."""
+        super().start()
+        LOG.info(
+            "AsyncSensorAgent started: id=%s room=%s measurement=%s period=%.2fs",
+            self.sensor_id,
+            self.room,
+            self.measurement,
+            self.period,
+        )
+
+    def stop(self):
+        """Cancel the publishing task."""
+        super().stop()
+        LOG.info("AsyncSensorAgent stopped: %s", self.sensor_id)
+
+
+class AsyncAveragingAgent(AsyncAgent, AveragingAgent):
+    """
+    AveragingAgent publishing its averages from an asyncio task.
+
+    Same parameters, subscriptions and payloads as AveragingAgent.
+    """
+
+    def __init__(self, *args, **kwargs):
+        AveragingAgent.__init__(self, *args, **kwargs)
+        self._task = None
+
+    async def run(self):
+        """Publish the averages every publish_period seconds until cancelled."""
+        loop = asyncio.get_running_loop()
+        next_time = loop.time()
+        while True:
+            next_time += self.publish_period
+            await asyncio.sleep(max(0.0, next_time - loop.time()))
+            self._publish_average()
+
+    def start(self):
+        """Start the publishing task on the running event loop."""
+        AsyncAgent.start(self)
+        LOG.info("AsyncAveragingAgent started for %s/%s", self.room, self.measurement)
+
+    def stop(self):
+        """Cancel the publishing task."""
+        AsyncAgent.stop(self)
+        LOG.info("AsyncAveragingAgent stopped for %s/%s", self.room, self.measurement)
+
+
+class AsyncDetectionAgent(AsyncAgent, DetectionAgent):
+    """
+    DetectionAgent publishing its incident summaries (and scoring its batches) from an
+    asyncio task.
+
+    Same parameters, subscriptions and payloads as DetectionAgent.
+    """
+
+    def __init__(self, *args, **kwargs):
+        DetectionAgent.__init__(self, *args, **kwargs)
+        self._task = None
+
+    async def run(self):
+        """Score the queued batch every batch_period and publish the summary every summary_period."""
+        loop = asyncio.get_running_loop()
+        next_summary = loop.time() + self.summary_period
+        next_flush = loop.time() + self.batch_period if self.batch_period else None
+        while True:
+            due = next_summary if next_flush is None else min(next_summary, next_flush)
+            await asyncio.sleep(max(0.0, due - loop.time()))
+            now = loop.time()
+            if next_flush is not None and next_flush <= now:
+                next_flush += self.batch_period
+                self._flush()
+            if next_summary <= now:
+                next_summary += self.summary_period
+                self._publish_summary()
+
+    def start(self):
+        """Start the summary (and batching) task on the running event loop."""
+        AsyncAgent.start(self)
+        LOG.info("AsyncDetectionAgent started for %s/%s", self.room, self.measurement)
+
+    def stop(self):
+        """Cancel the task and score the readings still queued."""
+        AsyncAgent.stop(self)
+        self._flush()
+        LOG.info("AsyncDetectionAgent stopped for %s/%s", self.room, self.measurement)
@@ -4,24 +4,225 @@ Averaging agent.
 Listens to sensor topics for a room and measurement, keeps a sliding window and publishes averages.
 """
 
-from collections import deque, defaultdict
+from collections import defaultdict
+from typing import Optional, Sequence
 import time
 import logging
 
 from .base_agent import Agent
+from .readings import iter_readings
+from .rolling_stats import RollingStats
+from .rollup import Partial, merge_all
+from .scheduler import Scheduler, TimerHandle, get_scheduler
+from .sketches import DDSketch, EWMA, SlidingExtrema
+from .time_windows import EventTimeWindows
 
 LOG = logging.getLogger("averaging_agent")
 
 
+class AverageWindow:
+    """
+    Per-sensor windows of one (room, measurement) and the average payload built from them.
+
+    Windows are the last window_size readings of each sensor by default. With
+    window="tumbling", "hopping" or "sliding" they are event-time windows of
+    window_seconds on the payload timestamps (see time_windows.py) and the room average
+    is the mean of the per-sensor means, so sensors weigh the same whatever their period.
+
+    Payloads also carry the mergeable partial (sum, count, min, max, sumsq) of the room
+    readings, consumed by the roll-up tier (see rollup.py); in count windows its min/max
+    come from monotonic deques kept per sensor. Optional streaming aggregates add
+    "min"/"max" (the partial's), "ewma" (over the room readings in arrival order) and
+    "percentiles" (room DDSketch following the count windows) to it.
+
+    Not thread-safe: the owner serializes add() and payload().
+    """
+
+    def __init__(self, room: str, measurement: str, window_size: int = 10, window: str = "count",
+                 window_seconds: float = 5.0, slide: Optional[float] = None, allowed_lateness: float = 0.0,
+                 extrema: bool = False, ewma_alpha: Optional[float] = None,
+                 percentiles: Optional[Sequence[float]] = None, sketch_accuracy: float = 0.01):
+        """
+        Args:
+            room: room id.
+            measurement: measurement type.
+            window_size: number of samples per sensor in count windows.
+            window: "count", "tumbling", "hopping" or "sliding".
+            window_seconds: event-time window length.
+            slide: hop of hopping windows / pane length of sliding windows.
+            allowed_lateness: seconds a reading may lag behind the newest timestamp seen
+                before it is dropped (event-time windows only).
+            extrema: publish the room min/max.
+            ewma_alpha: publish an exponentially weighted moving average with this factor.
+            percentiles: quantiles to publish, e.g. (0.5, 0.95, 0.99) (count windows only).
+            sketch_accuracy: relative accuracy of the percentiles.
+        """
+        if percentiles and window != "count":
+            raise ValueError("percentiles are only available with count windows")
+        self.room = room
+        self.measurement = measurement
+        self.window_size = window_size
+        self.window = window
+        self.topic = f"home/{room}/{measurement}/average"
+        # mapping sensor_id -> rolling window of recent values (running sum and count)
+        self._values = defaultdict(lambda: RollingStats(self.window_size))
+        self._windows: Optional[EventTimeWindows] = None
+        if window != "count":
+            self._windows = EventTimeWindows(window, window_seconds, slide=slide, allowed_lateness=allowed_lateness)
+        self.extrema = extrema
+        self.percentiles = tuple(percentiles or ())
+        # per-sensor min/max of the partials; event-time panes already hold them
+        self._extrema = defaultdict(lambda: SlidingExtrema(self.window_size)) if window == "count" else None
+        self._ewma = EWMA(ewma_alpha) if ewma_alpha is not None else None
+        self._sketch = DDSketch(sketch_accuracy) if self.percentiles else None
+
+    def add(self, sensor_id: str, timestamp: int, value: float):
+        """Add one reading (O(1) amortized)."""
+        if self._ewma is not None:
+            self._ewma.update(value)
+        if self._windows is not None:
+            self._windows.add(sensor_id, timestamp, value)
+            return
+        evicted = self._values[sensor_id].push(value)
+        self._extrema[sensor_id].push(value)
+        if self._sketch is not None:
+            self._sketch.add(value)
+            if evicted is not None:
+                self._sketch.remove(evicted)
+
+    def export_state(self) -> dict:
+        """
+        Return the rolling state as JSON-serializable data (see checkpoint.py).
+
+        Count windows are saved as the values of each sensor, oldest first; the extrema and
+        percentile sketches are rebuilt from them on import. Event-time windows are not
+        saved: they only cover a few seconds and refill by themselves.
+        """
+        state = {"window": self.window, "window_size": self.window_size}
+        if self._windows is None:
+            state["values"] = {sensor_id: list(stats) for sensor_id, stats in self._values.items()}
+        if self._ewma is not None:
+            state["ewma"] = self._ewma.value
+        return state
+
+    def import_state(self, state: dict):
+        """
+        Restore a state returned by export_state(), replacing the current windows.
+
+        The new windows are built aside and swapped in at the end: a malformed state leaves
+        the current ones untouched.
+
+        Raises:
+            ValueError: if the state was exported with other window settings.
+            KeyError, TypeError: if the state is malformed.
+        """
+        if state["window"] != self.window or state["window_size"] != self.window_size:
+            raise ValueError(f"window {state['window']}/{state['window_size']} does not match "
+                             f"{self.window}/{self.window_size}")
+        ewma = state.get("ewma")
+        ewma = None if ewma is None else float(ewma)
+        if self._windows is None:
+            if not isinstance(state["values"], dict):
+                raise TypeError("values must map sensor ids to lists of values")
+            windows = defaultdict(lambda: RollingStats(self.window_size))
+            extrema = defaultdict(lambda: SlidingExtrema(self.window_size))
+            sketch = None
+            if self._sketch is not None:
+                sketch = DDSketch(self._sketch.relative_accuracy, self._sketch.max_buckets)
+            for sensor_id, values in state["values"].items():
+                values = [float(value) for value in values]
+                if len(values) > self.window_size:
+                    raise ValueError(f"{len(values)} values for sensor {sensor_id}, window is {self.window_size}")
+                windows[sensor_id] = RollingStats(self.window_size, values)
+                for value in values:
+                    extrema[sensor_id].push(value)
+                    if sketch is not None:
+                        sketch.add(value)
+            self._values, self._extrema, self._sketch = windows, extrema, sketch
+        if self._ewma is not None:
+            self._ewma.value = ewma
+
+    def payload(self) -> Optional[dict]:
+        """
+        Build the average payload: per-sensor averages and a room-level average.
+
+        Costs O(number of sensors): each window keeps its running sum and count, and its
+        extrema in monotonic deques.
+
+        Returns:
+            the payload, or None when there is nothing (new) to publish.
+        """
+        if self._windows is not None:
+            return self._window_payload()
+        per_sensor = {}
+        # aggregate values
+        room = Partial()
+        for sensor_id, stats in self._values.items():
+            if stats.count:
+                per_sensor[sensor_id] = stats.mean
+                extrema = self._extrema[sensor_id]
+                room.merge(Partial(stats.total, stats.count, extrema.min, extrema.max, stats.sumsq))
+        if not room.count:
+            return None
+        payload = {
+            "timestamp": int(time.time()),
+            "room": self.room,
+            "measurement": self.measurement,
+            "room_average": room.mean,
+            "per_sensor": per_sensor,
+            "partial": room.to_dict(),
+        }
+        self._add_aggregates(payload, room)
+        return payload
+
+    def _window_payload(self) -> Optional[dict]:
+        """Payload of the latest event-time window, if there is a new one."""
+        result = self._windows.next_result()
+        if result is None or not result.totals:
+            return None
+        per_sensor = result.means()
+        room = merge_all(result.totals.values())
+        payload = {
+            "timestamp": int(time.time()),
+            "room": self.room,
+            "measurement": self.measurement,
+            "room_average": sum(per_sensor.values()) / len(per_sensor),
+            "per_sensor": per_sensor,
+            "window": {"kind": self.window, "start": result.start, "end": result.end},
+            "late_dropped": self._windows.late_count,
+            "partial": room.to_dict(),
+        }
+        self._add_aggregates(payload, room)
+        return payload
+
+    def _add_aggregates(self, payload: dict, room: Partial):
+        """Add the optional streaming aggregates to a payload."""
+        if self.extrema:
+            payload["min"] = room.min
+            payload["max"] = room.max
+        if self._ewma is not None:
+            payload["ewma"] = self._ewma.value
+        if self._sketch is not None:
+            payload["percentiles"] = self._sketch.quantiles(self.percentiles)
+
+
 class AveragingAgent(Agent):
     """
     Agent that computes rolling averages for a given room and measurement type.
 
     Example topic subscription: home/bedroom1/temperature/#
     Publishes averages at a specified frequency to: home/{room}/{measurement}/average
+
+    Publications are driven by the shared scheduler between start() and stop(), so they
+    keep their cadence whatever the message rate; the message handler only updates the
+    per-sensor windows (see AverageWindow for the window kinds).
     """
 
-    def __init__(self, mqtt_client, room: str, measurement: str, window_size: int = 10, publish_period: float = 5.0):
+    def __init__(self, mqtt_client, room: str, measurement: str, window_size: int = 10, publish_period: float = 5.0,
+                 scheduler: Optional[Scheduler] = None, window: str = "count",
+                 window_seconds: Optional[float] = None, slide: Optional[float] = None,
+                 allowed_lateness: float = 0.0, extrema: bool = False, ewma_alpha: Optional[float] = None,
+                 percentiles: Optional[Sequence[float]] = None):
         """
         Args:
             mqtt_client: MQTTClient instance.
@@ -29,73 +230,93 @@ class AveragingAgent(Agent):
             measurement: measurement type.
             window_size: number of samples in the rolling window.
             publish_period: seconds between average publications.
+            scheduler: Scheduler running the publications (process-wide one by default).
+            window: "count" (last window_size readings per sensor), "tumbling", "hopping"
+                or "sliding" (event-time windows).
+            window_seconds: event-time window length (default: publish_period).
+            slide: hop of hopping windows / pane length of sliding windows.
+            allowed_lateness: seconds a reading may lag behind the newest timestamp seen
+                before it is dropped (event-time windows only).
+            extrema: also publish the room min/max.
+            ewma_alpha: also publish an exponentially weighted moving average.
+            percentiles: quantiles to publish, e.g. (0.5, 0.95, 0.99) (count windows only).
         """
         super().__init__(mqtt_client)
         self.room = room
         self.measurement = measurement
         self.window_size = window_size
         self.publish_period = publish_period
-        # mapping sensor_id -> deque of recent values
-        self._values = defaultdict(lambda: deque(maxlen=self.window_size))
-        self._last_publish = 0.0
-        # register callback
-        self.mqtt.set_message_callback(self._on_message)
-        # subscribe to relevant topics
+        self.window = window
+        self._state = AverageWindow(room, measurement, window_size=window_size, window=window,
+                                    window_seconds=window_seconds or publish_period, slide=slide,
+                                    allowed_lateness=allowed_lateness, extrema=extrema, ewma_alpha=ewma_alpha,
+                                    percentiles=percentiles)
+        self.scheduler = scheduler
+        self._timer: Optional[TimerHandle] = None
+        # subscribe to relevant topics and register callback for them
         subscribe_topic = f"home/{self.room}/{self.measurement}/#"
-        self.mqtt.subscribe(subscribe_topic)
+        self.mqtt.subscribe(subscribe_topic, callback=self._on_message)
         LOG.info("AveragingAgent subscribed to %s", subscribe_topic)
 
+    def start(self):
+        """Publish the averages every publish_period seconds on the scheduler."""
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = (self.scheduler or get_scheduler()).schedule(self.publish_period, self._publish_average)
+            self._running = True
+        LOG.info("AveragingAgent started for %s/%s (period=%.2fs)", self.room, self.measurement, self.publish_period)
+
+    def stop(self):
+        """Cancel the periodic publications."""
+        with self._lock:
+            timer, self._timer = self._timer, None
+            self._running = False
+        if timer is not None:
+            (self.scheduler or get_scheduler()).cancel(timer)
+        LOG.info("AveragingAgent stopped for %s/%s", self.room, self.measurement)
+
+    def export_state(self) -> dict:
+        """Return the rolling windows (see AverageWindow.export_state)."""
+        with self._lock:
+            return self._state.export_state()
+
+    def import_state(self, state: dict):
+        """Restore the rolling windows, typically before start()."""
+        with self._lock:
+            self._state.import_state(state)
+
     def _on_message(self, topic: str, payload: dict):
         """
-        Handle incoming sensor messages, update internal buffers and publish averages periodically.
+        Handle incoming sensor messages: O(1) update of the internal buffers per reading.
+
+        Accepts single readings and batch frames (see readings.iter_readings).
 
         Args:
             topic: topic string.
             payload: parsed JSON payload.
         """
-        # expected topic: home/{room}/{measurement}/{sensor_id}
-        try:
-            sensor_id = payload.get("sensor_id")
-            value = float(payload.get("value"))
-        except Exception:
-            LOG.debug("Ignoring invalid payload on %s: %s", topic, payload)
-            return
-
-        # update store
-        self._values[sensor_id].append(value)
-        LOG.debug("AveragingAgent: appended value for %s -> %s", sensor_id, value)
-
-        # calculate and publish aggregated average at publish_period
-        now = time.time()
-        if now - self._last_publish >= self.publish_period:
-            self._publish_average()
-            self._last_publish = now
+        # expected topic: home/{room}/{measurement}/{sensor_id} or .../batch
+        received = False
+        with self._lock:
+            for sensor_id, timestamp, value in iter_readings(payload):
+                # update store
+                self._state.add(sensor_id, timestamp, value)
+                received = True
+        if not received:
+            LOG.debug("Ignoring payload without readings on %s: %s", topic, payload)
 
     def _publish_average(self):
         """
         Compute averages across all sensors for the measurement and publish result.
         The published payload includes per-sensor averages and a room-level average.
         """
-        per_sensor = {}
-        # aggregate values
-        all_values = []
-        for sensor_id, values in self._values.items():
-            if len(values):
-                avg = sum(values) / len(values)
-                per_sensor[sensor_id] = avg
-                all_values.extend(values)
-        if not all_values:
+        with self._lock:
+            payload = self._state.payload()
+        if payload is None:
             LOG.debug("No data to publish for %s/%s", self.room, self.measurement)
             return
-        room_avg = sum(all_values) / len(all_values)
-        payload = {
-            "timestamp": int(time.time()),
-            "room": self.room,
-            "measurement": self.measurement,
-            "room_average": room_avg,
-            "per_sensor": per_sensor,
-        }
-        topic = f"home/{self.room}/{self.measurement}/average"
+        topic = self._state.topic
         try:
             self.mqtt.publish(topic, payload)
             LOG.info("Published average to %s: %s", topic, payload)
@@ -0,0 +1,176 @@
+"""
+Checkpoints of the agent models.
+
+The rolling state of the averaging and detection agents (per-sensor windows, detector
+arrays) is saved periodically to one local snapshot file per process and restored at
+start, so that a restarted agent is warm instead of blind until its windows refill.
+
+Snapshots are gzip-compressed JSON written to a temporary file, flushed to disk and
+renamed over the previous snapshot: a crash never leaves a truncated checkpoint. The
+periodic saves run on a dedicated thread, so a slow disk never delays the scheduler
+driving the sensors and publications.
+
+Snapshot layout:
+    {"version": 1, "saved_at": <float>, "agents": {<key>: <agent export_state()>}}
+"""
+
+from typing import Dict, Optional
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+
+LOG = logging.getLogger("checkpoint")
+
+SNAPSHOT_VERSION = 1
+
+
+def save_snapshot(path: str, agents: Dict[str, dict]):
+    """
+    Atomically write a snapshot.
+
+    Args:
+        path: snapshot file.
+        agents: agent key -> exported state.
+    """
+    snapshot = {"version": SNAPSHOT_VERSION, "saved_at": time.time(), "agents": agents}
+    tmp = f"{path}.tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump(snapshot, f, separators=(",", ":"))
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_snapshot(path: str, max_age: Optional[float] = None) -> Optional[dict]:
+    """
+    Read a snapshot.
+
+    Args:
+        path: snapshot file.
+        max_age: ignore snapshots older than max_age seconds.
+    Returns:
+        agent key -> exported state, or None when there is no usable snapshot.
+    """
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        LOG.exception("Unreadable checkpoint %s, starting cold", path)
+        return None
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        LOG.warning("Checkpoint %s has version %s, expected %s: ignored", path, snapshot.get("version"),
+                    SNAPSHOT_VERSION)
+        return None
+    age = time.time() - snapshot.get("saved_at", 0.0)
+    if max_age is not None and age > max_age:
+        LOG.info("Checkpoint %s is %.0fs old: ignored", path, age)
+        return None
+    return snapshot.get("agents", {})
+
+
+def agent_key(agent) -> str:
+    """Default checkpoint key of an agent: class/room/measurement."""
+    return f"{type(agent).__name__}/{agent.room}/{agent.measurement}"
+
+
+class Checkpointer:
+    """
+    Periodic checkpoints of a set of agents exposing export_state() / import_state().
+
+    Usage:
+        checkpointer = Checkpointer("/var/lib/sensors/node1.ckpt.gz", period=30.0)
+        checkpointer.add(averaging_agent)
+        checkpointer.add(detection_agent)
+        checkpointer.start()   # restores the agents (before they start), then saves every period seconds
+        ...
+        checkpointer.stop()    # final save
+    """
+
+    def __init__(self, path: str, period: float = 30.0, max_age: Optional[float] = None):
+        """
+        Args:
+            path: snapshot file (one per process).
+            period: seconds between two saves.
+            max_age: do not restore snapshots older than max_age seconds.
+        """
+        self.path = path
+        self.period = period
+        self.max_age = max_age
+        self._agents: Dict[str, object] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def add(self, agent, key: Optional[str] = None):
+        """Register an agent under a key (class/room/measurement by default)."""
+        self._agents[key or agent_key(agent)] = agent
+
+    def restore(self) -> int:
+        """
+        Load the snapshot into the registered agents.
+
+        Returns:
+            number of agents restored.
+        """
+        states = load_snapshot(self.path, self.max_age)
+        if not states:
+            return 0
+        restored = 0
+        for key, agent in self._agents.items():
+            state = states.get(key)
+            if state is None:
+                continue
+            try:
+                agent.import_state(state)
+                restored += 1
+            except (KeyError, TypeError, ValueError) as exc:
+                LOG.warning("Cannot restore %s from %s (%s), starting cold", key, self.path, exc)
+        LOG.info("Restored %d/%d agents from %s", restored, len(self._agents), self.path)
+        return restored
+
+    def save(self) -> bool:
+        """
+        Save the state of every registered agent; an agent whose export fails is left out.
+
+        Returns:
+            True if the snapshot was written.
+        """
+        states = {}
+        for key, agent in self._agents.items():
+            try:
+                states[key] = agent.export_state()
+            except Exception:
+                LOG.exception("Cannot export %s, left out of checkpoint %s", key, self.path)
+        try:
+            save_snapshot(self.path, states)
+        except Exception:
+            LOG.exception("Failed to save checkpoint %s", self.path)
+            return False
+        LOG.debug("Saved %d agents to %s", len(states), self.path)
+        return True
+
+    def start(self):
+        """Restore the agents and save them every period seconds on a background thread."""
+        if self._thread is not None:
+            return
+        self.restore()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="checkpointer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the periodic saves and save one last time."""
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopped.set()
+            thread.join()
+        self.save()
+
+    def _run(self):
+        """Periodic saves until stop()."""
+        while not self._stopped.wait(self.period):
+            self.save()
@@ -1,96 +1,254 @@
 """
 Detection agent for anomalies.
 
-Implements a simple detection: a reading that is more than 2 standard deviations from the room average
-is considered anomalous. It publishes alerts to `home/alerts/{room}`.
+Readings are scored by pluggable detectors (see detectors.py). By default a reading that is
+more than 2 standard deviations from the recent readings of its own sensor ("zscore"), or
+more than mad_threshold robust deviations (1.4826 * MAD) from the median of the room
+readings ("mad"), is considered anomalous. It publishes alerts to `home/alerts/{room}`,
+one per incident (see alerting.py) plus periodic summaries.
 """
 
 import logging
 import time
-from collections import deque
-import math
+from typing import Dict, List, Optional, Sequence, Union
 
+import numpy as np
+
+from .alerting import AlertTracker
 from .base_agent import Agent
+from .detectors import Detector, create_detector
+from .readings import Reading, iter_readings
+from .scheduler import Scheduler, TimerHandle, get_scheduler
 
 LOG = logging.getLogger("detection_agent")
 
+DEFAULT_DETECTORS = ("zscore", "mad")
+
 
 class DetectionAgent(Agent):
     """
     Agent that subscribes to both sensor readings and averages, and publishes alerts when anomalies are detected.
 
     Approach:
-    - Maintain circular buffer of recent values per measurement
-    - When a reading arrives, compare to rolling average & stddev and publish an alert if > 2*stddev
+    - Give each sensor a dense index; every detector keeps its per-sensor models in arrays
+      indexed by it, so a faulty sensor never shifts the baseline of the others
+    - Score readings in batches, one vectorized call per detector: each message (single
+      reading or frame) is a batch, or, with batch_period, every reading received during
+      a scheduler tick between start() and stop()
+    - A reading is anomalous when any detector score exceeds its threshold; its severity
+      is the largest score / threshold ratio
+    - Track an incident per sensor: alert when it opens (after open_after anomalous
+      readings), remind at most every realert_interval seconds, notify when it clears
+      (after clear_after normal readings); between start() and stop() the open incidents
+      are summarized every summary_period seconds
     """
 
-    def __init__(self, mqtt_client, room: str, measurement: str, window_size: int = 30):
+    def __init__(self, mqtt_client, room: str, measurement: str, window_size: int = 30,
+                 room_window_size: int = 101, mad_threshold: float = 3.0, open_after: int = 1,
+                 clear_after: int = 3, realert_interval: float = 60.0, summary_period: float = 30.0,
+                 scheduler: Optional[Scheduler] = None,
+                 detectors: Optional[Sequence[Union[str, Detector]]] = None,
+                 batch_period: Optional[float] = None):
         """
         Args:
             mqtt_client: MQTTClient instance.
             room: room id.
             measurement: measurement string.
-            window_size: number of recent sensor readings kept to compute mean/stddev.
+            window_size: number of recent readings kept per sensor by the "zscore" detector.
+            room_window_size: number of recent room readings (all sensors) kept by the "mad" detector.
+            mad_threshold: robust deviations from the room median above which "mad" flags a reading.
+            open_after: consecutive anomalous readings of a sensor opening an incident.
+            clear_after: consecutive normal readings of a sensor clearing its incident.
+            realert_interval: minimum seconds between two alerts of the same incident.
+            summary_period: seconds between two summaries of the open incidents.
+            scheduler: Scheduler running the summaries and batches (process-wide one by default).
+            detectors: detector names (see detectors.available_detectors()) or instances;
+                "zscore" and "mad" by default.
+            batch_period: if set, readings received while the agent is started are queued and
+                scored together every batch_period seconds. Required by the detectors that
+                take one time step per batch ("correlation").
+        Raises:
+            ValueError: if such a detector is used without batch_period.
         """
         super().__init__(mqtt_client)
         self.room = room
         self.measurement = measurement
         self.window_size = window_size
-        self._buffer = deque(maxlen=self.window_size)
+        self.mad_threshold = mad_threshold
+        defaults = {
+            "zscore": {"window": window_size},
+            "mad": {"window": room_window_size, "threshold": mad_threshold},
+        }
+        self.detectors: List[Detector] = [
+            create_detector(d, **defaults.get(d, {})) if isinstance(d, str) else d
+            for d in (detectors or DEFAULT_DETECTORS)
+        ]
+        batched = [d.name for d in self.detectors if d.needs_batches]
+        if batched and not batch_period:
+            raise ValueError(f"detectors {batched} take one time step per batch: set batch_period")
+        self._thresholds = np.array([d.threshold for d in self.detectors])[:, None]
+        # sensor_id -> dense index in the detector state arrays
+        self._sensor_index: Dict[str, int] = {}
+        self._alerts = AlertTracker(open_after=open_after, clear_after=clear_after,
+                                    realert_interval=realert_interval)
+        self.summary_period = summary_period
+        self.batch_period = batch_period
+        self.scheduler = scheduler
+        self._timers: List[TimerHandle] = []
+        self._pending: List[Reading] = []
+        self._topic_alert = f"home/alerts/{self.room}"
         # subscribe to sensor topics for this measurement
         pattern = f"home/{self.room}/{self.measurement}/#"
-        self.mqtt.subscribe(pattern)
-        self.mqtt.set_message_callback(self._on_message)
-        LOG.info("DetectionAgent subscribed to %s", pattern)
-
-    def _compute_stats(self):
-        """Compute mean and standard deviation of current buffer."""
-        n = len(self._buffer)
-        if n == 0:
-            return None, None
-        mean = sum(self._buffer) / n
-        variance = sum((x - mean) ** 2 for x in self._buffer) / n
-        stddev = math.sqrt(variance)
-        return mean, stddev
+        self.mqtt.subscribe(pattern, callback=self._on_message)
+        LOG.info("DetectionAgent subscribed to %s (detectors: %s)", pattern,
+                 ", ".join(d.name for d in self.detectors))
+
+    def start(self):
+        """Publish a summary of the open incidents every summary_period seconds and start batching."""
+        scheduler = self.scheduler or get_scheduler()
+        with self._lock:
+            if self._timers:
+                return
+            self._timers.append(scheduler.schedule(self.summary_period, self._publish_summary))
+            if self.batch_period:
+                self._timers.append(scheduler.schedule(self.batch_period, self._flush))
+            self._running = True
+        LOG.info("DetectionAgent started for %s/%s", self.room, self.measurement)
+
+    def stop(self):
+        """Cancel the periodic tasks and score the readings still queued."""
+        with self._lock:
+            timers, self._timers = self._timers, []
+            self._running = False
+        for timer in timers:
+            (self.scheduler or get_scheduler()).cancel(timer)
+        self._flush()
+        LOG.info("DetectionAgent stopped for %s/%s", self.room, self.measurement)
+
+    def export_state(self) -> dict:
+        """
+        Return the detector models as JSON-serializable data (see checkpoint.py).
+
+        Open incidents are not saved: a restarted agent reopens them from fresh readings.
+        """
+        with self._lock:
+            return {
+                "sensors": sorted(self._sensor_index, key=self._sensor_index.get),
+                "detectors": [d.export_state() for d in self.detectors],
+            }
+
+    def import_state(self, state: dict):
+        """
+        Restore the detector models, typically before start().
+
+        Raises:
+            ValueError: if the state was exported with other detectors or lists invalid sensors.
+        """
+        names = [d["name"] for d in state["detectors"]]
+        if names != [d.name for d in self.detectors]:
+            raise ValueError(f"detectors {names} do not match {[d.name for d in self.detectors]}")
+        sensors = state["sensors"]
+        if not isinstance(sensors, list) or not all(isinstance(s, str) for s in sensors):
+            raise ValueError("sensors must be a list of sensor ids")
+        if len(set(sensors)) != len(sensors):
+            raise ValueError("duplicate sensor ids in state")
+        with self._lock:
+            previous = [d.export_state() for d in self.detectors]
+            try:
+                for detector, detector_state in zip(self.detectors, state["detectors"]):
+                    detector.import_state(detector_state)
+            except Exception:
+                # never leave the detectors half restored
+                for detector, detector_state in zip(self.detectors, previous):
+                    detector.import_state(detector_state)
+                raise
+            self._sensor_index = {sensor_id: i for i, sensor_id in enumerate(sensors)}
 
     def _on_message(self, topic: str, payload: dict):
         """
-        Handle incoming reading: update stats and publish alert if needed.
+        Handle incoming readings (single reading or batch frame): score them now, or queue
+        them for the next batch.
         """
-        try:
-            value = float(payload.get("value"))
-            sensor_id = payload.get("sensor_id")
-            timestamp = payload.get("timestamp", int(time.time()))
-        except Exception:
+        readings = list(iter_readings(payload))
+        if not readings:
             LOG.debug("Invalid payload in detection agent: %s", payload)
             return
+        with self._lock:
+            if self.batch_period and self._running:
+                self._pending.extend(readings)
+                return
+        self._process_readings(readings)
 
-        # Update rolling buffer
-        self._buffer.append(value)
-        mean, stddev = self._compute_stats()
-        # If we don't have stats yet, skip detection
-        if mean is None or stddev is None:
-            return
+    def _flush(self):
+        """Score the queued readings in one batch."""
+        with self._lock:
+            readings, self._pending = self._pending, []
+        if readings:
+            self._process_readings(readings)
 
-        # Detect anomaly: > 2 * stddev away from mean
-        threshold = 2 * (stddev if stddev > 0 else 0.0001)  # avoid zero stddev
-        deviation = abs(value - mean)
-        if deviation > threshold:
-            # Build alert with suspected sensor id and context
-            alert = {
-                "timestamp": int(timestamp),
-                "room": self.room,
-                "measurement": self.measurement,
-                "sensor_id": sensor_id,
-                "value": value,
-                "mean": mean,
-                "stddev": stddev,
-                "deviation": deviation,
-                "reason": f"value deviates by {deviation:.2f} (> 2 * stddev={threshold:.2f})"
-            }
-            topic_alert = f"home/alerts/{self.room}"
+    def _index(self, sensor_id: str) -> int:
+        """Return the dense index of a sensor, assigning one on its first reading."""
+        index = self._sensor_index.get(sensor_id)
+        if index is None:
+            index = self._sensor_index[sensor_id] = len(self._sensor_index)
+        return index
+
+    def _process_readings(self, readings: List[Reading]):
+        """Score a batch of readings with every detector and publish the alert state changes."""
+        count = len(readings)
+        messages = []
+        with self._lock:
+            sensors = np.fromiter((self._index(r[0]) for r in readings), dtype=np.int64, count=count)
+            timestamps = np.fromiter((r[1] for r in readings), dtype=float, count=count)
+            values = np.fromiter((r[2] for r in readings), dtype=float, count=count)
+            scores = np.stack([d.score_batch(sensors, timestamps, values) for d in self.detectors])
+            severities = (scores / self._thresholds).max(axis=0)
+            for i, (sensor_id, timestamp, value) in enumerate(readings):
+                alert = None
+                if severities[i] > 1.0:
+                    alert = self._alert(sensor_id, timestamp, value, scores[:, i], float(severities[i]))
+                message = self._alerts.observe(sensor_id, alert is not None, alert)
+                if message is not None:
+                    messages.append(message)
+        for message in messages:
             try:
-                self.mqtt.publish(topic_alert, alert)
-                LOG.warning("Published alert to %s: %s", topic_alert, alert)
+                self.mqtt.publish(self._topic_alert, message)
+                LOG.warning("Published alert to %s: %s", self._topic_alert, message)
             except Exception:
                 LOG.exception("Failed to publish alert")
+
+    def _alert(self, sensor_id: str, timestamp: int, value: float, scores: np.ndarray,
+               severity: float) -> dict:
+        """Build the alert payload of an anomalous reading."""
+        reasons = [f"{d.name} score {s:.2f} > {d.threshold:g}"
+                   for d, s in zip(self.detectors, scores.tolist()) if s > d.threshold]
+        # Build alert with suspected sensor id and context
+        return {
+            "timestamp": int(timestamp),
+            "room": self.room,
+            "measurement": self.measurement,
+            "sensor_id": sensor_id,
+            "value": value,
+            "severity": severity,
+            "scores": {d.name: s for d, s in zip(self.detectors, scores.tolist())},
+            "reason": "; ".join(reasons)
+        }
+
+    def _publish_summary(self):
+        """Publish the list of open incidents, if any."""
+        with self._lock:
+            incidents = self._alerts.open_incidents()
+        if not incidents:
+            return
+        summary = {
+            "timestamp": int(time.time()),
+            "room": self.room,
+            "measurement": self.measurement,
+            "state": "summary",
+            "incidents": incidents,
+        }
+        try:
+            self.mqtt.publish(self._topic_alert, summary)
+            LOG.info("Published alert summary to %s: %d open incidents", self._topic_alert, len(incidents))
+        except Exception:
+            LOG.exception("Failed to publish alert summary")
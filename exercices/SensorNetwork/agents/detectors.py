@@ -0,0 +1,489 @@
+"""
+Anomaly detectors.
+
+Every detector scores a batch of readings in one call with NumPy. The readings are given as
+arrays (dense sensor index, timestamp, value) in arrival order; the per-sensor models are
+arrays indexed by sensor, so a batch touching k sensors costs a few vectorized operations
+instead of k Python calls. The exception is "mad": a rolling median has no vectorized
+update, so it pushes and scores the readings one by one. A reading is anomalous for a
+detector when its score exceeds the detector threshold.
+
+Detectors are registered by name:
+    zscore    distance to the rolling mean of the sensor, in rolling stddevs
+    mad       distance to the median of the recent room readings, in robust stddevs (1.4826 * MAD)
+    ewma      EWMA control chart: distance to the exponentially weighted mean, in EW stddevs
+    cusum     two-sided CUSUM of the standardized residuals (slow drifts)
+    seasonal  residual against a fitted 60 s sinusoid (the SensorAgent value model), in residual stddevs
+    correlation  drop of the correlation of a sensor with its room peers (decoupled sensor);
+              one time step per batch, so DetectionAgent needs a batch_period
+
+Usage:
+    detector = create_detector("zscore", window=30)
+    scores = detector.score_batch(sensors, timestamps, values)
+    anomalous = scores > detector.threshold
+"""
+
+from typing import Callable, Dict, Iterator, List, Type
+import math
+
+import numpy as np
+
+from .robust_stats import MAD_SCALE, RollingMedian
+
+# smallest stddev used to normalize residuals (avoid zero division on constant signals)
+_EPSILON = 0.0001
+
+DETECTORS: Dict[str, Type["Detector"]] = {}
+
+
+def register_detector(name: str) -> Callable[[Type["Detector"]], Type["Detector"]]:
+    """Class decorator registering a detector under a name."""
+    def decorator(cls):
+        cls.name = name
+        DETECTORS[name] = cls
+        return cls
+    return decorator
+
+
+def create_detector(name: str, **kwargs) -> "Detector":
+    """
+    Instantiate a registered detector.
+
+    Args:
+        name: registered detector name.
+        **kwargs: detector parameters.
+    Raises:
+        ValueError: if no detector is registered under that name.
+    """
+    try:
+        cls = DETECTORS[name]
+    except KeyError:
+        raise ValueError(f"unknown detector {name!r}, available: {sorted(DETECTORS)}") from None
+    return cls(**kwargs)
+
+
+def _rounds(sensors: np.ndarray) -> Iterator[np.ndarray]:
+    """
+    Split a batch into rounds where each sensor appears at most once, in arrival order.
+
+    Sequential per-sensor updates (a sensor with several readings in the batch) are then
+    applied one round after the other, each round being vectorized.
+    """
+    if len(sensors) <= 1:
+        yield np.arange(len(sensors))
+        return
+    order = np.argsort(sensors, kind="stable")
+    ordered = sensors[order]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    # rank of each reading among the readings of its sensor
+    group_start = np.repeat(starts, np.diff(np.r_[starts, len(sensors)]))
+    occurrence = np.empty(len(sensors), dtype=np.int64)
+    occurrence[order] = np.arange(len(sensors)) - group_start
+    for rank in range(int(occurrence.max()) + 1):
+        yield np.flatnonzero(occurrence == rank)
+
+
+class Detector:
+    """
+    Base class of the detectors.
+
+    Subclasses declare their per-sensor state with _state() and implement _score_round(),
+    which receives readings of distinct sensors, or override score_batch() when a batch is
+    not a sequence of independent per-sensor updates.
+
+    Attributes:
+        name: registered name.
+        threshold: score above which a reading is anomalous.
+        needs_batches: True when each score_batch() call is one time step of the model, so
+            the readings must be batched over a fixed period (DetectionAgent batch_period).
+    """
+
+    name = "base"
+    needs_batches = False
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self._capacity = 0
+        # state array name -> fill value of new sensors
+        self._fills: Dict[str, float] = {}
+
+    def _state(self, name: str, fill: float = 0.0, shape=()):
+        """Declare a per-sensor state array (first axis: sensor index)."""
+        setattr(self, name, np.full((self._capacity,) + tuple(shape), fill, dtype=float))
+        self._fills[name] = fill
+
+    def _reserve(self, size: int):
+        """Grow the state arrays (by doubling) so that sensor indexes < size are valid."""
+        if size <= self._capacity:
+            return
+        capacity = max(size, 2 * self._capacity, 16)
+        for name, fill in self._fills.items():
+            array = getattr(self, name)
+            grown = np.full((capacity,) + array.shape[1:], fill, dtype=float)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+        self._capacity = capacity
+
+    def score_batch(self, sensors: np.ndarray, timestamps: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Update the models with a batch of readings and score each of them.
+
+        Args:
+            sensors: dense sensor indexes (int array).
+            timestamps: reading timestamps in seconds.
+            values: reading values.
+        Returns:
+            float array of scores, aligned with the inputs.
+        """
+        scores = np.zeros(len(values))
+        if not len(values):
+            return scores
+        self._reserve(int(sensors.max()) + 1)
+        for rows in _rounds(sensors):
+            scores[rows] = self._score_round(sensors[rows], timestamps[rows], values[rows])
+        return scores
+
+    def _score_round(self, sensors: np.ndarray, timestamps: np.ndarray, values: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def export_state(self) -> dict:
+        """Return the per-sensor state as JSON-serializable lists (see checkpoint.py)."""
+        return {"name": self.name, "arrays": {name: getattr(self, name).tolist() for name in self._fills}}
+
+    def import_state(self, state: dict):
+        """
+        Restore a state returned by export_state().
+
+        Raises:
+            ValueError: if the state was exported by another detector or configuration.
+        """
+        if state["name"] != self.name:
+            raise ValueError(f"state of detector {state['name']!r} cannot be loaded in {self.name!r}")
+        arrays = {}
+        for name in self._fills:
+            shape = getattr(self, name).shape[1:]
+            array = np.asarray(state["arrays"][name], dtype=float)
+            if array.size == 0:
+                array = array.reshape((0,) + shape)
+            if array.shape[1:] != shape:
+                raise ValueError(f"{self.name}.{name}: shape {array.shape[1:]} does not match {shape}")
+            arrays[name] = array
+        capacities = {len(array) for array in arrays.values()}
+        if len(capacities) > 1:
+            raise ValueError(f"{self.name}: inconsistent state arrays")
+        for name, array in arrays.items():
+            setattr(self, name, array)
+        self._capacity = capacities.pop() if capacities else 0
+
+    def __repr__(self):
+        return f"{type(self).__name__}(threshold={self.threshold})"
+
+
+@register_detector("zscore")
+class ZScoreDetector(Detector):
+    """
+    Distance to the mean of the last `window` readings of the sensor, in stddevs.
+
+    The reading is included in the window before scoring, as the historical 2-sigma rule.
+    Ring buffers keep running sums; the sums of a sensor are recomputed exactly each time
+    its ring wraps around, so rounding errors never accumulate.
+    """
+
+    def __init__(self, window: int = 30, threshold: float = 2.0):
+        super().__init__(threshold)
+        self.window = window
+        self._state("_ring", 0.0, (window,))
+        self._state("_position")
+        self._state("_count")
+        self._state("_sum")
+        self._state("_sumsq")
+
+    def _score_round(self, sensors, timestamps, values):
+        position = self._position[sensors].astype(np.int64)
+        full = self._count[sensors] >= self.window
+        old = np.where(full, self._ring[sensors, position], 0.0)
+        self._ring[sensors, position] = values
+        self._sum[sensors] += values - old
+        self._sumsq[sensors] += values * values - old * old
+        self._count[sensors] = np.minimum(self._count[sensors] + 1, self.window)
+        position = (position + 1) % self.window
+        self._position[sensors] = position
+        wrapped = sensors[position == 0]
+        if len(wrapped):
+            ring = self._ring[wrapped]
+            self._sum[wrapped] = ring.sum(axis=1)
+            self._sumsq[wrapped] = (ring * ring).sum(axis=1)
+        count = self._count[sensors]
+        mean = self._sum[sensors] / count
+        stddev = np.sqrt(np.maximum(self._sumsq[sensors] / count - mean * mean, 0.0))
+        return np.abs(values - mean) / np.maximum(stddev, _EPSILON)
+
+
+@register_detector("mad")
+class MADDetector(Detector):
+    """
+    Distance to the median of the last `window` room readings (all sensors), in robust
+    stddevs (1.4826 * MAD). A minority of faulty sensors cannot drag the median.
+
+    Each reading enters the window, then is scored against the updated median/MAD, in
+    arrival order: a reading is never scored against later readings of its batch. This is
+    the one detector scoring reading by reading (O(log n) search and MAD, O(n) insertion
+    per reading, see robust_stats.py).
+    """
+
+    def __init__(self, window: int = 101, threshold: float = 3.0):
+        super().__init__(threshold)
+        self.window = window
+        self._room = RollingMedian(window)
+
+    def score_batch(self, sensors, timestamps, values):
+        room = self._room
+        scores = []
+        for value in values.tolist():
+            room.push(value)
+            scores.append(abs(value - room.median) / max(MAD_SCALE * room.mad, _EPSILON))
+        return np.array(scores, dtype=float)
+
+    def export_state(self) -> dict:
+        state = super().export_state()
+        state["room"] = self._room.values()
+        return state
+
+    def import_state(self, state: dict):
+        super().import_state(state)
+        self._room = RollingMedian(self.window)
+        for value in state["room"]:
+            self._room.push(float(value))
+
+    @property
+    def median(self) -> float:
+        """Current room median."""
+        return self._room.median
+
+    @property
+    def mad(self) -> float:
+        """Current room MAD."""
+        return self._room.mad
+
+
+@register_detector("ewma")
+class EWMADetector(Detector):
+    """
+    EWMA control chart: distance of a reading to the exponentially weighted mean of its
+    sensor, in exponentially weighted stddevs (both taken before the reading).
+    """
+
+    def __init__(self, alpha: float = 0.1, threshold: float = 3.0, warmup: int = 10):
+        super().__init__(threshold)
+        self.alpha = alpha
+        self.warmup = warmup
+        self._state("_mean")
+        self._state("_var")
+        self._state("_count")
+
+    def _score_round(self, sensors, timestamps, values):
+        count = self._count[sensors]
+        first = count == 0
+        mean = np.where(first, values, self._mean[sensors])
+        var = self._var[sensors]
+        scores = np.abs(values - mean) / np.maximum(np.sqrt(var), _EPSILON)
+        scores[count < self.warmup] = 0.0
+        delta = values - mean
+        alpha = self.alpha
+        self._mean[sensors] = mean + alpha * delta
+        self._var[sensors] = (1 - alpha) * (var + alpha * delta * delta)
+        self._count[sensors] = count + 1
+        return scores
+
+
+@register_detector("cusum")
+class CUSUMDetector(Detector):
+    """
+    Two-sided CUSUM of the standardized residuals against a slow EWMA baseline.
+
+    S+ = max(0, S+ + z - drift), S- = max(0, S- - z - drift); the score is max(S+, S-)
+    and both sums restart after an alarm.
+    """
+
+    def __init__(self, drift: float = 0.5, threshold: float = 5.0, alpha: float = 0.02, warmup: int = 20):
+        super().__init__(threshold)
+        self.drift = drift
+        self.alpha = alpha
+        self.warmup = warmup
+        self._state("_mean")
+        self._state("_var")
+        self._state("_count")
+        self._state("_high")
+        self._state("_low")
+
+    def _score_round(self, sensors, timestamps, values):
+        count = self._count[sensors]
+        mean = np.where(count == 0, values, self._mean[sensors])
+        var = self._var[sensors]
+        z = (values - mean) / np.maximum(np.sqrt(var), _EPSILON)
+        warm = count >= self.warmup
+        high = np.where(warm, np.maximum(0.0, self._high[sensors] + z - self.drift), 0.0)
+        low = np.where(warm, np.maximum(0.0, self._low[sensors] - z - self.drift), 0.0)
+        scores = np.maximum(high, low)
+        alarm = scores > self.threshold
+        self._high[sensors] = np.where(alarm, 0.0, high)
+        self._low[sensors] = np.where(alarm, 0.0, low)
+        delta = values - mean
+        self._mean[sensors] = mean + self.alpha * delta
+        self._var[sensors] = (1 - self.alpha) * (var + self.alpha * delta * delta)
+        self._count[sensors] = count + 1
+        return scores
+
+
+@register_detector("seasonal")
+class SeasonalDetector(Detector):
+    """
+    Residual against the 60 s sinusoid of the sensor value model.
+
+    Each sensor fits value ~ b + a1*sin(wt) + a2*cos(wt) by exponentially weighted least
+    squares (3x3 normal equations, solved for the whole round with one batched
+    np.linalg.solve). The score is the prediction residual of the reading, before it
+    updates the fit, in exponentially weighted residual stddevs.
+    """
+
+    def __init__(self, period: float = 60.0, forgetting: float = 0.98, threshold: float = 4.0, warmup: int = 20):
+        super().__init__(threshold)
+        self.omega = 2 * math.pi / period
+        self.forgetting = forgetting
+        self.warmup = warmup
+        self._state("_xtx", 0.0, (3, 3))
+        self._state("_xty", 0.0, (3,))
+        self._state("_resvar")
+        self._state("_count")
+
+    def _score_round(self, sensors, timestamps, values):
+        angle = self.omega * timestamps
+        x = np.stack([np.ones_like(angle), np.sin(angle), np.cos(angle)], axis=1)
+        # small ridge term keeps the systems solvable before the fit is determined
+        xtx = self._xtx[sensors] + 1e-6 * np.eye(3)
+        beta = np.linalg.solve(xtx, self._xty[sensors][..., None])[..., 0]
+        residual = values - (x * beta).sum(axis=1)
+        count = self._count[sensors]
+        resvar = self._resvar[sensors]
+        scores = np.abs(residual) / np.maximum(np.sqrt(resvar), _EPSILON)
+        scores[count < self.warmup] = 0.0
+        lam = self.forgetting
+        self._xtx[sensors] = lam * self._xtx[sensors] + x[:, :, None] * x[:, None, :]
+        self._xty[sensors] = lam * self._xty[sensors] + x * values[:, None]
+        # the first residuals come from an undetermined fit: start the variance after a few readings
+        self._resvar[sensors] = np.where(count < 3, 0.0, np.where(resvar == 0.0, residual * residual,
+                                                                  lam * resvar + (1 - lam) * residual * residual))
+        self._count[sensors] = count + 1
+        return scores
+
+
+@register_detector("correlation")
+class CorrelationDetector(Detector):
+    """
+    Cross-sensor decoupling: a sensor whose readings stop moving with its peers.
+
+    A tick is one score_batch() call, i.e. one DetectionAgent batch_period. The last value
+    of each sensor that reported during the tick forms the fresh vector x_S; the
+    exponentially weighted mean of those sensors and the S x S block of the covariance get
+    one rank-one update, O(|S|^2) whatever the window:
+        d = x_S - mean_S;  mean_S += alpha * d;  cov_SS = (1 - alpha) * (cov_SS + alpha * d d^T)
+    A sensor silent during a tick keeps its model: stale values are never fed back.
+    The peer correlation of a sensor is its mean correlation with the other sensors; the
+    score is how far it falls below the median peer correlation of the room. A stuck
+    sensor (no variance) has a peer correlation of 0. At least 3 sensors are needed to
+    tell which one decoupled.
+    """
+
+    needs_batches = True
+
+    def __init__(self, window: int = 60, threshold: float = 0.5, warmup: int = 30):
+        """
+        Args:
+            window: equivalent window of the exponential weights, in ticks (alpha = 2 / (window + 1)).
+            threshold: correlation drop below the room median above which a sensor is flagged.
+            warmup: ticks in which a sensor must have reported before it is scored.
+        """
+        super().__init__(threshold)
+        self.window = window
+        self.alpha = 2.0 / (window + 1)
+        self.warmup = warmup
+        self._state("_mean")
+        self._state("_ticks")
+        self._cov = np.zeros((0, 0))
+        self._size = 0
+
+    def _reserve(self, size: int):
+        capacity = self._capacity
+        super()._reserve(size)
+        if self._capacity != capacity:
+            grown = np.zeros((self._capacity, self._capacity))
+            grown[:capacity, :capacity] = self._cov
+            self._cov = grown
+
+    def score_batch(self, sensors, timestamps, values):
+        """Update the model once with the batch (one tick), then score each of its readings."""
+        scores = np.zeros(len(values))
+        if not len(values):
+            return scores
+        self._reserve(int(sensors.max()) + 1)
+        # last reading of each sensor of the batch
+        fresh, last = np.unique(sensors[::-1], return_index=True)
+        self._update(fresh, values[::-1][last])
+        if self._size < 3:
+            return scores
+        peer = self.peer_correlation()
+        reference = np.median(peer)
+        warm = self._ticks[sensors] > self.warmup
+        scores[warm] = np.maximum(0.0, reference - peer[sensors[warm]])
+        return scores
+
+    def _update(self, sensors: np.ndarray, values: np.ndarray):
+        """Rank-one update of the mean and covariance of the sensors that reported during a tick."""
+        first = self._ticks[sensors] == 0
+        # a new sensor enters the model at its first value
+        self._mean[sensors[first]] = values[first]
+        self._size = max(self._size, int(sensors.max()) + 1)
+        alpha = self.alpha
+        delta = values - self._mean[sensors]
+        self._mean[sensors] += alpha * delta
+        block = np.ix_(sensors, sensors)
+        self._cov[block] = (1 - alpha) * (self._cov[block] + alpha * np.outer(delta, delta))
+        self._ticks[sensors] += 1
+
+    def export_state(self) -> dict:
+        state = super().export_state()
+        state["cov"] = self._cov[:self._size, :self._size].tolist()
+        return state
+
+    def import_state(self, state: dict):
+        super().import_state(state)
+        self._size = len(state["cov"])
+        cov = np.asarray(state["cov"], dtype=float).reshape(self._size, self._size)
+        if self._size > self._capacity:
+            raise ValueError(f"{self.name}: covariance of {self._size} sensors for {self._capacity} slots")
+        self._cov = np.zeros((self._capacity, self._capacity))
+        self._cov[:self._size, :self._size] = cov
+
+    def correlation(self) -> np.ndarray:
+        """Current correlation matrix of the sensors (sensors without variance: 0)."""
+        k = self._size
+        cov = self._cov[:k, :k]
+        stddev = np.sqrt(np.maximum(np.diag(cov), 0.0))
+        stuck = stddev < _EPSILON
+        corr = cov / np.outer(np.where(stuck, 1.0, stddev), np.where(stuck, 1.0, stddev))
+        corr[stuck, :] = 0.0
+        corr[:, stuck] = 0.0
+        return corr
+
+    def peer_correlation(self) -> np.ndarray:
+        """Mean correlation of each sensor with the other sensors."""
+        corr = self.correlation()
+        k = len(corr)
+        if k < 2:
+            return np.ones(k)
+        return (corr.sum(axis=1) - np.diag(corr)) / (k - 1)
+
+
+def available_detectors() -> List[str]:
+    """Names of the registered detectors."""
+    return sorted(DETECTORS)
@@ -26,11 +26,9 @@ class InterfaceAgent(Agent):
         """
         super().__init__(mqtt_client)
         self.room = room
-        # register callback
-        self.mqtt.set_message_callback(self._on_message)
-        # subscribe to averages and alerts
-        self.mqtt.subscribe(f"home/{self.room}/+/average")
-        self.mqtt.subscribe(f"home/alerts/{self.room}")
+        # subscribe to averages and alerts with the same callback
+        self.mqtt.subscribe(f"home/{self.room}/+/average", callback=self._on_message)
+        self.mqtt.subscribe(f"home/alerts/{self.room}", callback=self._on_message)
 
     def _on_message(self, topic: str, payload: dict):
         """Render received messages in a human-readable way."""
@@ -39,6 +37,13 @@ class InterfaceAgent(Agent):
             LOG.info("[Interface] Room=%s Measurement=%s Average=%.2f", payload.get("room"),
                      payload.get("measurement"), payload.get("room_average"))
         elif topic.startswith("home/alerts/"):
-            LOG.warning("[Interface] ALERT for room %s: %s", self.room, payload)
+            state = payload.get("state")
+            if state == "summary":
+                LOG.info("[Interface] Room=%s Measurement=%s open incidents: %s", self.room,
+                         payload.get("measurement"), [i.get("sensor_id") for i in payload.get("incidents", [])])
+            elif state == "cleared":
+                LOG.info("[Interface] Room=%s alert cleared for %s", self.room, payload.get("sensor_id"))
+            else:
+                LOG.warning("[Interface] ALERT (%s) for room %s: %s", state, self.room, payload)
         else:
             LOG.info("[Interface] Message on %s: %s", topic, payload)
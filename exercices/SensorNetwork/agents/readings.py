@@ -0,0 +1,71 @@
+"""
+Sensor reading payload helpers.
+
+Readings travel either one per message (legacy format) on
+    home/{room}/{measurement}/{sensor_id}   {"timestamp": <int>, "sensor_id": "<id>", "value": <float>}
+or grouped in batch frames, one per (room, measurement) and tick, on
+    home/{room}/{measurement}/batch         {"timestamp": <int>, "readings": [["<id>", <int>, <float>], ...]}
+
+Consumers use iter_readings() to accept both formats.
+"""
+
+from typing import Iterable, Iterator, Optional, Tuple
+import time
+
+BATCH_SUFFIX = "batch"
+
+Reading = Tuple[str, int, float]
+
+
+def batch_topic(room: str, measurement: str) -> str:
+    """Return the topic of the batch frames of a room and measurement."""
+    return f"home/{room}/{measurement}/{BATCH_SUFFIX}"
+
+
+def make_frame(readings: Iterable[Reading], timestamp: Optional[int] = None) -> dict:
+    """
+    Build a batch frame payload.
+
+    Args:
+        readings: iterable of (sensor_id, timestamp, value) tuples.
+        timestamp: frame timestamp (defaults to now).
+    Returns:
+        JSON-serializable frame dict.
+    """
+    return {
+        "timestamp": int(time.time()) if timestamp is None else timestamp,
+        "readings": [[sensor_id, ts, value] for sensor_id, ts, value in readings],
+    }
+
+
+def iter_readings(payload) -> Iterator[Reading]:
+    """
+    Yield the (sensor_id, timestamp, value) readings carried by a payload.
+
+    Accepts legacy single-reading payloads and batch frames; payloads without readings
+    (averages, states, control commands) and malformed entries yield nothing.
+
+    Args:
+        payload: decoded message payload.
+    """
+    if not isinstance(payload, dict):
+        return
+    frame = payload.get("readings")
+    if frame is None:
+        if "value" not in payload:
+            return
+        try:
+            value = float(payload["value"])
+            timestamp = payload.get("timestamp")
+            timestamp = int(time.time() if timestamp is None else timestamp)
+        except (TypeError, ValueError):
+            return
+        yield payload.get("sensor_id"), timestamp, value
+        return
+    for entry in frame:
+        try:
+            sensor_id, ts, value = entry
+            reading = (sensor_id, int(ts), float(value))
+        except (TypeError, ValueError):
+            continue
+        yield reading
@@ -0,0 +1,120 @@
+"""
+Robust statistics over a sliding window.
+
+RollingMedian keeps the last `window` values both in arrival order (for eviction) and in
+a sorted list (bisect), which gives the median in O(1) and the exact median absolute
+deviation (MAD) in O(log n): the absolute deviations on each side of the median form two
+sorted sequences, and the MAD is the middle element of their union.
+
+An update costs an O(log n) search but an O(n) list insertion/deletion: the memmove is
+cheap for windows of a few hundred values, not constant for large windows.
+"""
+
+from bisect import bisect_left, insort
+from collections import deque
+from typing import List, Optional
+
+# scale factor making the MAD a consistent estimator of the stddev for normal data
+MAD_SCALE = 1.4826
+
+
+class RollingMedian:
+    """
+    Median and MAD of the most recent values of a stream.
+
+    Usage:
+        window = RollingMedian(window=101)
+        window.push(21.5)
+        window.median, window.mad
+    """
+
+    __slots__ = ("window", "_values", "_sorted")
+
+    def __init__(self, window: int):
+        """
+        Args:
+            window: maximum number of values kept (must be positive).
+        """
+        if window <= 0:
+            raise ValueError("window must be positive")
+        self.window = window
+        self._values = deque()
+        self._sorted = []
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def values(self) -> List[float]:
+        """Values of the window, oldest first."""
+        return list(self._values)
+
+    def push(self, value: float):
+        """Add a value, evicting the oldest one when the window is full (O(log n) search, O(n) update)."""
+        if len(self._values) == self.window:
+            oldest = self._values.popleft()
+            del self._sorted[bisect_left(self._sorted, oldest)]
+        self._values.append(value)
+        insort(self._sorted, value)
+
+    @property
+    def median(self) -> Optional[float]:
+        """Median of the window (None when empty)."""
+        s = self._sorted
+        n = len(s)
+        if not n:
+            return None
+        h = n // 2
+        return s[h] if n % 2 else (s[h - 1] + s[h]) / 2.0
+
+    @property
+    def mad(self) -> Optional[float]:
+        """Median absolute deviation from the median (None when empty)."""
+        n = len(self._sorted)
+        if not n:
+            return None
+        median = self.median
+        h = n // 2
+        if n % 2:
+            return self._kth_deviation(h, median, h)
+        return (self._kth_deviation(h - 1, median, h) + self._kth_deviation(h, median, h)) / 2.0
+
+    def _kth_deviation(self, k: int, median: float, h: int) -> float:
+        """
+        k-th smallest (0-based) absolute deviation from the median.
+
+        Left deviations median - s[h-1-i] and right deviations s[h+j] - median are both
+        ascending: binary search of the number i taken from the left sequence.
+        """
+        s = self._sorted
+        left = h
+        right = len(s) - h
+
+        def a(i):
+            return median - s[h - 1 - i]
+
+        def b(j):
+            return s[h + j] - median
+
+        lo = max(0, k + 1 - right)
+        hi = min(k + 1, left)
+        while lo < hi:
+            i = (lo + hi) // 2
+            j = k + 1 - i
+            if j > 0 and b(j - 1) > a(i):
+                # the k-th deviation takes more values from the left sequence
+                lo = i + 1
+            else:
+                hi = i
+        i = lo
+        j = k + 1 - i
+        candidates = []
+        if i > 0:
+            candidates.append(a(i - 1))
+        if j > 0:
+            candidates.append(b(j - 1))
+        return max(candidates)
+
+    def scaled_mad(self) -> Optional[float]:
+        """MAD scaled to estimate the standard deviation (1.4826 * MAD)."""
+        mad = self.mad
+        return None if mad is None else MAD_SCALE * mad
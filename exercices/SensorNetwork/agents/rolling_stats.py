@@ -0,0 +1,130 @@
+"""
+Streaming statistics over a sliding window.
+
+RollingStats keeps the mean and variance of the last `window` values up to date in O(1)
+per push, whatever the window size (Welford's update, extended to remove the evicted
+value).
+"""
+
+from collections import deque
+from typing import Iterable, Optional
+import math
+
+
+class RollingStats:
+    """
+    Mean / variance / sum of the most recent values of a stream.
+
+    The window is recomputed exactly every `window` evictions so that the rounding error of
+    the removal updates never accumulates (amortized O(1)).
+
+    Usage:
+        stats = RollingStats(window=30)
+        stats.push(21.5)
+        stats.mean, stats.stddev
+    """
+
+    __slots__ = ("window", "_values", "_mean", "_m2", "_evictions")
+
+    def __init__(self, window: int, values: Optional[Iterable[float]] = None):
+        """
+        Args:
+            window: maximum number of values kept (must be positive).
+            values: optional initial values, oldest first.
+        """
+        if window <= 0:
+            raise ValueError("window must be positive")
+        self.window = window
+        self._values = deque(maxlen=window)
+        self._mean = 0.0
+        # sum of squared deviations from the mean
+        self._m2 = 0.0
+        self._evictions = 0
+        for value in values or ():
+            self.push(value)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    @property
+    def count(self) -> int:
+        """Number of values in the window."""
+        return len(self._values)
+
+    @property
+    def mean(self) -> float:
+        """Mean of the window (0.0 when empty)."""
+        return self._mean
+
+    @property
+    def total(self) -> float:
+        """Sum of the window."""
+        return self._mean * len(self._values)
+
+    @property
+    def sumsq(self) -> float:
+        """Sum of the squares of the window."""
+        return self._m2 + self._mean * self._mean * len(self._values)
+
+    @property
+    def variance(self) -> float:
+        """Population variance of the window (0.0 when empty)."""
+        n = len(self._values)
+        return self._m2 / n if n else 0.0
+
+    @property
+    def stddev(self) -> float:
+        """Population standard deviation of the window."""
+        return math.sqrt(self.variance)
+
+    def push(self, value: float) -> Optional[float]:
+        """
+        Add a value, evicting the oldest one when the window is full.
+
+        Returns:
+            the evicted value, or None.
+        """
+        values = self._values
+        evicted = None
+        if len(values) == self.window:
+            evicted = values[0]
+            self._remove(evicted)
+            self._evictions += 1
+        values.append(value)
+        n = len(values)
+        delta = value - self._mean
+        self._mean += delta / n
+        self._m2 += delta * (value - self._mean)
+        if self._evictions >= self.window:
+            self._recompute()
+        return evicted
+
+    def _remove(self, value: float):
+        """Reverse Welford step for the oldest value (still in the deque)."""
+        n = len(self._values)
+        if n <= 1:
+            self._mean = 0.0
+            self._m2 = 0.0
+            return
+        mean = self._mean
+        self._mean = (n * mean - value) / (n - 1)
+        self._m2 = max(0.0, self._m2 - (value - mean) * (value - self._mean))
+
+    def _recompute(self):
+        """Exact two-pass computation over the window."""
+        n = len(self._values)
+        self._evictions = 0
+        if not n:
+            self._mean = self._m2 = 0.0
+            return
+        mean = math.fsum(self._values) / n
+        self._mean = mean
+        self._m2 = math.fsum((x - mean) ** 2 for x in self._values)
+
+    def clear(self):
+        """Remove every value."""
+        self._values.clear()
+        self._recompute()
@@ -0,0 +1,235 @@
+"""
+Hierarchical roll-ups.
+
+Partial is a mergeable aggregate (sum, count, min, max, sum of squares). Average payloads
+carry the partial of their room under "partial", and RollupAgent merges those room
+partials into floor-level and building-level aggregates, without ever reading the raw
+sensor readings:
+
+    home/rollup/floor/{floor}/{measurement}
+    home/rollup/building/{measurement}
+"""
+
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+import logging
+import math
+import time
+
+from .base_agent import Agent
+from .scheduler import Scheduler, TimerHandle, get_scheduler
+
+LOG = logging.getLogger("rollup")
+
+
+class Partial:
+    """
+    Mergeable aggregate of a set of values.
+
+    Usage:
+        partial = Partial()
+        partial.add(21.5)
+        partial.merge(Partial.from_dict(payload["partial"]))
+        partial.mean, partial.stddev
+    """
+
+    __slots__ = ("sum", "count", "min", "max", "sumsq")
+
+    def __init__(self, sum: float = 0.0, count: int = 0, min: float = math.inf, max: float = -math.inf,
+                 sumsq: float = 0.0):
+        self.sum = sum
+        self.count = count
+        self.min = min
+        self.max = max
+        self.sumsq = sumsq
+
+    def add(self, value: float):
+        """Add one value."""
+        self.sum += value
+        self.count += 1
+        self.sumsq += value * value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "Partial") -> "Partial":
+        """Merge another partial into this one and return self."""
+        self.sum += other.sum
+        self.count += other.count
+        self.sumsq += other.sumsq
+        if other.min < self.min:
+            self.min = other.min
+        if other.max > self.max:
+            self.max = other.max
+        return self
+
+    @property
+    def mean(self) -> float:
+        """Mean of the values (0.0 when empty)."""
+        return self.sum / self.count if self.count else 0.0
+
+    @property
+    def variance(self) -> float:
+        """Population variance of the values."""
+        if not self.count:
+            return 0.0
+        mean = self.mean
+        return max(0.0, self.sumsq / self.count - mean * mean)
+
+    @property
+    def stddev(self) -> float:
+        """Population standard deviation of the values."""
+        return math.sqrt(self.variance)
+
+    def to_dict(self) -> dict:
+        """JSON-serializable form (empty partials have null min/max)."""
+        empty = not self.count
+        return {
+            "sum": self.sum,
+            "count": self.count,
+            "min": None if empty else self.min,
+            "max": None if empty else self.max,
+            "sumsq": self.sumsq,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> "Partial":
+        """Rebuild a partial from to_dict() output."""
+        count = int(data.get("count", 0))
+        if not count:
+            return cls()
+        return cls(float(data["sum"]), count, float(data["min"]), float(data["max"]), float(data["sumsq"]))
+
+    def __repr__(self):
+        return f"Partial(sum={self.sum}, count={self.count}, min={self.min}, max={self.max}, sumsq={self.sumsq})"
+
+
+def merge_all(partials: Iterable[Partial]) -> Partial:
+    """Return a new partial merging every given partial."""
+    result = Partial()
+    for partial in partials:
+        result.merge(partial)
+    return result
+
+
+class RollupAgent(Agent):
+    """
+    Agent combining room averages into floor and building aggregates.
+
+    Subscribes to home/+/+/average, keeps the latest partial of each (room, measurement)
+    and, every publish_period seconds, publishes for each measurement one aggregate per
+    floor and one for the whole building (rooms missing from the hierarchy only count in
+    the building aggregate).
+
+    Usage:
+        rollup = RollupAgent(mqtt_client, floors={"ground": ["kitchen", "living_room"],
+                                                  "first": ["bedroom1"]})
+        rollup.start()
+    """
+
+    def __init__(self, mqtt_client, floors: Mapping[str, Iterable[str]], publish_period: float = 5.0,
+                 scheduler: Optional[Scheduler] = None, max_age: Optional[float] = None):
+        """
+        Args:
+            mqtt_client: MQTTClient instance.
+            floors: room hierarchy, floor name -> room ids.
+            publish_period: seconds between two roll-up publications.
+            scheduler: Scheduler running the publications (process-wide one by default).
+            max_age: seconds after which a room partial that was not refreshed is ignored
+                (None keeps them forever).
+        """
+        super().__init__(mqtt_client)
+        self.publish_period = publish_period
+        self.scheduler = scheduler
+        self.max_age = max_age
+        self._floor_of: Dict[str, str] = {}
+        for floor, rooms in floors.items():
+            for room in rooms:
+                self._floor_of[room] = floor
+        # (room, measurement) -> (latest partial, monotonic reception time)
+        self._partials: Dict[Tuple[str, str], Tuple[Partial, float]] = {}
+        self._timer: Optional[TimerHandle] = None
+        self.mqtt.subscribe("home/+/+/average", callback=self._on_message)
+        LOG.info("RollupAgent subscribed to home/+/+/average (%d rooms in %d floors)", len(self._floor_of), len(floors))
+
+    def start(self):
+        """Publish the roll-ups every publish_period seconds on the scheduler."""
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = (self.scheduler or get_scheduler()).schedule(self.publish_period, self._publish_rollups)
+            self._running = True
+        LOG.info("RollupAgent started (period=%.2fs)", self.publish_period)
+
+    def stop(self):
+        """Cancel the periodic publications."""
+        with self._lock:
+            timer, self._timer = self._timer, None
+            self._running = False
+        if timer is not None:
+            (self.scheduler or get_scheduler()).cancel(timer)
+        LOG.info("RollupAgent stopped")
+
+    def _on_message(self, topic: str, payload: dict):
+        """Store the partial of a room average (O(1))."""
+        parts = topic.split("/")
+        if len(parts) != 4 or not isinstance(payload, dict) or "partial" not in payload:
+            return
+        try:
+            partial = Partial.from_dict(payload["partial"])
+        except (KeyError, TypeError, ValueError):
+            LOG.debug("Invalid partial on %s: %s", topic, payload)
+            return
+        with self._lock:
+            self._partials[(parts[1], parts[2])] = (partial, time.monotonic())
+
+    def _rollups(self) -> Tuple[Dict[Tuple[str, str], list], Dict[str, Partial]]:
+        """Merge the room partials: (floor, measurement) -> [rooms, partial] and measurement -> partial."""
+        floors: Dict[Tuple[str, str], list] = {}
+        building: Dict[str, Partial] = {}
+        oldest = None if self.max_age is None else time.monotonic() - self.max_age
+        with self._lock:
+            for (room, measurement), (partial, received) in self._partials.items():
+                if oldest is not None and received < oldest:
+                    continue
+                floor = self._floor_of.get(room)
+                if floor is not None:
+                    entry = floors.setdefault((floor, measurement), [0, Partial()])
+                    entry[0] += 1
+                    entry[1].merge(partial)
+                building.setdefault(measurement, Partial()).merge(partial)
+        return floors, building
+
+    @staticmethod
+    def _payload(partial: Partial, measurement: str, **scope) -> dict:
+        """Roll-up payload of a merged partial."""
+        payload = {"timestamp": int(time.time())}
+        payload.update(scope)
+        payload.update({
+            "measurement": measurement,
+            "average": partial.mean,
+            "min": partial.min,
+            "max": partial.max,
+            "stddev": partial.stddev,
+            "count": partial.count,
+            "partial": partial.to_dict(),
+        })
+        return payload
+
+    def _publish_rollups(self):
+        """Publish every floor and building aggregate."""
+        floors, building = self._rollups()
+        messages = []
+        for (floor, measurement), (rooms, partial) in floors.items():
+            if partial.count:
+                messages.append((f"home/rollup/floor/{floor}/{measurement}",
+                                 self._payload(partial, measurement, floor=floor, rooms=rooms)))
+        for measurement, partial in building.items():
+            if partial.count:
+                messages.append((f"home/rollup/building/{measurement}", self._payload(partial, measurement)))
+        for topic, payload in messages:
+            try:
+                self.mqtt.publish(topic, payload)
+            except Exception:
+                LOG.exception("Failed to publish roll-up on %s", topic)
+        LOG.info("RollupAgent published %d roll-ups", len(messages))
@@ -2,7 +2,8 @@
 Room agent that manages multiple sensors and room-level actuators (heating, window).
 
 Responsibilities:
-- Create and manage sensors for the room using SensorFactory.
+- Create and manage sensors for the room using SensorFactory, or as rows of a shared
+  vectorized SensorBank.
 - Respond to control commands received on MQTT (e.g., heating on/off, open/close window).
 - Apply simple modulation to sensor baselines when actuators change (simulates effect of heating or window).
 - Publish room-level state on topic: home/{room}/state
@@ -15,6 +16,7 @@ import logging
 import time
 
 from .base_agent import Agent
+from .sensor_bank import SensorBank
 from .sensor_factory import SensorFactory, SensorAgent
 
 LOG = logging.getLogger("room_agent")
@@ -31,16 +33,23 @@ class RoomAgent(Agent):
         home/{room}/state
     """
 
-    def __init__(self, mqtt_client, room: str):
+    def __init__(self, mqtt_client, room: str, sensor_cls: type = SensorAgent,
+                 bank: Optional[SensorBank] = None):
         """
         Initialize a RoomAgent.
 
         Args:
             mqtt_client: MQTTClient wrapper instance shared by agents.
             room: room identifier string.
+            sensor_cls: SensorAgent subclass used for new sensors (AsyncSensorAgent with
+                an AsyncMQTTClient).
+            bank: optional SensorBank; when given, new sensors are rows of the bank instead
+                of SensorAgent objects and actuator effects are masked array adds.
         """
         super().__init__(mqtt_client, agent_id=f"room_{room}")
         self.room = room
+        self.sensor_cls = sensor_cls
+        self.bank = bank
 
         # sensor registry: sensor_id -> SensorAgent
         self.sensors: Dict[str, SensorAgent] = {}
@@ -56,12 +65,9 @@ class RoomAgent(Agent):
         self._window_humidity_delta = 8.0
         self._window_temp_delta = -1.5
 
-        # register callback for control messages
-        self.mqtt.set_message_callback(self._on_message)
-
-        # subscribe to control topics for this room
+        # subscribe to control topics for this room and register callback for them
         control_topic = f"home/{self.room}/control/#"
-        self.mqtt.subscribe(control_topic)
+        self.mqtt.subscribe(control_topic, callback=self._on_message)
         LOG.info("RoomAgent subscribed to control topic: %s", control_topic)
 
     # ---- sensor management ----
@@ -74,12 +80,22 @@ class RoomAgent(Agent):
             sensor_id: unique sensor id.
             **kwargs: override defaults passed to SensorFactory (baseline, noise, etc).
         """
-        if sensor_id in self.sensors:
+        if sensor_id in self.sensors or (self.bank is not None and sensor_id in self.bank):
             LOG.warning("Sensor %s already exists in room %s", sensor_id, self.room)
             return
 
+        if self.bank is not None:
+            # bank row starts with the baseline shifted by the active actuators
+            baseline = SensorFactory.config(measurement, **kwargs)["baseline"]
+            kwargs["baseline"] = baseline + self._actuator_delta(measurement)
+            self.bank.add(self.room, measurement, sensor_id, **kwargs)
+            LOG.info("Added bank sensor %s (measurement=%s) to room %s", sensor_id, measurement, self.room)
+            self._publish_state()
+            return
+
         # Create sensor via factory with provided overrides
-        sensor = SensorFactory.create(self.mqtt, self.room, measurement, sensor_id, **kwargs)
+        sensor = SensorFactory.create(self.mqtt, self.room, measurement, sensor_id,
+                                      sensor_cls=self.sensor_cls, **kwargs)
         # Modify baseline according to current actuator state to reflect environment
         self._apply_actuators_to_sensor(sensor)
         # Start the sensor loop
@@ -97,12 +113,18 @@ class RoomAgent(Agent):
             sensor.stop()
             LOG.info("Removed sensor %s from room %s", sensor_id, self.room)
             self._publish_state()
+        elif self.bank is not None and self.bank.remove(sensor_id, room=self.room):
+            LOG.info("Removed bank sensor %s from room %s", sensor_id, self.room)
+            self._publish_state()
         else:
             LOG.warning("Attempt to remove unknown sensor %s in room %s", sensor_id, self.room)
 
     def list_sensors(self) -> Dict[str, str]:
         """Return a mapping sensor_id -> measurement for current sensors."""
-        return {sid: getattr(s, "measurement", "unknown") for sid, s in self.sensors.items()}
+        sensors = {sid: getattr(s, "measurement", "unknown") for sid, s in self.sensors.items()}
+        if self.bank is not None:
+            sensors.update(self.bank.list_sensors(self.room))
+        return sensors
 
     # ---- actuator logic ----
     def set_heating(self, on: bool):
@@ -125,6 +147,9 @@ class RoomAgent(Agent):
                 else:
                     sensor.baseline -= self._heating_temp_delta
                 LOG.debug("Adjusted baseline of sensor %s -> %.2f", sensor.sensor_id, sensor.baseline)
+        if self.bank is not None:
+            delta = self._heating_temp_delta if on else -self._heating_temp_delta
+            self.bank.adjust_baseline(delta, room=self.room, measurement="temperature")
         self._publish_state()
 
     def set_window(self, open_: bool):
@@ -153,6 +178,10 @@ class RoomAgent(Agent):
                 else:
                     sensor.baseline -= self._window_temp_delta
                 LOG.debug("Adjusted temperature baseline of %s -> %.2f", sensor.sensor_id, sensor.baseline)
+        if self.bank is not None:
+            sign = 1.0 if open_ else -1.0
+            self.bank.adjust_baseline(sign * self._window_humidity_delta, room=self.room, measurement="humidity")
+            self.bank.adjust_baseline(sign * self._window_temp_delta, room=self.room, measurement="temperature")
         self._publish_state()
 
     def _apply_actuators_to_sensor(self, sensor: SensorAgent):
@@ -161,12 +190,18 @@ class RoomAgent(Agent):
 
         Used when a sensor is created while actuators are already active.
         """
-        if getattr(sensor, "measurement", "") == "temperature" and self.heating_on:
-            sensor.baseline += self._heating_temp_delta
-        if getattr(sensor, "measurement", "") == "humidity" and self.window_open:
-            sensor.baseline += self._window_humidity_delta
-        if getattr(sensor, "measurement", "") == "temperature" and self.window_open:
-            sensor.baseline += self._window_temp_delta
+        sensor.baseline += self._actuator_delta(getattr(sensor, "measurement", ""))
+
+    def _actuator_delta(self, measurement: str) -> float:
+        """Return the baseline shift currently induced by the actuators on a measurement."""
+        delta = 0.0
+        if measurement == "temperature" and self.heating_on:
+            delta += self._heating_temp_delta
+        if measurement == "humidity" and self.window_open:
+            delta += self._window_humidity_delta
+        if measurement == "temperature" and self.window_open:
+            delta += self._window_temp_delta
+        return delta
 
     # ---- MQTT message handling ----
     def _on_message(self, topic: str, payload: dict):
@@ -252,4 +287,7 @@ class RoomAgent(Agent):
             except Exception:
                 LOG.exception("Error stopping sensor %s", getattr(sensor, "sensor_id", "unknown"))
         self.sensors.clear()
+        if self.bank is not None:
+            for sensor_id in self.bank.list_sensors(self.room):
+                self.bank.remove(sensor_id)
         LOG.info("RoomAgent stopped for room %s", self.room)
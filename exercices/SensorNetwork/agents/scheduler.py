@@ -0,0 +1,198 @@
+"""
+Shared timer scheduler for periodic agent tasks.
+
+A single timer thread keeps every periodic task in a binary heap ordered by due time
+and hands due tasks to a small worker pool. Scheduling is O(log n) and cancellation is
+O(1) (lazy deletion), so thousands of sensors cost heap entries instead of threads.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+LOG = logging.getLogger("scheduler")
+
+
+class TimerHandle:
+    """
+    Handle of a periodic task registered on a Scheduler.
+
+    Attributes:
+        period: seconds between two runs.
+        callback: function called without arguments at each run.
+        next_due: monotonic time of the next run.
+        cancelled: True once cancel() was called.
+    """
+
+    __slots__ = ("period", "callback", "next_due", "cancelled")
+
+    def __init__(self, period: float, callback: Callable[[], None], next_due: float):
+        self.period = period
+        self.callback = callback
+        self.next_due = next_due
+        self.cancelled = False
+
+
+class Scheduler:
+    """
+    Heap-based scheduler running periodic callbacks on a few worker threads.
+
+    A task never overlaps with itself: its next run is scheduled once the current run has
+    finished, at a fixed rate (next_due += period) unless it fell more than one period
+    behind, in which case it is rescheduled from now.
+
+    Usage:
+        scheduler = Scheduler(workers=2)
+        handle = scheduler.schedule(2.0, sensor_tick)
+        scheduler.cancel(handle)
+    """
+
+    def __init__(self, workers: int = 2, name: str = "scheduler"):
+        """
+        Args:
+            workers: number of threads running the callbacks.
+            name: prefix of the thread names.
+        """
+        self.workers = workers
+        self.name = name
+        self._heap: List[Tuple[float, int, TimerHandle]] = []
+        self._seq = itertools.count()
+        self._cancelled = 0
+        self._cond = threading.Condition()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    def __len__(self) -> int:
+        """Number of active tasks waiting in the heap."""
+        with self._cond:
+            return len(self._heap) - self._cancelled
+
+    def start(self):
+        """Start the timer thread and the worker pool."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{self.name}-worker")
+            self._thread = threading.Thread(target=self._loop, name=f"{self.name}-timer", daemon=True)
+            self._thread.start()
+        LOG.debug("Scheduler %s started with %d workers", self.name, self.workers)
+
+    def stop(self):
+        """Stop the timer thread; running callbacks complete, pending ones are dropped."""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify()
+        self._thread.join(timeout=2.0)
+        self._executor.shutdown(wait=False)
+        LOG.debug("Scheduler %s stopped", self.name)
+
+    def schedule(self, period: float, callback: Callable[[], None], delay: Optional[float] = None) -> TimerHandle:
+        """
+        Register a periodic callback.
+
+        Args:
+            period: seconds between runs (must be positive).
+            callback: function called without arguments.
+            delay: seconds before the first run (default: one period).
+        Returns:
+            TimerHandle to pass to cancel().
+        """
+        if period <= 0:
+            raise ValueError("period must be positive")
+        first = period if delay is None else max(0.0, delay)
+        handle = TimerHandle(period, callback, time.monotonic() + first)
+        self._push(handle)
+        return handle
+
+    def cancel(self, handle: TimerHandle):
+        """
+        Cancel a periodic callback (O(1); the heap entry is discarded lazily).
+
+        A run already handed to a worker still completes.
+        """
+        with self._cond:
+            if handle.cancelled:
+                return
+            handle.cancelled = True
+            self._cancelled += 1
+            # rebuild the heap when cancelled entries dominate, amortized O(1) per cancel
+            if self._cancelled > 64 and self._cancelled * 2 > len(self._heap):
+                kept = [entry for entry in self._heap if not entry[2].cancelled]
+                self._cancelled -= len(self._heap) - len(kept)
+                heapq.heapify(kept)
+                self._heap = kept
+
+    def _push(self, handle: TimerHandle):
+        """Insert a handle in the heap and wake the timer thread if it became the earliest."""
+        with self._cond:
+            heapq.heappush(self._heap, (handle.next_due, next(self._seq), handle))
+            if self._heap[0][2] is handle:
+                self._cond.notify()
+
+    def _loop(self):
+        """Timer thread: wait for the earliest due task and hand it to the workers."""
+        with self._cond:
+            while self._running:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                due, _, handle = self._heap[0]
+                if handle.cancelled:
+                    heapq.heappop(self._heap)
+                    self._cancelled -= 1
+                    continue
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(timeout=delay)
+                    continue
+                heapq.heappop(self._heap)
+                self._executor.submit(self._run, handle)
+
+    def _run(self, handle: TimerHandle):
+        """Worker: run a callback then schedule its next run."""
+        if handle.cancelled:
+            with self._cond:
+                self._cancelled -= 1
+            return
+        try:
+            handle.callback()
+        except Exception:
+            LOG.exception("Error in scheduled task %s", handle.callback)
+        now = time.monotonic()
+        handle.next_due += handle.period
+        if handle.next_due < now - handle.period:
+            # too far behind (overload or pause): skip the missed runs
+            handle.next_due = now
+        with self._cond:
+            if handle.cancelled:
+                self._cancelled -= 1
+                return
+            # the condition lock is reentrant
+            self._push(handle)
+
+
+_default_scheduler: Optional[Scheduler] = None
+_default_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    """
+    Return the process-wide scheduler shared by agents, starting it on first use.
+
+    Returns:
+        the default Scheduler instance.
+    """
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = Scheduler(workers=4, name="agents")
+            _default_scheduler.start()
+        return _default_scheduler
@@ -4,13 +4,13 @@ Factory producing sensor agent instances.
 Design pattern: Factory. Allows creating different sensor types (temperature, humidity, light, presence).
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import math
 import time
-import threading
 import logging
 
 from .base_agent import Agent
+from .scheduler import Scheduler, get_scheduler
 
 LOG = logging.getLogger("sensor_factory")
 
@@ -30,7 +30,8 @@ class SensorAgent(Agent):
                  period: float = 1.0,
                  amplitude: float = 1.0,
                  baseline: float = 20.0,
-                 noise: float = 0.0):
+                 noise: float = 0.0,
+                 scheduler: Optional[Scheduler] = None):
         """
         Args:
             mqtt_client: MQTTClient instance.
@@ -41,6 +42,7 @@ class SensorAgent(Agent):
             amplitude: amplitude for simulated sinusoid.
             baseline: baseline value to center the sinusoid.
             noise: additive random noise amplitude.
+            scheduler: Scheduler driving the readings (process-wide one by default).
         """
         super().__init__(mqtt_client, agent_id=sensor_id)
         self.room = room
@@ -50,8 +52,8 @@ class SensorAgent(Agent):
         self.amplitude = amplitude
         self.baseline = baseline
         self.noise = noise
-        self._thread = None
-        self._stop_event = threading.Event()
+        self.scheduler = scheduler
+        self._timer = None
         # internal time counter used to compute sinusoid
         self._counter = 0.0
 
@@ -69,38 +71,31 @@ class SensorAgent(Agent):
         return float(value)
 
     def start(self):
-        """Start periodic publishing in a background thread."""
-        if self._thread and self._thread.is_alive():
+        """Start periodic publishing on the shared scheduler."""
+        if self._timer is not None:
             return
-        self._stop_event.clear()
-        self._thread = threading.Thread(target=self._loop, daemon=True, name=f"Sensor-{self.sensor_id}")
-        self._thread.start()
+        self._timer = (self.scheduler or get_scheduler()).schedule(self.period, self._tick, delay=0.0)
         LOG.info("Sensor %s started (room=%s measurement=%s)", self.sensor_id, self.room, self.measurement)
 
-    def _loop(self):
-        """Publishing loop executed in a separate thread."""
+    def _tick(self):
+        """Publish one reading; called by the scheduler every period."""
         topic = f"home/{self.room}/{self.measurement}/{self.sensor_id}"
-        while not self._stop_event.is_set():
-            value = self._compute_value()
-            payload = {
-                "timestamp": int(time.time()),
-                "sensor_id": self.sensor_id,
-                "value": value,
-            }
-            try:
-                self.mqtt.publish(topic, payload)
-            except Exception:
-                LOG.exception("Failed to publish sensor reading")
-            # wait for period seconds unless stopped
-            stopped = self._stop_event.wait(timeout=self.period)
-            if stopped:
-                break
+        value = self._compute_value()
+        payload = {
+            "timestamp": int(time.time()),
+            "sensor_id": self.sensor_id,
+            "value": value,
+        }
+        try:
+            self.mqtt.publish(topic, payload)
+        except Exception:
+            LOG.exception("Failed to publish sensor reading")
 
     def stop(self):
-        """Stop the background thread gracefully."""
-        self._stop_event.set()
-        if self._thread:
-            self._thread.join(timeout=2.0)
+        """Cancel the scheduled readings."""
+        if self._timer is not None:
+            (self.scheduler or get_scheduler()).cancel(self._timer)
+            self._timer = None
         LOG.info("Sensor %s stopped", self.sensor_id)
 
 
@@ -0,0 +1,279 @@
+"""
+Vectorized sensor engine.
+
+SensorBank simulates many sensors at once: their parameters and internal time are kept
+in NumPy arrays (one row per sensor) and every due reading of a tick is computed in a
+single vectorized step. It uses the same value model as SensorAgent and, for the same
+seed, produces the same readings as sensors created with SensorFactory (the noise and
+phase draws come from a Mersenne Twister stream identical to the `random` module one).
+"""
+
+from typing import Dict, List, Optional
+import logging
+import random
+import threading
+import time
+
+import numpy as np
+
+from .readings import batch_topic, make_frame
+from .scheduler import Scheduler, TimerHandle, get_scheduler
+from .sensor_factory import SensorFactory
+
+LOG = logging.getLogger("sensor_bank")
+
+# float columns of the bank, one value per sensor
+_COLUMNS = ("baseline", "amplitude", "phase", "period", "noise", "internal_time", "next_due")
+
+
+class SensorBank:
+    """
+    Array-backed simulator publishing readings for many sensors from one scheduled task.
+
+    Each sensor publishes on home/{room}/{measurement}/{sensor_id} every `period` seconds,
+    like SensorAgent. In batch mode the readings of a scan are instead grouped in one frame
+    per (room, measurement) on home/{room}/{measurement}/batch (see readings.py).
+    Actuator effects become masked array operations (adjust_baseline).
+
+    Usage:
+        bank = SensorBank(mqtt_client, seed=42)
+        bank.add("bedroom1", "temperature", "bedroom1_temp_01")
+        bank.start()
+    """
+
+    def __init__(self, mqtt_client, seed: Optional[int] = None, resolution: float = 0.1,
+                 scheduler: Optional[Scheduler] = None, capacity: int = 64, batch: bool = False):
+        """
+        Args:
+            mqtt_client: MQTTClient wrapper instance (transport).
+            seed: random seed; the stream matches `random.seed(seed)` followed by the creation
+                of the same sensors through SensorFactory. None seeds from the OS.
+            resolution: seconds between two scans for due sensors.
+            scheduler: Scheduler running the scans (process-wide one by default).
+            capacity: initial number of rows (arrays grow by doubling).
+            batch: publish one frame per (room, measurement) and scan instead of one
+                message per reading.
+        """
+        self.mqtt = mqtt_client
+        self.batch = batch
+        self.resolution = resolution
+        self.scheduler = scheduler
+        self._rng = np.random.RandomState()
+        if seed is not None:
+            # copy the Mersenne Twister state of random.Random(seed) into NumPy
+            state = random.Random(seed).getstate()[1]
+            self._rng.set_state(("MT19937", np.array(state[:-1], dtype=np.uint32), state[-1]))
+        self._size = 0
+        self._arrays: Dict[str, np.ndarray] = {name: np.zeros(capacity) for name in _COLUMNS}
+        self._room_idx = np.zeros(capacity, dtype=np.int32)
+        self._measurement_idx = np.zeros(capacity, dtype=np.int32)
+        # row -> sensor metadata, sensor_id -> row
+        self._ids: List[str] = []
+        self._topics: List[str] = []
+        self._batch_topics: List[str] = []
+        self._rows: Dict[str, int] = {}
+        # interned room / measurement names
+        self._rooms: Dict[str, int] = {}
+        self._measurements: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._timer: Optional[TimerHandle] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, sensor_id: str) -> bool:
+        return sensor_id in self._rows
+
+    # ---- array views on the active rows ----
+    def _col(self, name: str) -> np.ndarray:
+        return self._arrays[name][:self._size]
+
+    # ---- sensor management ----
+    def _grow(self):
+        capacity = 2 * len(self._room_idx)
+        for name, array in self._arrays.items():
+            self._arrays[name] = np.resize(array, capacity)
+        self._room_idx = np.resize(self._room_idx, capacity)
+        self._measurement_idx = np.resize(self._measurement_idx, capacity)
+
+    def add(self, room: str, measurement: str, sensor_id: str, **overrides):
+        """
+        Add a sensor configured like SensorFactory.create() would (defaults + overrides).
+
+        Args:
+            room: room identifier string.
+            measurement: measurement type (e.g., "temperature").
+            sensor_id: unique sensor id string.
+            **overrides: optional period, amplitude, baseline, noise.
+        Raises:
+            ValueError: if the sensor id is already present.
+        """
+        cfg = SensorFactory.config(measurement, **overrides)
+        with self._lock:
+            if sensor_id in self._rows:
+                raise ValueError(f"Sensor {sensor_id} already in bank")
+            if self._size == len(self._room_idx):
+                self._grow()
+            row = self._size
+            values = self._arrays
+            values["baseline"][row] = cfg["baseline"]
+            values["amplitude"][row] = cfg["amplitude"]
+            # same draw as SensorAgent.__init__ (phase offset)
+            values["phase"][row] = self._rng.random_sample() * 2 * np.pi
+            values["period"][row] = max(0.1, cfg["period"])
+            values["noise"][row] = cfg["noise"]
+            values["internal_time"][row] = 0.0
+            # first reading at the next scan, as SensorAgent.start() does
+            values["next_due"][row] = time.monotonic()
+            self._room_idx[row] = self._rooms.setdefault(room, len(self._rooms))
+            self._measurement_idx[row] = self._measurements.setdefault(measurement, len(self._measurements))
+            self._ids.append(sensor_id)
+            self._topics.append(f"home/{room}/{measurement}/{sensor_id}")
+            self._batch_topics.append(batch_topic(room, measurement))
+            self._rows[sensor_id] = row
+            self._size += 1
+        LOG.debug("Sensor %s added to bank (%s/%s) cfg=%s", sensor_id, room, measurement, cfg)
+
+    def remove(self, sensor_id: str, room: Optional[str] = None) -> bool:
+        """
+        Remove a sensor (O(1): the last row is moved into the freed one).
+
+        Args:
+            sensor_id: sensor to remove.
+            room: if given, only remove the sensor if it belongs to this room.
+        Returns:
+            True if the sensor was present (in that room) and removed.
+        """
+        with self._lock:
+            row = self._rows.get(sensor_id)
+            if row is None:
+                return False
+            if room is not None and self._room_idx[row] != self._rooms.get(room, -1):
+                return False
+            del self._rows[sensor_id]
+            last = self._size - 1
+            if row != last:
+                for array in self._arrays.values():
+                    array[row] = array[last]
+                self._room_idx[row] = self._room_idx[last]
+                self._measurement_idx[row] = self._measurement_idx[last]
+                self._ids[row] = self._ids[last]
+                self._topics[row] = self._topics[last]
+                self._batch_topics[row] = self._batch_topics[last]
+                self._rows[self._ids[row]] = row
+            self._ids.pop()
+            self._topics.pop()
+            self._batch_topics.pop()
+            self._size = last
+        return True
+
+    def list_sensors(self, room: Optional[str] = None) -> Dict[str, str]:
+        """Return a mapping sensor_id -> measurement, optionally restricted to a room."""
+        names = {idx: name for name, idx in self._measurements.items()}
+        with self._lock:
+            mask = self._mask(room, None)
+            return {self._ids[row]: names[int(self._measurement_idx[row])] for row in np.flatnonzero(mask)}
+
+    def _mask(self, room: Optional[str], measurement: Optional[str]) -> np.ndarray:
+        """Boolean mask of the active rows matching a room and/or a measurement."""
+        mask = np.ones(self._size, dtype=bool)
+        if room is not None:
+            mask &= self._room_idx[:self._size] == self._rooms.get(room, -1)
+        if measurement is not None:
+            mask &= self._measurement_idx[:self._size] == self._measurements.get(measurement, -1)
+        return mask
+
+    def adjust_baseline(self, delta: float, room: Optional[str] = None, measurement: Optional[str] = None) -> int:
+        """
+        Add delta to the baseline of every sensor of a room and/or measurement (masked add).
+
+        Returns:
+            number of sensors adjusted.
+        """
+        with self._lock:
+            mask = self._mask(room, measurement)
+            self._col("baseline")[mask] += delta
+            return int(mask.sum())
+
+    # ---- simulation ----
+    def sample(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Compute the next reading of the given sensors and advance their internal time.
+
+        Vectorized equivalent of SensorAgent._compute_value(): rows are processed in
+        ascending order and each noisy sensor consumes one random draw.
+
+        Args:
+            rows: row indices (ascending); all sensors when None.
+        Returns:
+            array of readings, aligned with rows.
+        """
+        with self._lock:
+            return self._sample(np.arange(self._size) if rows is None else rows)
+
+    def _sample(self, rows: np.ndarray) -> np.ndarray:
+        a = self._arrays
+        t = a["internal_time"][rows]
+        sinus = np.sin(2 * np.pi * (t / 60.0) + a["phase"][rows])
+        values = a["baseline"][rows] + a["amplitude"][rows] * sinus
+        noise = a["noise"][rows]
+        noisy = noise != 0
+        count = int(noisy.sum())
+        if count:
+            values[noisy] += (self._rng.random_sample(count) - 0.5) * 2.0 * noise[noisy]
+        a["internal_time"][rows] = t + a["period"][rows]
+        return values
+
+    def tick(self, now: Optional[float] = None):
+        """
+        Publish the readings of every due sensor; called by the scheduler each resolution.
+
+        Args:
+            now: monotonic time (defaults to time.monotonic()).
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            next_due = self._col("next_due")
+            rows = np.flatnonzero(next_due <= now)
+            if not len(rows):
+                return
+            values = self._sample(rows)
+            period = self._col("period")[rows]
+            due = next_due[rows] + period
+            # sensors more than one period late restart from now instead of bursting
+            next_due[rows] = np.where(due < now - period, now, due)
+            rows = rows.tolist()
+            ids = [self._ids[row] for row in rows]
+            topics = [(self._batch_topics if self.batch else self._topics)[row] for row in rows]
+        timestamp = int(time.time())
+        if self.batch:
+            frames: Dict[str, list] = {}
+            for sensor_id, topic, value in zip(ids, topics, values.tolist()):
+                frames.setdefault(topic, []).append((sensor_id, timestamp, value))
+            for topic, readings in frames.items():
+                try:
+                    self.mqtt.publish(topic, make_frame(readings, timestamp))
+                except Exception:
+                    LOG.exception("Error while publishing bank frame on %s", topic)
+            return
+        for sensor_id, topic, value in zip(ids, topics, values.tolist()):
+            try:
+                self.mqtt.publish(topic, {"timestamp": timestamp, "sensor_id": sensor_id, "value": value})
+            except Exception:
+                LOG.exception("Error while publishing bank reading for %s", sensor_id)
+
+    def start(self):
+        """Register the bank scan on the scheduler."""
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = (self.scheduler or get_scheduler()).schedule(self.resolution, self.tick, delay=0.0)
+        LOG.info("SensorBank started with %d sensors (resolution=%.2fs)", self._size, self.resolution)
+
+    def stop(self):
+        """Cancel the scheduled scans."""
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            (self.scheduler or get_scheduler()).cancel(timer)
+        LOG.info("SensorBank stopped")
@@ -3,7 +3,8 @@ Sensor factory and SensorAgent implementation.
 
 Design patterns:
 - Factory: SensorFactory.create(...) returns configured SensorAgent instances.
-- SensorAgent publishes periodic readings to MQTT using the MQTTClient wrapper.
+- SensorAgent publishes periodic readings to MQTT using the MQTTClient wrapper. Readings
+  are driven by the shared Scheduler (no thread per sensor).
 
 All docstrings are in English for Sphinx documentation.
 """
@@ -11,11 +12,11 @@ All docstrings are in English for Sphinx documentation.
 from typing import Optional, Dict
 import math
 import time
-import threading
 import logging
 import random
 
 from .base_agent import Agent
+from .scheduler import Scheduler, TimerHandle, get_scheduler
 
 LOG = logging.getLogger("sensor_factory")
 
@@ -37,6 +38,7 @@ class SensorAgent(Agent):
         amplitude: amplitude of sinusoidal variation.
         baseline: baseline value around which sinusoid oscillates.
         noise: max amplitude of uniform random noise.
+        scheduler: Scheduler driving the periodic readings (process-wide one by default).
     """
 
     def __init__(
@@ -49,6 +51,7 @@ class SensorAgent(Agent):
         amplitude: float = 1.0,
         baseline: float = 20.0,
         noise: float = 0.0,
+        scheduler: Optional[Scheduler] = None,
     ):
         super().__init__(mqtt_client, agent_id=sensor_id)
         self.room = room
@@ -61,9 +64,10 @@ class SensorAgent(Agent):
         self.baseline = float(baseline)
         self.noise = float(noise)
 
-        # internal thread control
-        self._thread: Optional[threading.Thread] = None
-        self._stop_event = threading.Event()
+        # periodic task registered on the shared scheduler while running
+        self.scheduler = scheduler
+        self._timer: Optional[TimerHandle] = None
+        self._topic = f"home/{self.room}/{self.measurement}/{self.sensor_id}"
 
         # phase offset so sensors are not perfectly synchronized
         self._phase = random.random() * 2 * math.pi
@@ -93,18 +97,15 @@ class SensorAgent(Agent):
         return float(value)
 
     def start(self):
-        """Start the periodic publishing loop in a background thread."""
-        # If thread already running, nothing to do
-        if self._thread and self._thread.is_alive():
-            LOG.debug("Sensor %s already running", self.sensor_id)
-            return
-
-        # Clear stop flag and start thread
-        self._stop_event.clear()
-        self._thread = threading.Thread(
-            target=self._loop, name=f"Sensor-{self.sensor_id}", daemon=True
-        )
-        self._thread.start()
+        """Start periodic publishing: register the sensor on the scheduler (O(log n))."""
+        with self._lock:
+            if self._timer is not None:
+                LOG.debug("Sensor %s already running", self.sensor_id)
+                return
+            scheduler = self.scheduler or get_scheduler()
+            # first reading right away, as the former thread loop did
+            self._timer = scheduler.schedule(self.period, self._tick, delay=0.0)
+            self._running = True
         LOG.info(
             "SensorAgent started: id=%s room=%s measurement=%s period=%.2fs",
             self.sensor_id,
@@ -113,27 +114,24 @@ class SensorAgent(Agent):
             self.period,
         )
 
-    def _loop(self):
-        """Main loop executed by the background thread to publish periodic readings."""
-        topic = f"home/{self.room}/{self.measurement}/{self.sensor_id}"
-        while not self._stop_event.is_set():
-            try:
-                value = self._compute_value()
-                payload = {"timestamp": int(time.time()), "sensor_id": self.sensor_id, "value": value}
-                # publish with the MQTTClient wrapper (serialises to JSON)
-                self.mqtt.publish(topic, payload)
-                LOG.debug("Sensor %s published to %s: %s", self.sensor_id, topic, payload)
-            except Exception:
-                LOG.exception("Error while computing/publishing sensor value for %s", self.sensor_id)
-            # Wait for the period or until stopped
-            if self._stop_event.wait(timeout=self.period):
-                break
+    def _tick(self):
+        """Compute and publish one reading; called by the scheduler every period."""
+        try:
+            value = self._compute_value()
+            payload = {"timestamp": int(time.time()), "sensor_id": self.sensor_id, "value": value}
+            # publish with the MQTTClient wrapper (serialises to JSON)
+            self.mqtt.publish(self._topic, payload)
+            LOG.debug("Sensor %s published to %s: %s", self.sensor_id, self._topic, payload)
+        except Exception:
+            LOG.exception("Error while computing/publishing sensor value for %s", self.sensor_id)
 
     def stop(self):
-        """Stop the sensor's background thread and wait for it to finish."""
-        self._stop_event.set()
-        if self._thread:
-            self._thread.join(timeout=2.0)
+        """Stop publishing: cancel the scheduled task (O(1), no thread to join)."""
+        with self._lock:
+            timer, self._timer = self._timer, None
+            self._running = False
+        if timer is not None:
+            (self.scheduler or get_scheduler()).cancel(timer)
         LOG.info("SensorAgent stopped: %s", self.sensor_id)
 
 
@@ -154,12 +152,38 @@ class SensorFactory:
         "presence": {"baseline": 0.0, "amplitude": 1.0, "period": 10.0, "noise": 0.0},
     }
 
+    @staticmethod
+    def config(measurement: str, **overrides) -> Dict[str, float]:
+        """
+        Return the simulation parameters of a sensor: measurement defaults plus overrides.
+
+        Args:
+            measurement: measurement type (e.g., "temperature").
+            **overrides: optional parameters to override defaults, e.g. baseline=22.0.
+        Returns:
+            dict with float "period", "amplitude", "baseline" and "noise".
+        """
+        # pick defaults for measurement if available
+        cfg: Dict[str, float] = dict(SensorFactory._DEFAULTS.get(measurement, {}))
+        # apply overrides (period, amplitude, baseline, noise)
+        cfg.update(overrides)
+
+        # Ensure keys exist with fallback values
+        return {
+            "period": float(cfg.get("period", 2.0)),
+            "amplitude": float(cfg.get("amplitude", 1.0)),
+            "baseline": float(cfg.get("baseline", 0.0)),
+            "noise": float(cfg.get("noise", 0.0)),
+        }
+
     @staticmethod
     def create(
         mqtt_client,
         room: str,
         measurement: str,
         sensor_id: str,
+        sensor_cls: type = SensorAgent,
+        scheduler: Optional[Scheduler] = None,
         **overrides,
     ) -> SensorAgent:
         """
@@ -170,22 +194,19 @@ class SensorFactory:
             room: room identifier string.
             measurement: measurement type (e.g., "temperature").
             sensor_id: unique sensor id string.
+            sensor_cls: SensorAgent subclass to instantiate (e.g. AsyncSensorAgent).
+            scheduler: Scheduler driving the sensor (process-wide one by default).
             **overrides: optional parameters to override defaults, e.g. baseline=22.0.
         Returns:
             SensorAgent instance.
         """
-        # pick defaults for measurement if available
-        cfg: Dict[str, float] = dict(SensorFactory._DEFAULTS.get(measurement, {}))
-        # apply overrides (period, amplitude, baseline, noise)
-        cfg.update(overrides)
-
-        # Ensure keys exist with fallback values
-        period = float(cfg.get("period", 2.0))
-        amplitude = float(cfg.get("amplitude", 1.0))
-        baseline = float(cfg.get("baseline", 0.0))
-        noise = float(cfg.get("noise", 0.0))
+        cfg = SensorFactory.config(measurement, **overrides)
+        period = cfg["period"]
+        amplitude = cfg["amplitude"]
+        baseline = cfg["baseline"]
+        noise = cfg["noise"]
 
-        sensor = SensorAgent(
+        sensor = sensor_cls(
             mqtt_client=mqtt_client,
             room=room,
             measurement=measurement,
@@ -194,6 +215,7 @@ class SensorFactory:
             amplitude=amplitude,
             baseline=baseline,
             noise=noise,
+            scheduler=scheduler,
         )
         LOG.debug(
             "Created sensor %s (%s/%s) cfg=%s",
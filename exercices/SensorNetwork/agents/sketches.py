@@ -0,0 +1,215 @@
+"""
+Bounded-memory streaming aggregates.
+
+- SlidingExtrema: min/max of the last `window` values (monotonic deques, amortized O(1)).
+- EWMA: exponentially weighted moving average.
+- DDSketch: mergeable quantile sketch with relative accuracy guarantees that also
+  supports removing values, so it can follow a sliding window.
+"""
+
+from collections import deque
+from typing import Dict, Iterable, Optional
+import math
+
+
+class SlidingExtrema:
+    """
+    Minimum and maximum of the most recent values of a stream.
+
+    Each deque keeps the candidates still able to become the extremum, in window order;
+    every value is pushed and popped at most once.
+    """
+
+    __slots__ = ("window", "_seq", "_min", "_max")
+
+    def __init__(self, window: int):
+        """
+        Args:
+            window: number of most recent values covered (must be positive).
+        """
+        if window <= 0:
+            raise ValueError("window must be positive")
+        self.window = window
+        self._seq = 0
+        # (sequence number, value), values increasing in _min and decreasing in _max
+        self._min = deque()
+        self._max = deque()
+
+    def push(self, value: float):
+        """Add a value, forgetting the values that left the window."""
+        self._seq += 1
+        seq = self._seq
+        minima, maxima = self._min, self._max
+        while minima and minima[-1][1] >= value:
+            minima.pop()
+        minima.append((seq, value))
+        while maxima and maxima[-1][1] <= value:
+            maxima.pop()
+        maxima.append((seq, value))
+        expired = seq - self.window
+        if minima[0][0] <= expired:
+            minima.popleft()
+        if maxima[0][0] <= expired:
+            maxima.popleft()
+
+    @property
+    def min(self) -> Optional[float]:
+        """Minimum of the window (None when empty)."""
+        return self._min[0][1] if self._min else None
+
+    @property
+    def max(self) -> Optional[float]:
+        """Maximum of the window (None when empty)."""
+        return self._max[0][1] if self._max else None
+
+
+class EWMA:
+    """Exponentially weighted moving average: value += alpha * (x - value)."""
+
+    __slots__ = ("alpha", "value")
+
+    def __init__(self, alpha: float):
+        """
+        Args:
+            alpha: smoothing factor in ]0, 1] (weight of the newest value).
+        """
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in ]0, 1]")
+        self.alpha = alpha
+        self.value: Optional[float] = None
+
+    def update(self, x: float) -> float:
+        """Add a value and return the new average."""
+        if self.value is None:
+            self.value = x
+        else:
+            self.value += self.alpha * (x - self.value)
+        return self.value
+
+
+class DDSketch:
+    """
+    Quantile sketch with relative accuracy (Masson et al., DDSketch).
+
+    Values are counted in logarithmic buckets: any quantile is returned within
+    `relative_accuracy` of the true value. Sketches with the same accuracy merge exactly.
+    When more than max_buckets buckets are used on one side of zero, the buckets closest
+    to zero are collapsed, which bounds the memory whatever the number of values.
+
+    Usage:
+        sketch = DDSketch(relative_accuracy=0.01)
+        sketch.add(21.5)
+        sketch.quantile(0.95)
+    """
+
+    # values closer to zero are counted as zero
+    MIN_VALUE = 1e-9
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        """
+        Args:
+            relative_accuracy: maximum relative error of the quantiles, in ]0, 1[.
+            max_buckets: maximum number of buckets per sign.
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in ]0, 1[")
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        # bucket index -> count, for positive values and for the magnitude of negative ones
+        self._positive: Dict[int, int] = {}
+        self._negative: Dict[int, int] = {}
+        # lowest bucket index kept per sign (lower indexes were collapsed into it)
+        self._floors = {True: None, False: None}
+        self._zero = 0
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _key(self, magnitude: float) -> int:
+        return math.ceil(math.log(magnitude) / self._log_gamma)
+
+    def _bucket(self, value: float):
+        """Return (store, key, positive) for a non-zero value."""
+        positive = value > 0
+        key = self._key(abs(value))
+        floor = self._floors[positive]
+        if floor is not None and key < floor:
+            key = floor
+        return (self._positive if positive else self._negative), key, positive
+
+    def add(self, value: float, count: int = 1):
+        """Count a value."""
+        self.count += count
+        if abs(value) < self.MIN_VALUE:
+            self._zero += count
+            return
+        store, key, positive = self._bucket(value)
+        store[key] = store.get(key, 0) + count
+        if len(store) > self.max_buckets:
+            self._collapse(store, positive)
+
+    def remove(self, value: float, count: int = 1):
+        """Uncount a value previously added (e.g. evicted from a sliding window)."""
+        if abs(value) < self.MIN_VALUE:
+            removed = min(count, self._zero)
+            self._zero -= removed
+        else:
+            store, key, _ = self._bucket(value)
+            current = store.get(key, 0)
+            removed = min(count, current)
+            if current - removed > 0:
+                store[key] = current - removed
+            else:
+                store.pop(key, None)
+        self.count -= removed
+
+    def _collapse(self, store: Dict[int, int], positive: bool):
+        """Merge the buckets closest to zero until max_buckets remain."""
+        keys = sorted(store)
+        excess = len(keys) - self.max_buckets
+        floor = keys[excess]
+        store[floor] += sum(store.pop(key) for key in keys[:excess])
+        self._floors[positive] = floor
+
+    def merge(self, other: "DDSketch") -> "DDSketch":
+        """Add the counts of another sketch with the same accuracy; returns self."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("cannot merge sketches with different accuracies")
+        for key, count in other._positive.items():
+            self.add(self._value(key), count)
+        for key, count in other._negative.items():
+            self.add(-self._value(key), count)
+        self.add(0.0, other._zero)
+        return self
+
+    def _value(self, key: int) -> float:
+        """Representative value of a bucket (relative error <= accuracy)."""
+        return 2 * self._gamma ** key / (self._gamma + 1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Return the approximate q-quantile (0 <= q <= 1), None if the sketch is empty.
+        """
+        if self.count <= 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self._negative, reverse=True):
+            seen += self._negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self._zero
+        if seen > rank:
+            return 0.0
+        for key in sorted(self._positive):
+            seen += self._positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self._positive)) if self._positive else 0.0
+
+    def quantiles(self, qs: Iterable[float]) -> Dict[str, Optional[float]]:
+        """Return {"p50": ..., "p95": ...} for the given quantiles."""
+        return {f"p{q * 100:g}": self.quantile(q) for q in qs}
@@ -0,0 +1,202 @@
+"""
+Event-time windows over keyed streams.
+
+EventTimeWindows aggregates (key, timestamp, value) readings into tumbling, hopping or
+sliding windows of the payload timestamps rather than of the arrival order. Readings are
+merged into panes (non-overlapping slices of the timeline, as long as the greatest common
+divisor of window size and slide) holding a rollup.Partial: each reading costs O(1) and a window result costs
+O(panes per window), never a rescan of the raw samples.
+
+A watermark (latest timestamp seen minus the allowed lateness) tells which windows are
+complete; readings older than the watermark are dropped and counted.
+"""
+
+from collections import deque
+from typing import Deque, Dict, Hashable, Optional, Tuple
+import logging
+import math
+import threading
+
+from .rollup import Partial
+
+LOG = logging.getLogger("time_windows")
+
+WINDOW_KINDS = ("tumbling", "hopping", "sliding")
+
+# per-key aggregates of a window
+WindowTotals = Dict[Hashable, Partial]
+
+
+class WindowResult:
+    """
+    Aggregates of one window.
+
+    Attributes:
+        start: window start (inclusive, event time).
+        end: window end (exclusive).
+        totals: key -> Partial of the readings of the window.
+    """
+
+    __slots__ = ("start", "end", "totals")
+
+    def __init__(self, start: float, end: float, totals: WindowTotals):
+        self.start = start
+        self.end = end
+        self.totals = totals
+
+    def means(self) -> Dict[Hashable, float]:
+        """Return the mean of each key."""
+        return {key: partial.mean for key, partial in self.totals.items()}
+
+
+class EventTimeWindows:
+    """
+    Pane-based event-time windows.
+
+    - tumbling: consecutive windows [k*size, (k+1)*size)
+    - hopping: windows [k*slide, k*slide + size), overlapping when slide < size
+    - sliding: the window [watermark - size, watermark), evaluated at each call of
+      next_result() with a precision of one pane (`slide`, default size / 10)
+
+    Tumbling and hopping windows are reported once, when the watermark passes their end.
+
+    Usage:
+        windows = EventTimeWindows("tumbling", size=60, allowed_lateness=5)
+        windows.add("sensor_1", timestamp, value)
+        result = windows.next_result()
+    """
+
+    def __init__(self, kind: str, size: float, slide: Optional[float] = None, allowed_lateness: float = 0.0):
+        """
+        Args:
+            kind: one of WINDOW_KINDS.
+            size: window length in seconds of event time.
+            slide: hop between windows (hopping, default size) or pane length (sliding,
+                default size / 10); ignored for tumbling windows.
+            allowed_lateness: seconds a reading may lag behind the latest timestamp seen
+                before it is dropped.
+        """
+        if kind not in WINDOW_KINDS:
+            raise ValueError(f"kind must be one of {WINDOW_KINDS}, got {kind!r}")
+        if size <= 0:
+            raise ValueError("size must be positive")
+        if kind == "tumbling" or slide is None:
+            slide = size if kind != "sliding" else size / 10.0
+        if slide <= 0 or slide > size:
+            raise ValueError("slide must be in ]0, size]")
+        self.kind = kind
+        self.size = float(size)
+        self.slide = float(slide)
+        self.allowed_lateness = float(allowed_lateness)
+        if kind == "hopping":
+            # panes must tile both the windows and their hops (millisecond precision)
+            self.pane = math.gcd(round(size * 1000), round(slide * 1000)) / 1000.0
+        else:
+            self.pane = self.slide if kind == "sliding" else self.size
+        # key -> panes (index, Partial) ordered by index
+        self._panes: Dict[Hashable, Deque[Tuple[int, Partial]]] = {}
+        self._max_timestamp: Optional[float] = None
+        self._last_window: Optional[int] = None
+        self.late_count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def watermark(self) -> Optional[float]:
+        """Event time before which no reading is accepted anymore (None before the first one)."""
+        if self._max_timestamp is None:
+            return None
+        return self._max_timestamp - self.allowed_lateness
+
+    def add(self, key: Hashable, timestamp: float, value: float) -> bool:
+        """
+        Add a reading.
+
+        Args:
+            key: stream key (e.g. sensor id).
+            timestamp: event time in seconds.
+            value: reading value.
+        Returns:
+            False if the reading was older than the watermark and dropped.
+        """
+        with self._lock:
+            watermark = self.watermark
+            if watermark is not None and timestamp < watermark:
+                self.late_count += 1
+                return False
+            if self._max_timestamp is None or timestamp > self._max_timestamp:
+                self._max_timestamp = timestamp
+            index = math.floor(timestamp / self.pane)
+            panes = self._panes.get(key)
+            if panes is None:
+                panes = self._panes[key] = deque()
+            if not panes or panes[-1][0] < index:
+                panes.append((index, Partial()))
+                panes[-1][1].add(value)
+                return True
+            # out of order (within the lateness): walk back from the newest pane
+            for position in range(len(panes) - 1, -1, -1):
+                pane_index, partial = panes[position]
+                if pane_index == index:
+                    partial.add(value)
+                    return True
+                if pane_index < index:
+                    break
+            else:
+                position = -1
+            partial = Partial()
+            partial.add(value)
+            panes.insert(position + 1, (index, partial))
+            return True
+
+    def _totals(self, start: float, end: float) -> WindowTotals:
+        """Merge the panes of every key lying in [start, end)."""
+        first = round(start / self.pane)
+        last = round(end / self.pane)
+        totals: WindowTotals = {}
+        for key, panes in self._panes.items():
+            merged = Partial()
+            for index, partial in reversed(panes):
+                if index < first:
+                    break
+                if index < last:
+                    merged.merge(partial)
+            if merged.count:
+                totals[key] = merged
+        return totals
+
+    def _evict(self, before: float):
+        """Drop the panes ending before `before` and the keys left without pane."""
+        first = math.floor(before / self.pane)
+        for key in list(self._panes):
+            panes = self._panes[key]
+            while panes and panes[0][0] < first:
+                panes.popleft()
+            if not panes:
+                del self._panes[key]
+
+    def next_result(self) -> Optional[WindowResult]:
+        """
+        Return the window to report now, or None.
+
+        Tumbling/hopping: the latest window completed by the watermark, if not reported
+        yet (windows completed in between are skipped). Sliding: the window ending at the
+        watermark.
+        """
+        with self._lock:
+            watermark = self.watermark
+            if watermark is None:
+                return None
+            if self.kind == "sliding":
+                end = math.floor(watermark / self.pane) * self.pane
+                start = end - self.size
+            else:
+                window = math.floor((watermark - self.size) / self.slide)
+                if self._last_window is not None and window <= self._last_window:
+                    return None
+                self._last_window = window
+                start = window * self.slide
+                end = start + self.size
+            totals = self._totals(start, end)
+            # later windows never start before this one
+            self._evict(start)
+        return WindowResult(start, end, totals)
@@ -0,0 +1,303 @@
+"""
+asyncio MQTT wrapper module.
+
+Provides AsyncMQTTClient, a variant of MQTTClient driven by an asyncio event loop
+instead of paho's background thread. The paho socket is registered on the loop
+(add_reader/add_writer), so thousands of agents and simulated sensors can share a
+single thread. The subscribe/publish/callback surface is the same as MQTTClient.
+
+The blocking connection calls (DNS, TCP handshake) run in the default executor. When the
+connection is lost the client reconnects with exponential backoff and subscribes again
+to its active topic filters.
+"""
+
+from typing import Optional, Set
+import asyncio
+import logging
+import uuid
+
+import paho.mqtt.client as mqtt
+
+from mqtt_client import LazyPayload, MessageCallback, Subscription, SubscriptionTable
+from payload_codecs import Codec, CodecRegistry
+
+LOG = logging.getLogger("async_mqtt_client")
+LOG.setLevel(logging.INFO)
+
+
+class AsyncMQTTClient:
+    """
+    paho-mqtt wrapper running on an asyncio event loop.
+
+    This wrapper:
+    - performs socket reads/writes from the event loop (no network thread)
+    - provides subscribe/publish helpers with JSON serialization
+    - routes each received message to the callbacks whose topic filter matches
+    - accepts plain functions or coroutine functions as callbacks
+    - reconnects after a connection loss and restores its subscriptions
+
+    All methods must be called from the event loop thread.
+    """
+
+    def __init__(self, broker_host: str = "localhost", client_id: Optional[str] = None,
+                 misc_interval: float = 1.0, codecs: Optional[CodecRegistry] = None,
+                 reconnect_min_delay: float = 1.0, reconnect_max_delay: float = 30.0):
+        """
+        Initialize the asyncio MQTT client.
+
+        Args:
+            broker_host: MQTT broker hostname (default: "localhost").
+            client_id: optional client identifier. If None, a random id is generated.
+            misc_interval: seconds between paho housekeeping calls (keepalive, retries).
+            codecs: codec registry used by publish() (see MQTTClient).
+            reconnect_min_delay: seconds before the first reconnection attempt; doubled after
+                each failure.
+            reconnect_max_delay: maximum seconds between two reconnection attempts.
+        """
+        self.broker_host = broker_host
+        self.client_id = client_id or f"agent_{uuid.uuid4().hex[:8]}"
+        self.misc_interval = misc_interval
+        self.reconnect_min_delay = reconnect_min_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self._client = mqtt.Client(client_id=self.client_id)
+        self._client.on_connect = self._on_connect
+        self._client.on_disconnect = self._on_disconnect
+        self._client.on_message = self._on_message
+        # socket callbacks used to plug paho into the event loop
+        self._client.on_socket_open = self._on_socket_open
+        self._client.on_socket_close = self._on_socket_close
+        self._client.on_socket_register_write = self._on_socket_register_write
+        self._client.on_socket_unregister_write = self._on_socket_unregister_write
+        self._message_callback: Optional[MessageCallback] = None
+        self._subscriptions = SubscriptionTable()
+        self.codecs = codecs or CodecRegistry()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._misc_task: Optional[asyncio.Task] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        # set while no socket is attached to the loop
+        self._socket_closed = asyncio.Event()
+        self._socket_closed.set()
+        # True once a connection was lost: subscriptions are sent again on the next connect
+        self._resubscribe = False
+        # strong references to callback tasks until they complete
+        self._tasks: Set[asyncio.Task] = set()
+        self._is_running = False
+
+    # ---- event loop integration ----
+    def _call_in_loop(self, func, *args):
+        """
+        Run func on the event loop: paho socket callbacks also fire from the executor
+        thread running connect()/reconnect().
+        """
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            func(*args)
+        else:
+            self._loop.call_soon_threadsafe(func, *args)
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._call_in_loop(self._attach, sock)
+
+    def _attach(self, sock):
+        self._socket_closed.clear()
+        self._loop.add_reader(sock, self._client.loop_read)
+        self._misc_task = self._loop.create_task(self._misc_loop())
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._call_in_loop(self._detach, sock)
+
+    def _detach(self, sock):
+        self._loop.remove_reader(sock)
+        self._loop.remove_writer(sock)
+        if self._misc_task is not None:
+            self._misc_task.cancel()
+            self._misc_task = None
+        self._socket_closed.set()
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._call_in_loop(self._loop.add_writer, sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._call_in_loop(self._loop.remove_writer, sock)
+
+    async def _misc_loop(self):
+        """Periodic paho housekeeping (keepalive pings, retransmissions)."""
+        while self._client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            try:
+                await asyncio.sleep(self.misc_interval)
+            except asyncio.CancelledError:
+                break
+
+    async def _reconnect(self):
+        """Reconnect with exponential backoff until it succeeds or the client stops."""
+        delay = self.reconnect_min_delay
+        while self._is_running:
+            await asyncio.sleep(delay)
+            if not self._is_running:
+                break
+            try:
+                await self._loop.run_in_executor(None, self._client.reconnect)
+                break
+            except OSError as exc:
+                delay = min(delay * 2, self.reconnect_max_delay)
+                LOG.warning("Reconnection to %s failed (%s), next attempt in %.1fs", self.broker_host, exc, delay)
+        self._reconnect_task = None
+
+    # ---- paho callbacks ----
+    def _on_connect(self, client, userdata, flags, rc):
+        """Internal connect callback (logs status, restores the subscriptions after a reconnection)."""
+        if rc == 0:
+            LOG.info("MQTT connected to %s (client=%s)", self.broker_host, self.client_id)
+            if self._resubscribe:
+                self._resubscribe = False
+                for topic, qos in self._subscriptions.filters().items():
+                    self._client.subscribe(topic, qos=qos)
+        else:
+            LOG.error("MQTT connect failed rc=%s", rc)
+
+    def _on_disconnect(self, client, userdata, rc):
+        """Internal disconnect callback: schedule a reconnection unless stop() was called."""
+        if rc != 0:
+            LOG.warning("MQTT connection to %s lost (rc=%s)", self.broker_host, rc)
+        self._call_in_loop(self._schedule_reconnect)
+
+    def _schedule_reconnect(self):
+        if not self._is_running or self._reconnect_task is not None:
+            return
+        self._resubscribe = True
+        self._reconnect_task = self._loop.create_task(self._reconnect())
+
+    def _on_message(self, client, userdata, mqtt_msg):
+        """
+        Internal message callback; route to matching callbacks.
+
+        Runs on the event loop. The payload is deserialized at most once and shared by
+        every matching callback (read-only); raw=True callbacks receive the bytes.
+        Coroutine callbacks are scheduled as tasks.
+        """
+        topic = mqtt_msg.topic
+        targets = self._subscriptions.targets(topic, self._message_callback)
+        if not targets:
+            LOG.debug("No local subscriber for %s", topic)
+            return
+        payload = LazyPayload(mqtt_msg.payload)
+        for callback, raw in targets:
+            try:
+                result = callback(topic, payload.raw if raw else payload.value())
+            except Exception as exc:
+                LOG.exception("Error in message callback: %s", exc)
+                continue
+            if asyncio.iscoroutine(result):
+                task = self._loop.create_task(result)
+                self._tasks.add(task)
+                task.add_done_callback(self._on_task_done)
+
+    def _on_task_done(self, task: asyncio.Task):
+        """Forget a finished callback task and log its error, if any."""
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            LOG.error("Error in message callback: %s", task.exception(), exc_info=task.exception())
+
+    # ---- public API ----
+    def set_message_callback(self, callback: MessageCallback):
+        """
+        Set a catch-all callback called for every received message.
+
+        Args:
+            callback: function(topic, payload) or coroutine function.
+        """
+        self._message_callback = callback
+
+    async def start(self):
+        """Connect to the broker and attach the client socket to the running event loop."""
+        if self._is_running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._is_running = True
+        try:
+            await self._loop.run_in_executor(None, self._client.connect, self.broker_host)
+        except BaseException:
+            self._is_running = False
+            raise
+        LOG.debug("Async MQTT client attached to event loop")
+
+    async def stop(self, timeout: float = 2.0):
+        """
+        Flush the pending writes, disconnect and cancel the pending callback tasks.
+
+        Args:
+            timeout: maximum seconds to wait for the queued packets to be written.
+        """
+        if not self._is_running:
+            return
+        self._is_running = False
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        deadline = self._loop.time() + timeout
+        # the writer callback empties paho's outgoing queue while we wait
+        while self._client.want_write() and not self._socket_closed.is_set() and self._loop.time() < deadline:
+            await asyncio.sleep(0.01)
+        self._client.disconnect()
+        try:
+            # the socket is closed once the DISCONNECT packet is written
+            await asyncio.wait_for(self._socket_closed.wait(), max(0.0, deadline - self._loop.time()))
+        except asyncio.TimeoutError:
+            LOG.warning("MQTT client %s: disconnection not flushed after %.1fs", self.client_id, timeout)
+        for task in list(self._tasks):
+            task.cancel()
+        LOG.debug("Async MQTT client stopped")
+
+    def subscribe(self, topic: str, qos: int = 0, callback: Optional[MessageCallback] = None,
+                  raw: bool = False) -> Optional[Subscription]:
+        """
+        Subscribe to a topic.
+
+        Args:
+            topic: topic string, may contain wildcards.
+            qos: quality of service.
+            callback: optional function(topic, payload) or coroutine function receiving
+                matching messages. The decoded payload is shared: do not mutate it.
+            raw: if True, the callback receives the raw payload bytes (no deserialization).
+        Returns:
+            the Subscription handle when a callback is given, else None.
+        """
+        subscription, send = self._subscriptions.add(topic, qos, callback, raw)
+        if send:
+            LOG.debug("Subscribing to %s (qos=%s)", topic, qos)
+            self._client.subscribe(topic, qos=qos)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """
+        Remove a local subscription returned by subscribe().
+
+        Args:
+            subscription: handle returned by subscribe().
+        """
+        if self._subscriptions.remove(subscription):
+            LOG.debug("Unsubscribing from %s", subscription.topic_filter)
+            self._client.unsubscribe(subscription.topic_filter)
+
+    def set_codec(self, topic_filter: str, codec: Optional[Codec]):
+        """Select the codec used to publish on the topics matching a filter (see MQTTClient)."""
+        self.codecs.set_codec(topic_filter, codec)
+
+    def publish(self, topic: str, payload: dict, qos: int = 0, retain: bool = False):
+        """
+        Publish a payload encoded with the codec of its topic (JSON by default).
+
+        The packet is queued and written when the socket becomes writable.
+
+        Args:
+            topic: destination topic
+            payload: object serializable by the topic codec
+            qos: quality of service
+            retain: retain flag.
+        """
+        data = self.codecs.encode(topic, payload)
+        LOG.debug("Publishing to %s: %s", topic, payload)
+        self._client.publish(topic, data, qos=qos, retain=retain)
@@ -0,0 +1,158 @@
+"""
+Bounded dispatch stage between the MQTT network thread and agent callbacks.
+
+The Dispatcher owns a fixed pool of worker threads, each with its own bounded FIFO
+queue. Tasks submitted with the same ordering key always land on the same worker, so
+they run one at a time and in arrival order, while different keys run in parallel.
+When a queue is full, submit() blocks the caller (backpressure on the network thread,
+hence on the broker through TCP flow control) or drops the task after put_timeout.
+"""
+
+from typing import Callable, Dict, Hashable, List, Optional
+import logging
+import queue
+import threading
+
+LOG = logging.getLogger("dispatcher")
+
+# sentinel asking a worker to exit once its queue is drained
+_STOP = object()
+
+
+class Dispatcher:
+    """
+    Keyed worker pool with bounded queues and queue-depth metrics.
+
+    Usage:
+        dispatcher = Dispatcher(workers=4, queue_size=1000)
+        dispatcher.start()
+        dispatcher.submit("home/bedroom1/temperature/t1", task)
+        dispatcher.stop()
+    """
+
+    def __init__(self, workers: int = 4, queue_size: int = 1000, put_timeout: Optional[float] = None,
+                 name: str = "dispatch"):
+        """
+        Args:
+            workers: number of worker threads.
+            queue_size: capacity of each worker queue.
+            put_timeout: seconds submit() waits for room in a full queue before dropping the
+                task. None (default) blocks until room is available.
+            name: prefix of the worker thread names.
+        """
+        if workers < 1:
+            raise ValueError("Dispatcher needs at least one worker")
+        if queue_size < 1:
+            raise ValueError("queue_size must be positive")
+        self.workers = workers
+        self.queue_size = queue_size
+        self.put_timeout = put_timeout
+        self.name = name
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._threads: List[threading.Thread] = []
+        # counters: submitted/dropped are written by submitters under the lock, processed
+        # and high watermarks by the owning worker only
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._dropped = 0
+        self._processed = [0] * workers
+        self._max_depth = [0] * workers
+        self._running = False
+
+    def start(self):
+        """Start the worker threads."""
+        with self._lock:
+            if self._running:
+                return
+            self._threads = [
+                threading.Thread(target=self._worker, args=(i,), daemon=True, name=f"{self.name}-{i}")
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._running = True
+        LOG.debug("Dispatcher started with %d workers (queue_size=%d)", self.workers, self.queue_size)
+
+    def stop(self, timeout: float = 2.0):
+        """
+        Stop the workers after the tasks already queued have run.
+
+        Args:
+            timeout: seconds to wait for each worker to finish.
+        """
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+        for q in self._queues:
+            q.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        LOG.debug("Dispatcher stopped: %s", self.stats())
+
+    def submit(self, key: Hashable, task: Callable[[], None]) -> bool:
+        """
+        Queue a task on the worker owning the given ordering key.
+
+        Args:
+            key: ordering key (e.g. a topic or an agent callback); tasks sharing a key run in order.
+            task: callable without arguments.
+        Returns:
+            True if the task was queued, False if it was dropped because the queue stayed full.
+        """
+        index = hash(key) % self.workers
+        q = self._queues[index]
+        try:
+            q.put(task, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+            LOG.warning("Dispatch queue %d full; dropping task for %s", index, key)
+            return False
+        with self._lock:
+            self._submitted += 1
+        return True
+
+    def _worker(self, index: int):
+        """Worker loop: run tasks of one queue until the stop sentinel is reached."""
+        q = self._queues[index]
+        while True:
+            depth = q.qsize()
+            if depth > self._max_depth[index]:
+                self._max_depth[index] = depth
+            task = q.get()
+            if task is _STOP:
+                break
+            try:
+                task()
+            except Exception:
+                LOG.exception("Error in dispatched task")
+            self._processed[index] += 1
+
+    def queue_depths(self) -> List[int]:
+        """Return the current number of pending tasks per worker queue."""
+        return [q.qsize() for q in self._queues]
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Return dispatch metrics.
+
+        Returns:
+            dict with current depths per queue and in total, the highest depth observed per
+            queue, the queue capacity and the submitted/processed/dropped task counters.
+        """
+        depths = self.queue_depths()
+        with self._lock:
+            submitted = self._submitted
+            dropped = self._dropped
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "depths": depths,
+            "depth": sum(depths),
+            "max_depths": list(self._max_depth),
+            "submitted": submitted,
+            "processed": sum(self._processed),
+            "dropped": dropped,
+        }
@@ -2,10 +2,12 @@
 MQTT wrapper module.
 
 Provides a small, reusable MQTTClient class to separate MQTT transport from agent logic.
+A single client can be shared by many agents: each agent subscribes with its own
+callback and inbound messages are routed through a topic trie to the matching agents only.
 """
 
-from typing import Callable, Optional
-import json
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import functools
 import logging
 import uuid
 import threading
@@ -13,9 +15,157 @@ import time
 
 import paho.mqtt.client as mqtt
 
+from dispatcher import Dispatcher
+from payload_codecs import Codec, CodecRegistry, decode
+from topic_trie import TopicTrie
+
 LOG = logging.getLogger("mqtt_client")
 LOG.setLevel(logging.INFO)
 
+MessageCallback = Callable[[str, Any], None]
+
+# sentinel telling that a payload has not been deserialized yet
+_NOT_DECODED = object()
+
+ORDERINGS = ("agent", "topic")
+
+
+def decode_payload(data: bytes) -> Any:
+    """
+    Deserialize a payload with the codec identified by its marker byte (JSON by default).
+
+    Args:
+        data: raw payload bytes.
+    Returns:
+        the decoded object, or {"raw": data} if the payload cannot be decoded.
+    """
+    return decode(data)
+
+
+class LazyPayload:
+    """
+    Received payload, deserialized on first access and at most once.
+
+    Shared by all callbacks of a message, possibly from several dispatcher workers.
+    """
+
+    __slots__ = ("raw", "_value", "_lock")
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        self._value = _NOT_DECODED
+        self._lock = threading.Lock()
+
+    def value(self) -> Any:
+        """Return the decoded payload, decoding it on the first call."""
+        value = self._value
+        if value is _NOT_DECODED:
+            with self._lock:
+                if self._value is _NOT_DECODED:
+                    self._value = decode_payload(self.raw)
+                value = self._value
+        return value
+
+
+class Subscription:
+    """
+    Local subscription: a topic filter bound to an agent callback.
+
+    Instances are stored in the client's topic trie and returned by subscribe().
+    When raw is True the callback receives the payload bytes instead of the decoded object.
+    """
+
+    __slots__ = ("topic_filter", "callback", "raw")
+
+    def __init__(self, topic_filter: str, callback: MessageCallback, raw: bool = False):
+        self.topic_filter = topic_filter
+        self.callback = callback
+        self.raw = raw
+
+    def __repr__(self):
+        return f"Subscription({self.topic_filter!r}, {self.callback!r}, raw={self.raw})"
+
+
+class SubscriptionTable:
+    """
+    Local subscriptions of a client (MQTTClient and AsyncMQTTClient).
+
+    Callbacks are stored in a topic trie; each topic filter keeps the number of local
+    registrations using it and the QoS of its broker subscription. A subscription without
+    callback holds its own reference, so that the unsubscription of the last callback does
+    not drop it. Not thread-safe: the client serializes the changes.
+    """
+
+    def __init__(self):
+        self._trie = TopicTrie()
+        # topic filter -> number of local registrations (broker subscription kept while > 0)
+        self._refs: Dict[str, int] = {}
+        # topic filter -> QoS of the broker subscription
+        self._qos: Dict[str, int] = {}
+        # filters subscribed without callback (one reference each, never released)
+        self._explicit: Set[str] = set()
+
+    def add(self, topic: str, qos: int, callback: Optional[MessageCallback] = None,
+            raw: bool = False) -> Tuple[Optional[Subscription], bool]:
+        """
+        Register a subscription.
+
+        Returns:
+            (Subscription handle or None without callback, True when the broker subscription
+            must be sent: first use of the filter, or higher QoS than the current one).
+        """
+        subscription = None
+        if callback is not None:
+            subscription = Subscription(topic, callback, raw)
+            self._trie.insert(topic, subscription)
+            self._refs[topic] = self._refs.get(topic, 0) + 1
+        elif topic not in self._explicit:
+            self._explicit.add(topic)
+            self._refs[topic] = self._refs.get(topic, 0) + 1
+        granted = self._qos.get(topic)
+        if granted is not None and qos <= granted:
+            return subscription, False
+        self._qos[topic] = qos
+        return subscription, True
+
+    def remove(self, subscription: Subscription) -> bool:
+        """
+        Remove a subscription returned by add().
+
+        Returns:
+            True when no registration uses the filter anymore (broker unsubscription needed).
+        """
+        topic = subscription.topic_filter
+        if not self._trie.remove(topic, subscription):
+            return False
+        self._refs[topic] -= 1
+        if self._refs[topic] > 0:
+            return False
+        del self._refs[topic]
+        del self._qos[topic]
+        return True
+
+    def filters(self) -> Dict[str, int]:
+        """Topic filter -> QoS of the broker subscriptions (e.g. to subscribe again after a reconnection)."""
+        return dict(self._qos)
+
+    def targets(self, topic: str, catch_all: Optional[MessageCallback] = None) -> List[Tuple[MessageCallback, bool]]:
+        """
+        Callbacks receiving a message, with their raw flag.
+
+        Overlapping filters of the same callback deliver the message once; the catch-all
+        callback, if any, comes last.
+        """
+        targets = []
+        seen = set()
+        for subscription in self._trie.match(topic):
+            if subscription.callback not in seen:
+                seen.add(subscription.callback)
+                targets.append((subscription.callback, subscription.raw))
+        if catch_all is not None:
+            targets.append((catch_all, False))
+        return targets
+
 
 class MQTTClient:
     """
@@ -23,26 +173,53 @@ class MQTTClient:
 
     This wrapper:
     - runs MQTT loop in background thread
-    - provides subscribe/publish helpers with JSON serialization
-    - allows registering high-level message callbacks
+    - provides subscribe/publish helpers with per-topic payload codecs (JSON by default,
+      see payload_codecs.py); received payloads are decoded according to their marker byte
+    - routes each received message to the callbacks whose topic filter matches
+      (topic trie, cost depends on topic depth, not on the number of agents)
+    - optionally runs the callbacks on a bounded worker pool so that slow agents never
+      stall the network thread
     """
 
-    def __init__(self, broker_host: str = "localhost", client_id: Optional[str] = None):
+    def __init__(self, broker_host: str = "localhost", client_id: Optional[str] = None,
+                 workers: int = 0, queue_size: int = 1000, ordering: str = "agent",
+                 put_timeout: Optional[float] = None, codecs: Optional[CodecRegistry] = None):
         """
         Initialize the MQTT client
 
         Args:
             broker_host: MQTT broker hostname (default: "localhost").
             client_id: optional client identifier. If None, a random id is generated.
+            workers: number of dispatcher threads running the callbacks. 0 (default) runs
+                them inline on the paho network thread.
+            queue_size: capacity of each dispatcher queue; a full queue blocks the network
+                thread (backpressure).
+            ordering: "agent" keeps the message order per callback (an agent never runs
+                concurrently with itself); "topic" keeps the order per topic, callbacks
+                must then be thread-safe.
+            put_timeout: seconds to wait for room in a full queue before dropping the
+                message. None (default) waits as long as needed.
+            codecs: codec registry used by publish(); a new JSON-only registry by default.
+                Can be shared between clients.
         """
+        if ordering not in ORDERINGS:
+            raise ValueError(f"ordering must be one of {ORDERINGS}, got {ordering!r}")
         self.broker_host = broker_host
         self.client_id = client_id or f"agent_{uuid.uuid4().hex[:8]}"
         self._client = mqtt.Client(client_id=self.client_id)
         # Register callbacks
         self._client.on_connect = self._on_connect
         self._client.on_message = self._on_message
-        # user-level callback is stored here
-        self._message_callback: Optional[Callable[[str, dict], None]] = None
+        # catch-all user-level callback (single-agent clients)
+        self._message_callback: Optional[MessageCallback] = None
+        # per-filter callbacks of the agents sharing this client
+        self._subscriptions = SubscriptionTable()
+        self.codecs = codecs or CodecRegistry()
+        self.ordering = ordering
+        self._dispatcher: Optional[Dispatcher] = None
+        if workers > 0:
+            self._dispatcher = Dispatcher(workers=workers, queue_size=queue_size, put_timeout=put_timeout,
+                                          name=f"{self.client_id}-dispatch")
         self._lock = threading.Lock()
         self._is_running = False
 
@@ -54,23 +231,58 @@ class MQTTClient:
             LOG.error("MQTT connect failed rc=%s", rc)
 
     def _on_message(self, client, userdata, mqtt_msg):
-        """Internal message callback; dispatch to user callback after deserializing JSON."""
+        """
+        Internal message callback; route to matching callbacks.
+
+        Runs on the paho network thread. Without dispatcher the callbacks are invoked
+        inline; otherwise they are queued on the dispatcher workers.
+        """
         topic = mqtt_msg.topic
+        if self._dispatcher is not None and self.ordering == "topic":
+            # matching, decoding and callbacks all happen on the worker owning the topic
+            self._dispatcher.submit(topic, functools.partial(self._route, topic, mqtt_msg.payload, False))
+        else:
+            self._route(topic, mqtt_msg.payload, self._dispatcher is not None)
+
+    def _route(self, topic: str, raw_payload: bytes, dispatch: bool):
+        """
+        Deliver a message to every callback whose topic filter matches.
+
+        The payload is deserialized at most once per message and the same object is shared
+        by every matching callback, which must treat it as read-only. Callbacks subscribed
+        with raw=True get the payload bytes and never trigger deserialization.
+
+        Args:
+            topic: message topic.
+            raw_payload: payload bytes.
+            dispatch: if True, queue one task per callback (keyed by callback) instead of
+                invoking the callbacks inline.
+        """
+        targets = self._subscriptions.targets(topic, self._message_callback)
+        if not targets:
+            LOG.debug("No local subscriber for %s", topic)
+            return
+        payload = LazyPayload(raw_payload)
+        for callback, raw in targets:
+            if dispatch:
+                self._dispatcher.submit(callback, functools.partial(self._invoke, callback, topic, payload, raw))
+            else:
+                self._invoke(callback, topic, payload, raw)
+
+    @staticmethod
+    def _invoke(callback: MessageCallback, topic: str, payload: LazyPayload, raw: bool):
+        """Call a user callback with the raw or decoded payload, logging its errors."""
         try:
-            payload_str = mqtt_msg.payload.decode("utf-8")
-            payload = json.loads(payload_str)
-        except Exception:
-            # if not JSON, pass raw bytes
-            payload = {"raw": mqtt_msg.payload}
-        if self._message_callback:
-            try:
-                self._message_callback(topic, payload)
-            except Exception as exc:
-                LOG.exception("Error in message callback: %s", exc)
+            callback(topic, payload.raw if raw else payload.value())
+        except Exception as exc:
+            LOG.exception("Error in message callback: %s", exc)
 
-    def set_message_callback(self, callback: Callable[[str, dict], None]):
+    def set_message_callback(self, callback: MessageCallback):
         """
-        Set a callback to be called for every received message.
+        Set a catch-all callback called for every received message.
+
+        Agents sharing the client should rather pass their callback to subscribe(), so
+        that they only receive the messages matching their own topic filters.
 
         Args:
             callback: function(topic, payload_dict).
@@ -83,6 +295,8 @@ class MQTTClient:
         with self._lock:
             if self._is_running:
                 return
+            if self._dispatcher is not None:
+                self._dispatcher.start()
             self._client.connect(self.broker_host)
             self._client.loop_start()
             self._is_running = True
@@ -96,29 +310,84 @@ class MQTTClient:
             self._client.loop_stop()
             self._client.disconnect()
             self._is_running = False
-            LOG.debug("MQTT client loop stopped")
+        if self._dispatcher is not None:
+            # run the callbacks of the messages already received; outside the lock, since
+            # they may subscribe or unsubscribe
+            self._dispatcher.stop()
+        LOG.debug("MQTT client loop stopped")
 
-    def subscribe(self, topic: str, qos: int = 0):
+    def set_codec(self, topic_filter: str, codec: Optional[Codec]):
+        """
+        Select the codec used to publish on the topics matching a filter.
+
+        Args:
+            topic_filter: topic filter, may contain wildcards (most specific filter wins).
+            codec: Codec instance, or None to go back to the default codec.
+        """
+        self.codecs.set_codec(topic_filter, codec)
+
+    def dispatch_stats(self) -> Optional[Dict[str, object]]:
+        """
+        Return dispatcher metrics (queue depths, submitted/processed/dropped counters).
+
+        Returns:
+            the Dispatcher.stats() dict, or None when callbacks run inline.
+        """
+        if self._dispatcher is None:
+            return None
+        return self._dispatcher.stats()
+
+    def subscribe(self, topic: str, qos: int = 0, callback: Optional[MessageCallback] = None,
+                  raw: bool = False) -> Optional[Subscription]:
         """
         Subscribe to a topic.
 
+        When a callback is given it is registered for this topic filter only, so several
+        agents can share the client. The broker subscription is sent once per filter, and
+        again when a later subscription asks for a higher QoS. A subscription without
+        callback is kept for the life of the client.
+
         Args:
             topic: topic string, may contain wildcards.
             qos: quality of service .
+            callback: optional function(topic, payload) receiving matching messages.
+                The decoded payload is shared with other subscribers: do not mutate it.
+            raw: if True, the callback receives the raw payload bytes (no deserialization).
+        Returns:
+            the Subscription handle when a callback is given, else None.
         """
-        LOG.debug("Subscribing to %s (qos=%s)", topic, qos)
-        self._client.subscribe(topic, qos=qos)
+        with self._lock:
+            subscription, send = self._subscriptions.add(topic, qos, callback, raw)
+            if send:
+                LOG.debug("Subscribing to %s (qos=%s)", topic, qos)
+                self._client.subscribe(topic, qos=qos)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """
+        Remove a local subscription returned by subscribe().
+
+        The broker subscription is dropped once no local callback uses the filter.
+
+        Args:
+            subscription: handle returned by subscribe().
+        """
+        topic = subscription.topic_filter
+        with self._lock:
+            if self._subscriptions.remove(subscription):
+                LOG.debug("Unsubscribing from %s", topic)
+                self._client.unsubscribe(topic)
 
     def publish(self, topic: str, payload: dict, qos: int = 0, retain: bool = False):
         """
-        Publish a JSON-encoded payload to a topic.
+        Publish a payload encoded with the codec of its topic (JSON by default).
 
         Args:
             topic: destination topic
-            payload: JSON-serializable object
+            payload: object serializable by the topic codec
             qos: quality of service
             retain: retain flag.
         """
-        payload_str = json.dumps(payload)
-        LOG.debug("Publishing to %s: %s", topic, payload_str)
-        self._client.publish(topic, payload_str, qos=qos, retain=retain)
+        data = self.codecs.encode(topic, payload)
+        LOG.debug("Publishing to %s: %s", topic, payload)
+        self._client.publish(topic, data, qos=qos, retain=retain)
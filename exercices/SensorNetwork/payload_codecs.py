@@ -0,0 +1,286 @@
+"""
+Payload codecs.
+
+Encoders/decoders used by the MQTT clients to (de)serialize payloads. The codec is chosen
+per topic filter when publishing; on reception it is recognized from the first byte of the
+payload, so clients using different codecs interoperate:
+
+    JSON          no prefix (legacy format, a JSON document never starts with a control byte)
+    MessagePack   0x01 + msgpack document (requires the optional `msgpack` package)
+    struct        0x02 + fixed binary layout for sensor readings and batch frames
+    CBOR          0x03 + CBOR document (requires the optional `cbor2` package)
+
+Usage:
+    registry = CodecRegistry()
+    registry.set_codec("home/+/+/+", StructReadingCodec())
+    data = registry.encode("home/kitchen/temperature/kitchen_temp_01", payload)
+    payload = decode(data)
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import logging
+import struct
+import threading
+
+from topic_trie import TopicTrie, validate_filter
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # optional dependency
+    cbor2 = None
+
+LOG = logging.getLogger("payload_codecs")
+
+# marker byte -> codec able to decode payloads starting with it
+_DECODERS: Dict[int, "Codec"] = {}
+
+
+class Codec:
+    """
+    Base class of the payload codecs.
+
+    Attributes:
+        name: short codec name.
+        marker: prefix byte identifying the codec on the wire (None: unprefixed JSON).
+    """
+
+    name = "base"
+    marker: Optional[int] = None
+
+    def encode(self, payload: Any) -> bytes:
+        """Serialize a payload, marker byte included."""
+        raise NotImplementedError
+
+    def decode(self, data: bytes) -> Any:
+        """Deserialize a payload produced by encode() (marker byte included)."""
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+
+class JsonCodec(Codec):
+    """UTF-8 JSON, without prefix (compatible with every existing agent)."""
+
+    name = "json"
+
+    def encode(self, payload: Any) -> bytes:
+        return json.dumps(payload).encode()
+
+    def decode(self, data: bytes) -> Any:
+        # json accepts UTF-8 bytes directly, no intermediate str is built
+        return json.loads(data)
+
+
+class MsgPackCodec(Codec):
+    """MessagePack documents (optional `msgpack` package)."""
+
+    name = "msgpack"
+    marker = 0x01
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError("MsgPackCodec requires the msgpack package")
+
+    def encode(self, payload: Any) -> bytes:
+        return bytes((self.marker,)) + msgpack.packb(payload, use_bin_type=True)
+
+    def decode(self, data: bytes) -> Any:
+        return msgpack.unpackb(data[1:], raw=False)
+
+
+class CborCodec(Codec):
+    """CBOR documents (optional `cbor2` package)."""
+
+    name = "cbor"
+    marker = 0x03
+
+    def __init__(self):
+        if cbor2 is None:
+            raise ImportError("CborCodec requires the cbor2 package")
+
+    def encode(self, payload: Any) -> bytes:
+        return bytes((self.marker,)) + cbor2.dumps(payload)
+
+    def decode(self, data: bytes) -> Any:
+        return cbor2.loads(data[1:])
+
+
+class StructReadingCodec(Codec):
+    """
+    Fixed binary layout for the sensor reading hot path.
+
+    Encodes `{"timestamp", "sensor_id", "value"}` readings and
+    `{"timestamp", "readings": [[sensor_id, timestamp, value], ...]}` batch frames
+    (little endian, sensor ids as length-prefixed UTF-8):
+
+        reading: 0x02 'r' | timestamp int64 | value float64 | id_len uint8 | id
+        frame:   0x02 'f' | timestamp int64 | count uint32 | count * (timestamp, value, id_len, id)
+
+    Any other payload (averages, commands, states) is encoded as JSON, so the codec can
+    be set on broad filters.
+    """
+
+    name = "struct"
+    marker = 0x02
+
+    _READING = struct.Struct("<qdB")
+    _FRAME = struct.Struct("<qI")
+    _READING_KEYS = frozenset(("timestamp", "sensor_id", "value"))
+    _FRAME_KEYS = frozenset(("timestamp", "readings"))
+
+    def __init__(self):
+        self._fallback = JsonCodec()
+
+    def encode(self, payload: Any) -> bytes:
+        try:
+            if isinstance(payload, dict):
+                keys = payload.keys()
+                if keys == self._READING_KEYS:
+                    return self._encode_reading(payload)
+                if keys == self._FRAME_KEYS:
+                    return self._encode_frame(payload)
+        except (struct.error, TypeError, ValueError):
+            # values outside the fixed layout (non-integer timestamp, id > 255 bytes, ...)
+            pass
+        return self._fallback.encode(payload)
+
+    def _pack_entry(self, sensor_id: str, timestamp: int, value: float) -> bytes:
+        if not isinstance(timestamp, int):
+            raise TypeError("timestamp must be an int")
+        sensor = sensor_id.encode()
+        return self._READING.pack(timestamp, value, len(sensor)) + sensor
+
+    def _encode_reading(self, payload: dict) -> bytes:
+        entry = self._pack_entry(payload["sensor_id"], payload["timestamp"], payload["value"])
+        return b"\x02r" + entry
+
+    def _encode_frame(self, payload: dict) -> bytes:
+        timestamp = payload["timestamp"]
+        readings = payload["readings"]
+        parts = [b"\x02f", self._FRAME.pack(timestamp, len(readings))]
+        for sensor_id, ts, value in readings:
+            parts.append(self._pack_entry(sensor_id, ts, value))
+        return b"".join(parts)
+
+    def _unpack_entry(self, data: bytes, offset: int) -> Tuple[str, int, float, int]:
+        timestamp, value, size = self._READING.unpack_from(data, offset)
+        offset += self._READING.size
+        sensor_id = data[offset:offset + size].decode()
+        return sensor_id, timestamp, value, offset + size
+
+    def decode(self, data: bytes) -> Any:
+        kind = data[1:2]
+        if kind == b"r":
+            sensor_id, timestamp, value, _ = self._unpack_entry(data, 2)
+            return {"timestamp": timestamp, "sensor_id": sensor_id, "value": value}
+        if kind == b"f":
+            timestamp, count = self._FRAME.unpack_from(data, 2)
+            offset = 2 + self._FRAME.size
+            readings: List[list] = []
+            for _ in range(count):
+                sensor_id, ts, value, offset = self._unpack_entry(data, offset)
+                readings.append([sensor_id, ts, value])
+            return {"timestamp": timestamp, "readings": readings}
+        raise ValueError(f"unknown struct payload kind {kind!r}")
+
+
+JSON = JsonCodec()
+
+for _codec_cls in (MsgPackCodec, StructReadingCodec, CborCodec):
+    try:
+        _DECODERS[_codec_cls.marker] = _codec_cls()
+    except ImportError:
+        LOG.debug("%s unavailable, payloads marked 0x%02x will not be decoded", _codec_cls.name, _codec_cls.marker)
+
+
+def decode(data: bytes) -> Any:
+    """
+    Deserialize a payload with the codec identified by its first byte.
+
+    Args:
+        data: raw payload bytes.
+    Returns:
+        the decoded object, or {"raw": data} if the payload cannot be decoded.
+    """
+    try:
+        codec = _DECODERS.get(data[0], JSON) if data else JSON
+        return codec.decode(data)
+    except Exception:
+        # if not decodable, pass raw bytes
+        return {"raw": data}
+
+
+def _specificity(topic_filter: str) -> Tuple[int, int, int]:
+    """Sort key of a filter: literal levels first, then '+' over '#', then depth."""
+    levels = topic_filter.split("/")
+    literal = sum(1 for level in levels if level not in ("+", "#"))
+    return literal, int(levels[-1] != "#"), len(levels)
+
+
+class CodecRegistry:
+    """
+    Codec selection per topic filter.
+
+    The codec of a topic is the one of the most specific matching filter (most literal
+    levels), JSON when no filter matches. Lookups are cached per topic in a bounded LRU
+    cache, so that a large or changing topic population does not grow it without limit.
+    """
+
+    def __init__(self, default: Codec = JSON, cache_size: int = 4096):
+        """
+        Args:
+            default: codec used for topics matching no filter.
+            cache_size: maximum number of topics whose codec is cached.
+        """
+        self.default = default
+        self.cache_size = cache_size
+        self._filters = TopicTrie()
+        self._codecs: Dict[str, Codec] = {}
+        # topic -> codec, least recently used first
+        self._cache: "OrderedDict[str, Codec]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def set_codec(self, topic_filter: str, codec: Optional[Codec]):
+        """
+        Use a codec for the topics matching a filter.
+
+        Args:
+            topic_filter: MQTT topic filter, may contain wildcards.
+            codec: Codec instance, or None to remove the filter.
+        """
+        validate_filter(topic_filter)
+        with self._lock:
+            if topic_filter in self._codecs:
+                self._filters.remove(topic_filter, topic_filter)
+                del self._codecs[topic_filter]
+            if codec is not None:
+                self._filters.insert(topic_filter, topic_filter)
+                self._codecs[topic_filter] = codec
+            self._cache.clear()
+        LOG.debug("Codec for %s set to %s", topic_filter, codec)
+
+    def codec_for(self, topic: str) -> Codec:
+        """Return the codec used to publish on a topic."""
+        with self._lock:
+            codec = self._cache.get(topic)
+            if codec is not None:
+                self._cache.move_to_end(topic)
+                return codec
+            filters = self._filters.match(topic)
+            codec = self._codecs[max(filters, key=_specificity)] if filters else self.default
+            self._cache[topic] = codec
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return codec
+
+    def encode(self, topic: str, payload: Any) -> bytes:
+        """Serialize a payload with the codec of its topic."""
+        return self.codec_for(topic).encode(payload)
@@ -6,35 +6,47 @@ registers sensors automatically at startup, and starts averaging/detection/inter
 agents per room/measurement. It demonstrates dynamic behaviour and control via MQTT
 control topics: home/{room}/control/*.
 
+run_async_demo() runs the same rooms and agents on a single asyncio event loop.
 """
 
+import asyncio
 import time
 import logging
 import threading
-from typing import List
+from typing import Dict, List, Optional
 
 from mqtt_client import MQTTClient
-from agents.sensor_factory import SensorFactory
+from async_mqtt_client import AsyncMQTTClient
+from payload_codecs import StructReadingCodec
+from agents.async_agent import AsyncAveragingAgent, AsyncDetectionAgent, AsyncSensorAgent
+from agents.sensor_bank import SensorBank
+from agents.sensor_factory import SensorFactory, SensorAgent
+from agents.aggregation_engine import AggregationEngine
 from agents.averaging_agent import AveragingAgent
+from agents.checkpoint import Checkpointer
 from agents.detection_agent import DetectionAgent
 from agents.interface_agent import InterfaceAgent
 from agents.room_agent import RoomAgent
+from agents.rollup import RollupAgent
 
 LOG = logging.getLogger("simulation")
 LOG.setLevel(logging.INFO)
 
 
-def _create_room(mqtt: MQTTClient, room_name: str) -> RoomAgent:
+def _create_room(mqtt: MQTTClient, room_name: str, sensor_cls: type = SensorAgent,
+                 bank: Optional[SensorBank] = None) -> RoomAgent:
     """
     Create a RoomAgent for the given room and populate it with default sensors.
 
     Args:
-        mqtt: shared MQTTClient instance.
+        mqtt: shared MQTTClient (or AsyncMQTTClient) instance.
         room_name: name of the room (e.g "bedroom1").
+        sensor_cls: SensorAgent class used for the room sensors.
+        bank: optional SensorBank holding the room sensors instead of SensorAgent objects.
     Returns:
         RoomAgent instance.
     """
-    room = RoomAgent(mqtt, room=room_name)
+    room = RoomAgent(mqtt, room=room_name, sensor_cls=sensor_cls, bank=bank)
     # Add sensible default sensors for typical rooms
     if "bedroom" in room_name or "room" in room_name:
         # two temperature sensors, one humidity sensor
@@ -50,7 +62,9 @@ def _create_room(mqtt: MQTTClient, room_name: str) -> RoomAgent:
     return room
 
 
-def run_demo(broker_host: str = "localhost", run_seconds: float = 60.0):
+def run_demo(broker_host: str = "localhost", run_seconds: float = 60.0, use_bank: bool = False,
+             batch: bool = False, binary: bool = False, use_engine: bool = False,
+             floors: Optional[Dict[str, List[str]]] = None, checkpoint: Optional[str] = None):
     """
     Run the integrated demo.
 
@@ -59,41 +73,79 @@ def run_demo(broker_host: str = "localhost", run_seconds: float = 60.0):
     - Starts averaging/detection/interface agents for each room/measurement
     - Demonstrates dynamic addition of a faulty sensor to generate alerts
     - Listens for control commands sent to home/{room}/control/*
+
+    With use_bank=True every sensor is a row of one vectorized SensorBank; batch=True then
+    publishes one frame per room/measurement and tick instead of one message per reading.
+    With binary=True sensor readings and frames use the fixed struct layout instead of JSON.
+    With use_engine=True one AggregationEngine replaces the per-room averaging agents.
+    floors (floor -> rooms) adds a RollupAgent publishing floor and building aggregates.
+    checkpoint (file path) saves the averaging and detection windows periodically and
+    restores them on the next run.
     """
 
     logging.getLogger().setLevel(logging.INFO)
-    mqtt = MQTTClient(broker_host=broker_host, client_id="sim_master")
+    # agent callbacks run on a small worker pool, never on the network thread
+    mqtt = MQTTClient(broker_host=broker_host, client_id="sim_master", workers=4)
+    if binary:
+        # other payloads on these topics (averages) fall back to JSON
+        mqtt.set_codec("home/+/+/+", StructReadingCodec())
     mqtt.start()
     LOG.info("Shared MQTT client started (broker=%s)", broker_host)
 
     # --- Rooms to create ---
     room_names: List[str] = ["bedroom1", "living_room"]
 
-    # create room agents and populate with sensors
-    rooms = {}
-    for rn in room_names:
-        rooms[rn] = _create_room(mqtt, rn)
-        rooms[rn].start()
-
-    # create averaging & detection & interface agents per room
+    # create averaging & detection & interface agents per room; sensors are created last,
+    # so that restoring a checkpoint never replaces windows already receiving readings
     avg_agents = []
     detect_agents = []
     interface_agents = []
+    if use_engine:
+        # one subscription and one publication pass for every room and measurement
+        avg_agents.append(AggregationEngine(mqtt, window_size=20, publish_period=4.0))
     for rn in room_names:
         # Temperature averaging & detection for each room
-        avg_temp = AveragingAgent(mqtt, room=rn, measurement="temperature", window_size=20, publish_period=4.0)
-        avg_hum = AveragingAgent(mqtt, room=rn, measurement="humidity", window_size=20, publish_period=6.0)
-        avg_light = AveragingAgent(mqtt, room=rn, measurement="luminosity", window_size=20, publish_period=6.0)
+        if not use_engine:
+            avg_agents.extend([
+                AveragingAgent(mqtt, room=rn, measurement="temperature", window_size=20, publish_period=4.0),
+                AveragingAgent(mqtt, room=rn, measurement="humidity", window_size=20, publish_period=6.0),
+                AveragingAgent(mqtt, room=rn, measurement="luminosity", window_size=20, publish_period=6.0),
+            ])
 
         detect_temp = DetectionAgent(mqtt, room=rn, measurement="temperature", window_size=30)
         detect_hum = DetectionAgent(mqtt, room=rn, measurement="humidity", window_size=30)
 
         interface = InterfaceAgent(mqtt, room=rn)
 
-        avg_agents.extend([avg_temp, avg_hum, avg_light])
         detect_agents.extend([detect_temp, detect_hum])
         interface_agents.append(interface)
 
+    checkpointer = None
+    if checkpoint:
+        # restore before the agents start
+        checkpointer = Checkpointer(checkpoint, period=15.0)
+        for agent in avg_agents + detect_agents:
+            if not isinstance(agent, AggregationEngine):
+                checkpointer.add(agent)
+        checkpointer.start()
+    for agent in avg_agents + detect_agents:
+        agent.start()
+
+    # create room agents and populate with sensors
+    bank = SensorBank(mqtt, batch=batch) if use_bank else None
+    rooms = {}
+    for rn in room_names:
+        rooms[rn] = _create_room(mqtt, rn, bank=bank)
+        rooms[rn].start()
+    if bank is not None:
+        bank.start()
+
+    if floors:
+        # floor / building aggregates merged from the room averages
+        rollup = RollupAgent(mqtt, floors, publish_period=6.0)
+        rollup.start()
+        avg_agents.append(rollup)
+
     # Start dynamic events in background thread: remove a sensor, then add a bad sensor
     def dynamic_changes():
         # wait some time for system to stabilize
@@ -126,15 +178,61 @@ def run_demo(broker_host: str = "localhost", run_seconds: float = 60.0):
     finally:
         # Stop everything gracefully
         LOG.info("Stopping simulation: stopping sensors, rooms and MQTT client")
+        for agent in avg_agents + detect_agents:
+            agent.stop()
+        if checkpointer is not None:
+            checkpointer.stop()
         for rn, room in rooms.items():
             try:
                 room.stop()
             except Exception:
                 LOG.exception("Error stopping room %s", rn)
+        if bank is not None:
+            bank.stop()
         mqtt.stop()
         LOG.info("Simulation finished")
 
 
+async def run_async_demo(broker_host: str = "localhost", run_seconds: float = 60.0,
+                         room_names: Optional[List[str]] = None):
+    """
+    Run the rooms, sensors and agents of the demo on the current asyncio event loop.
+
+    Sensors are AsyncSensorAgent tasks and every agent shares one AsyncMQTTClient, so the
+    whole simulation uses a single thread whatever the number of sensors.
+
+    Usage:
+        asyncio.run(run_async_demo())
+    """
+    mqtt = AsyncMQTTClient(broker_host=broker_host, client_id="sim_master_async")
+    await mqtt.start()
+    LOG.info("Shared async MQTT client started (broker=%s)", broker_host)
+    room_names = room_names or ["bedroom1", "living_room"]
+    rooms = {}
+    avg_agents = []
+    detect_agents = []
+    for rn in room_names:
+        rooms[rn] = _create_room(mqtt, rn, sensor_cls=AsyncSensorAgent)
+        rooms[rn].start()
+        avg_agents.append(AsyncAveragingAgent(mqtt, room=rn, measurement="temperature", window_size=20, publish_period=4.0))
+        avg_agents.append(AsyncAveragingAgent(mqtt, room=rn, measurement="humidity", window_size=20, publish_period=6.0))
+        for agent in avg_agents[-2:]:
+            agent.start()
+        detect_agents.append(AsyncDetectionAgent(mqtt, room=rn, measurement="temperature", window_size=30))
+        detect_agents[-1].start()
+        InterfaceAgent(mqtt, room=rn)
+    try:
+        await asyncio.sleep(run_seconds)
+    finally:
+        LOG.info("Stopping async simulation")
+        for agent in avg_agents + detect_agents:
+            agent.stop()
+        for room in rooms.values():
+            room.stop()
+        await mqtt.stop()
+        LOG.info("Async simulation finished")
+
+
 if __name__ == "__main__":
     # default run if called directly
     run_demo()
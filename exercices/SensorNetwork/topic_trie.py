@@ -0,0 +1,164 @@
+"""
+Topic trie used to route MQTT messages to local subscribers.
+
+Topic filters are stored level by level in a tree, so matching a topic costs
+O(topic depth) whatever the number of registered filters. The MQTT wildcards
+'+' (single level) and '#' (multi level, last level only) are supported.
+"""
+
+from typing import Any, Dict, List
+import threading
+
+SINGLE_LEVEL = "+"
+MULTI_LEVEL = "#"
+
+
+class _Node:
+    """One topic level in the trie."""
+
+    __slots__ = ("children", "values")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.values: List[Any] = []
+
+
+def validate_filter(topic_filter: str):
+    """
+    Check that a topic filter uses wildcards as allowed by the MQTT specification.
+
+    Args:
+        topic_filter: topic filter string (e.g. "home/+/temperature/#").
+    Raises:
+        ValueError: if the filter is empty or a wildcard is misplaced.
+    """
+    if not topic_filter:
+        raise ValueError("Topic filter must not be empty")
+    levels = topic_filter.split("/")
+    for i, level in enumerate(levels):
+        if MULTI_LEVEL in level and (level != MULTI_LEVEL or i != len(levels) - 1):
+            raise ValueError(f"'#' must be the last level of the filter: {topic_filter}")
+        if SINGLE_LEVEL in level and level != SINGLE_LEVEL:
+            raise ValueError(f"'+' must occupy a whole level: {topic_filter}")
+
+
+class TopicTrie:
+    """
+    Registry mapping MQTT topic filters to arbitrary values.
+
+    Several values may be registered under the same filter. The trie is thread-safe:
+    registrations usually happen from agent threads while matching runs on the MQTT
+    network thread.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._lock = threading.Lock()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def insert(self, topic_filter: str, value: Any):
+        """
+        Register a value under a topic filter.
+
+        Args:
+            topic_filter: topic filter, may contain wildcards.
+            value: object returned by match() for every matching topic.
+        """
+        validate_filter(topic_filter)
+        with self._lock:
+            node = self._root
+            for level in topic_filter.split("/"):
+                child = node.children.get(level)
+                if child is None:
+                    child = node.children[level] = _Node()
+                node = child
+            node.values.append(value)
+            self._size += 1
+
+    def remove(self, topic_filter: str, value: Any) -> bool:
+        """
+        Remove a value previously registered under a topic filter.
+
+        Empty branches are pruned so the trie does not grow with churn.
+
+        Returns:
+            True if the value was found and removed.
+        """
+        with self._lock:
+            path = [self._root]
+            levels = topic_filter.split("/")
+            for level in levels:
+                child = path[-1].children.get(level)
+                if child is None:
+                    return False
+                path.append(child)
+            node = path[-1]
+            try:
+                node.values.remove(value)
+            except ValueError:
+                return False
+            self._size -= 1
+            # prune nodes that no longer hold values nor children
+            for depth in range(len(levels), 0, -1):
+                node = path[depth]
+                if node.values or node.children:
+                    break
+                del path[depth - 1].children[levels[depth - 1]]
+            return True
+
+    def has_filter(self, topic_filter: str) -> bool:
+        """Return True if at least one value is registered under exactly this filter."""
+        with self._lock:
+            node = self._root
+            for level in topic_filter.split("/"):
+                node = node.children.get(level)
+                if node is None:
+                    return False
+            return bool(node.values)
+
+    def match(self, topic: str) -> List[Any]:
+        """
+        Return every value whose filter matches the given topic name.
+
+        Topics starting with '$' (e.g. "$SYS/...") are not matched by filters that
+        begin with a wildcard, as required by the MQTT specification.
+
+        Args:
+            topic: concrete topic name (no wildcards).
+        Returns:
+            list of matching values (a value registered under two overlapping filters
+            appears twice).
+        """
+        levels = topic.split("/")
+        system_topic = topic.startswith("$")
+        result: List[Any] = []
+        with self._lock:
+            nodes = [self._root]
+            for i, level in enumerate(levels):
+                wildcards_allowed = i > 0 or not system_topic
+                next_nodes = []
+                for node in nodes:
+                    children = node.children
+                    if wildcards_allowed:
+                        multi = children.get(MULTI_LEVEL)
+                        if multi is not None:
+                            result.extend(multi.values)
+                        single = children.get(SINGLE_LEVEL)
+                        if single is not None:
+                            next_nodes.append(single)
+                    exact = children.get(level)
+                    if exact is not None:
+                        next_nodes.append(exact)
+                nodes = next_nodes
+                if not nodes:
+                    break
+            for node in nodes:
+                result.extend(node.values)
+                # "a/#" also matches the parent level "a"
+                multi = node.children.get(MULTI_LEVEL)
+                if multi is not None:
+                    result.extend(multi.values)
+        return result